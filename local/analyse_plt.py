@@ -4,14 +4,15 @@ import matplotlib.pyplot as plt
 def analyze_results(csv_file):
     # 读取CSV文件
     df = pd.read_csv(csv_file)
+    # 只分组一次，避免每张图对每个服务重新过滤整个表；并行测试时各服务的行交错，按并发度排序
+    services = df.sort_values('并发用户数', kind='stable').groupby('服务名称', sort=False)
     
     # 创建性能对比图表
     plt.figure(figsize=(12, 6))
     
     # QPS对比图
     plt.subplot(1, 2, 1)
-    for service in df['服务名称'].unique():
-        service_data = df[df['服务名称'] == service]
+    for service, service_data in services:
         plt.plot(service_data['并发用户数'], service_data['QPS'], marker='o', label=service)
     plt.title('QPS对比')
     plt.xlabel('并发用户数')
@@ -20,8 +21,7 @@ def analyze_results(csv_file):
     
     # 响应时间对比图
     plt.subplot(1, 2, 2)
-    for service in df['服务名称'].unique():
-        service_data = df[df['服务名称'] == service]
+    for service, service_data in services:
         plt.plot(service_data['并发用户数'], service_data['平均响应时间(秒)'], marker='o', label=service)
     plt.title('平均响应时间对比')
     plt.xlabel('并发用户数')
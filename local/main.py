@@ -7,6 +7,9 @@ import argparse
 import uuid
 import random
 import string
+import itertools
+import os
+import sys
 from loguru import logger
 import csv
 from datetime import datetime
@@ -15,8 +18,13 @@ import io
 import cv2
 import numpy as np
 
+# 与 Web 版共用连接池和测试之间的冷却逻辑
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'network'))
+from core.utils import ConnectionPool
+from core.cooldown import Cooldown
+
 class LoadTester:
-    def __init__(self, name, url, request_type, request_body=None, image_path=None, headers=None, num_threads=10, num_requests=100):
+    def __init__(self, name, url, request_type, request_body=None, image_path=None, headers=None, num_threads=10, num_requests=100, connection_pool=None):
         self.name = name
         self.url = url
         self.request_type = request_type
@@ -29,6 +37,7 @@ class LoadTester:
         self.failure_count = 0
         self.response_times = []
         self.lock = threading.Lock()
+        self.connection_pool = connection_pool if connection_pool else ConnectionPool()
         
         # 如果是图片请求，预先加载图片
         if self.request_type == 'image' and self.image_path:
@@ -64,7 +73,7 @@ class LoadTester:
                 request_body['bizno'] = self.generate_bizno()
                 
                 start_time = time.time()
-                response = requests.post(self.url, json=request_body, headers=self.headers)
+                response = self.connection_pool.post(self.url, json=request_body, headers=self.headers)
                 end_time = time.time()
                 
                 logger.info(f"bizno: {request_body['bizno']}, status: {response.status_code}")
@@ -72,7 +81,7 @@ class LoadTester:
             else:  # image request
                 # 图片请求
                 start_time = time.time()
-                response = requests.post(self.url, headers=self.headers, data=self.image_data)
+                response = self.connection_pool.post(self.url, headers=self.headers, data=self.image_data)
                 end_time = time.time()
                 
                 logger.info(f"Image request completed, status: {response.status_code}")
@@ -91,6 +100,12 @@ class LoadTester:
             logger.error(f"请求失败: {str(e)}")
             return None
         
+    def run_worker(self, counter, start_barrier):
+        """工作线程：循环领取请求序号，直到请求发完"""
+        start_barrier.wait()
+        while next(counter) < self.num_requests:
+            self.make_request()
+
     def run_load_test(self):
         logger.info(f"开始压力测试...")
         logger.info(f"目标 URL: {self.url}")
@@ -98,14 +113,24 @@ class LoadTester:
         logger.info(f"总请求数: {self.num_requests}")
         logger.info(f"基础请求体: {json.dumps(self.base_request_body, ensure_ascii=False)}")
         logger.info(f"bizno: 将为每个请求动态生成")
+        logger.info(f"连接模式: {'keep-alive 连接池' if self.connection_pool.keep_alive else '每请求新建连接'}")
         logger.info("-" * 50)
 
-        start_time = time.time()
+        self.connection_pool.resize(self.num_threads)
+        # 工作线程从共享计数器领取请求序号，内存只与并发数有关，与总请求数无关
+        counter = itertools.count()
+        start_barrier = threading.Barrier(self.num_threads + 1)
         
         with ThreadPoolExecutor(max_workers=self.num_threads) as executor:
-            futures = [executor.submit(self.make_request) for _ in range(self.num_requests)]
+            for _ in range(self.num_threads):
+                executor.submit(self.run_worker, counter, start_barrier)
+            # 所有线程创建完毕后才开始计时，线程启动开销不计入总耗时
+            start_barrier.wait()
+            start_time = time.time()
             
         end_time = time.time()
+        # 归还会话，连接保持在池中供下一个并发度使用
+        self.connection_pool.release_all()
         
         # 计算统计数据
         total_time = end_time - start_time
@@ -161,7 +186,7 @@ def save_comparison_results_to_csv(all_results):
     
     # 准备CSV数据
     headers = ['服务名称', '并发用户数', '总请求数', '总耗时(秒)', '成功请求数', '失败请求数', 
-              '平均响应时间(秒)', '最大响应时间(秒)', '最小响应时间(秒)', 'QPS']
+              '平均响应时间(秒)', '最大响应时间(秒)', '最小响应时间(秒)', 'QPS', '冷却时间(秒)']
     
     with open(filename, 'w', newline='', encoding='utf-8') as f:
         writer = csv.writer(f)
@@ -178,12 +203,70 @@ def save_comparison_results_to_csv(all_results):
                 result['平均响应时间(秒)'],
                 result['最大响应时间(秒)'],
                 result['最小响应时间(秒)'],
-                result['QPS']
+                result['QPS'],
+                # 最后一个并发度之后不冷却
+                result.get('冷却时间(秒)', '')
             ])
     
     logger.info(f"对比测试结果已保存到文件: {filename}")
     return filename
 
+def create_tester(service, config, concurrent_users, connection_pool):
+    """为服务的某个并发度创建压测实例"""
+    return LoadTester(
+        name=service['name'],
+        url=service['url'],
+        request_type=service.get('request_type', 'json'),
+        request_body=service.get('request_body'),
+        image_path=service.get('image_path'),
+        headers=service.get('headers'),
+        num_threads=concurrent_users,
+        num_requests=concurrent_users * config['requests_per_user'],
+        connection_pool=connection_pool
+    )
+
+def run_tester(tester, service, config, concurrent_users):
+    """执行一次测试并补全结果信息"""
+    results = tester.run_load_test()
+    results['服务名称'] = service['name']
+    results['并发用户数'] = concurrent_users
+    results['总请求数'] = concurrent_users * config['requests_per_user']
+    results['请求类型'] = service.get('request_type', 'json')
+    return results
+
+def run_services_parallel(config):
+    """每个并发度下所有服务同时测试，各服务使用独立的压测实例和连接池"""
+    services = config['services']
+    connection_pools = [ConnectionPool(keep_alive=service.get('keep_alive', config.get('keep_alive', True)))
+                        for service in services]
+    results_by_service = [[] for _ in services]
+    cooldowns = [Cooldown(service, config, connection_pool)
+                 for service, connection_pool in zip(services, connection_pools)]
+    
+    with ThreadPoolExecutor(max_workers=len(services)) as executor:
+        # 各服务同时测量基线
+        list(executor.map(Cooldown.start, cooldowns))
+        for index, concurrent_users in enumerate(config['concurrent_users']):
+            logger.info(f"\n并发用户数: {concurrent_users}，并行测试 {len(services)} 个服务")
+            # 先创建全部测试实例（加载图片等），再同时开始
+            testers = [create_tester(service, config, concurrent_users, connection_pool)
+                       for service, connection_pool in zip(services, connection_pools)]
+            futures = [executor.submit(run_tester, tester, service, config, concurrent_users)
+                       for tester, service in zip(testers, services)]
+            for service_results, future in zip(results_by_service, futures):
+                service_results.append(future.result())
+            
+            # 所有服务都从本次测试中恢复后再进入下一个并发度
+            if index < len(config['concurrent_users']) - 1:
+                waited = list(executor.map(Cooldown.wait, cooldowns))
+                for service_results, seconds in zip(results_by_service, waited):
+                    service_results[-1]['冷却时间(秒)'] = f"{seconds:.2f}"
+    
+    for connection_pool in connection_pools:
+        connection_pool.close()
+    # 结果按服务顺序排列，与逐个服务测试时一致
+    return [results for service_results in results_by_service for results in service_results]
+
 def main():
     parser = argparse.ArgumentParser(description='HTTP接口压力测试工具')
     parser.add_argument('--config', type=str, help='配置文件路径', default='config.json')
@@ -195,34 +278,31 @@ def main():
     # 存储所有测试结果
     all_results = []
     
-    # 对每个服务进行不同并发度的测试
-    for service in config['services']:
-        logger.info(f"\n开始测试服务: {service['name']}")
-        
-        for concurrent_users in config['concurrent_users']:
-            logger.info(f"\n并发用户数: {concurrent_users}")
-            
-            tester = LoadTester(
-                name=service['name'],
-                url=service['url'],
-                request_type=service.get('request_type', 'json'),
-                request_body=service.get('request_body'),
-                image_path=service.get('image_path'),
-                headers=service.get('headers'),
-                num_threads=concurrent_users,
-                num_requests=concurrent_users * config['requests_per_user']
-            )
+    if config.get('parallel_services') and len(config['services']) > 1:
+        # 所有服务同时测试，总耗时约等于单个服务的耗时
+        all_results = run_services_parallel(config)
+    else:
+        # 对每个服务进行不同并发度的测试
+        for service in config['services']:
+            logger.info(f"\n开始测试服务: {service['name']}")
+            # 同一服务的所有并发度共用连接池，保持连接常驻
+            connection_pool = ConnectionPool(keep_alive=service.get('keep_alive', config.get('keep_alive', True)))
+            # 开始前测量服务的基线响应时间
+            cooldown = Cooldown(service, config, connection_pool)
+            cooldown.start()
             
-            results = tester.run_load_test()
-            results['服务名称'] = service['name']
-            results['并发用户数'] = concurrent_users
-            results['总请求数'] = concurrent_users * config['requests_per_user']
-            results['请求类型'] = service.get('request_type', 'json')
-            
-            all_results.append(results)
+            for index, concurrent_users in enumerate(config['concurrent_users']):
+                logger.info(f"\n并发用户数: {concurrent_users}")
+                
+                tester = create_tester(service, config, concurrent_users, connection_pool)
+                results = run_tester(tester, service, config, concurrent_users)
+                all_results.append(results)
+                
+                # 等待服务从本次测试中恢复后再开始下一个测试
+                if index < len(config['concurrent_users']) - 1:
+                    results['冷却时间(秒)'] = f"{cooldown.wait():.2f}"
             
-            # 每个测试之间暂停一段时间，避免服务器过载
-            time.sleep(2)
+            connection_pool.close()
     
     # 保存对比结果
     filename = save_comparison_results_to_csv(all_results)
@@ -0,0 +1,178 @@
+from flask import Flask, request, jsonify
+import os
+import base64
+import hashlib
+import hmac
+import ipaddress
+import threading
+import time
+import argparse
+from functools import wraps
+from loguru import logger
+from core.load_tester import get_tester_class
+from core.utils import ConnectionPool
+from core.corpus import resolve_corpus_path
+from core.distributed import AGENT_TOKEN_HEADER
+from core.request_log import configure_logging
+
+# 分布式压测节点：接收控制端（server.py）下发的配置，在约定时刻开始发压，
+# 结束后返回可合并的统计数据。同一时间只执行一个测试。
+
+app = Flask(__name__)
+
+# 控制端下发的图片保存目录
+UPLOAD_FOLDER = os.path.join(os.path.dirname(__file__), 'uploads', 'agent')
+os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+# 语料只能使用这个目录下的文件，与控制端的 uploads/corpus 目录结构相同
+CORPUS_FOLDER = os.path.join(os.path.dirname(__file__), 'uploads', 'corpus')
+os.makedirs(CORPUS_FOLDER, exist_ok=True)
+# 控制端下发的测试参数中允许的字段；结果目录、图片路径等本地路径不接受外部指定
+ALLOWED_TESTER_KWARGS = {
+    'name', 'url', 'request_type', 'request_body', 'headers', 'num_threads', 'num_requests',
+    'arrival_rate', 'request_log', 'request_log_sample_rate', 'phase_timing', 'template_fields',
+    'image_encode', 'corpus', 'corpus_order', 'raw_log', 'warmup'
+}
+# 与控制端共享的访问令牌，启动时设置，为空时不校验
+app.config['AGENT_TOKEN'] = None
+
+run_lock = threading.Lock()
+stop_event = threading.Event()
+# 正在执行的测试实例，供控制端查询实时进度
+current_tester = None
+
+def save_image(image_data):
+    """保存控制端下发的图片，按内容哈希命名，同一图片只写一次，已有文件不会被改写"""
+    data = base64.b64decode(image_data)
+    filepath = os.path.join(UPLOAD_FOLDER, hashlib.sha256(data).hexdigest())
+    if not os.path.exists(filepath):
+        # 写入临时文件后原子重命名，正在被映射的同名文件不会被原地改写
+        temp_path = f"{filepath}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, filepath)
+    return filepath
+
+def require_token(view):
+    """配置了令牌时，请求必须在 X-Agent-Token 头中携带相同的令牌"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        token = app.config['AGENT_TOKEN']
+        if token and not hmac.compare_digest(request.headers.get(AGENT_TOKEN_HEADER, ''), token):
+            return jsonify({'error': '令牌无效'}), 401
+        return view(*args, **kwargs)
+    return wrapper
+
+def build_tester(payload):
+    unknown = set(payload['tester_kwargs']) - ALLOWED_TESTER_KWARGS
+    if unknown:
+        raise ValueError(f"不支持的测试参数: {', '.join(sorted(unknown))}")
+    # 错误样本随统计数据返回，由控制端写入样本文件
+    tester_kwargs = dict(payload['tester_kwargs'], error_stream=False)
+    if tester_kwargs.get('corpus'):
+        corpus = resolve_corpus_path(CORPUS_FOLDER, tester_kwargs['corpus'])
+        if corpus is None:
+            raise ValueError(f"无效的语料路径: {tester_kwargs['corpus']}，语料需放在 uploads/corpus 目录下")
+        tester_kwargs['corpus'] = corpus
+    if payload.get('image_data'):
+        tester_kwargs['image_path'] = save_image(payload['image_data'])
+    engine = payload.get('engine', 'thread')
+    processes = payload.get('processes', 1)
+    if processes == 'auto':
+        processes = os.cpu_count() or 1
+    if processes > 1:
+        from core.sharding import ProcessShardedLoadTester
+        return ProcessShardedLoadTester(
+            processes=processes, shard_engine=engine,
+            connection_pool=ConnectionPool(keep_alive=payload.get('keep_alive', True)),
+            stop_event=stop_event,
+            **tester_kwargs
+        )
+    return get_tester_class(engine)(
+        connection_pool=ConnectionPool(keep_alive=payload.get('keep_alive', True)),
+        stop_event=stop_event,
+        **tester_kwargs
+    )
+
+@app.route('/agent/health')
+@require_token
+def health():
+    """返回本机时间，控制端据此估算时钟差"""
+    return jsonify({'time': time.time(), 'busy': run_lock.locked()})
+
+@app.route('/agent/run', methods=['POST'])
+@require_token
+def run():
+    """执行一次测试，阻塞到测试结束后返回统计数据"""
+    global current_tester
+    if not run_lock.acquire(blocking=False):
+        return jsonify({'error': '节点正在执行其他测试'}), 409
+    try:
+        stop_event.clear()
+        payload = request.get_json()
+        tester = build_tester(payload)
+        tester.log_test_info()
+        current_tester = tester
+
+        # 等到约定时刻再开始发压，各节点同时开始
+        delay = payload['start_at'] - time.time()
+        if delay > 0:
+            time.sleep(delay)
+        else:
+            logger.warning(f"收到配置时已超过约定开始时间 {-delay:.3f} 秒")
+
+        start_time = time.time()
+        tester.execute()
+        end_time = time.time()
+        tester.connection_pool.close()
+        tester.close_raw_log()
+
+        stats = tester.export_stats()
+        # 预热时间不计入总耗时
+        stats['start_time'] = start_time + tester.warmup_time
+        stats['end_time'] = end_time
+        return jsonify(stats)
+    except Exception as e:
+        logger.exception("执行测试失败")
+        return jsonify({'error': f"{type(e).__name__}: {str(e)}"}), 500
+    finally:
+        current_tester = None
+        run_lock.release()
+
+@app.route('/agent/progress')
+@require_token
+def progress():
+    """返回当前测试的实时进度，没有正在执行的测试时返回空对象"""
+    tester = current_tester
+    if tester is None:
+        return jsonify({})
+    return jsonify(tester.export_progress())
+
+@app.route('/agent/stop', methods=['POST'])
+@require_token
+def stop():
+    """停止当前测试，已发出的请求执行完毕后返回结果"""
+    stop_event.set()
+    return jsonify({'stopped': run_lock.locked()})
+
+def is_loopback(host):
+    if host == 'localhost':
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='分布式压测节点')
+    parser.add_argument('--host', default='127.0.0.1', help='监听地址，供其他机器访问时需要同时设置令牌')
+    parser.add_argument('--port', type=int, default=31009)
+    parser.add_argument('--token', default=os.environ.get('AGENT_TOKEN'),
+                        help='与控制端共享的访问令牌，默认读取环境变量 AGENT_TOKEN')
+    args = parser.parse_args()
+    if not args.token and not is_loopback(args.host):
+        parser.error('监听非本机地址时必须通过 --token 或环境变量 AGENT_TOKEN 设置访问令牌')
+    app.config['AGENT_TOKEN'] = args.token
+
+    configure_logging()
+    # threaded=True：执行测试时仍能响应 health/stop 请求
+    app.run(host=args.host, port=args.port, threaded=True)
@@ -1,9 +1,14 @@
 import os
+import numpy as np
 import pandas as pd
 import matplotlib
 matplotlib.use('Agg')  # 设置后端为 Agg，避免 GUI 相关问题
 import matplotlib.pyplot as plt
 from loguru import logger
+from matplotlib.colors import LogNorm
+from core.raw_log import load_raw_log
+from core.stats import (SUB_BUCKET_BITS, SUB_BUCKET_COUNT, MAX_TRACKABLE_US, HEATMAP_SUB_BUCKET_BITS,
+                        bucket_index, bucket_bounds)
 
 # 修改字体设置
 try:
@@ -23,53 +28,332 @@ except:
 # 正确显示负号
 matplotlib.rcParams['axes.unicode_minus'] = False
 
-def analyze_results(csv_file):
+# 分析原始请求记录时每次处理的记录数，内存占用与总记录数无关
+RAW_CHUNK_ROWS = 4 * 1024 * 1024
+# 原始记录散点图最多绘制的点数，超出时等间隔抽样
+MAX_SCATTER_POINTS = 200000
+# 热力图纵轴的格数
+HEATMAP_LATENCY_BINS = 40
+
+def level_column(df):
+    """各测试结果的横轴列：容量探测时为探测负载（开环探测的并发用户数是固定的在途上限），其他为并发用户数"""
+    if '探测负载' in df.columns and df['探测负载'].notna().any():
+        return '探测负载'
+    return '并发用户数'
+
+def get_timeseries_filename(csv_file):
+    """对比结果 CSV 对应的按秒时间序列文件"""
+    return get_companion_filename(csv_file, 'timeseries_')
+
+def get_companion_filename(csv_file, prefix):
+    """对比结果 CSV 旁边同一时间戳的明细文件"""
+    directory, name = os.path.split(csv_file)
+    return os.path.join(directory, name.replace('performance_comparison_', prefix, 1))
+
+def _service_axes(count, figsize, sharex=False):
+    """每个服务一个子图，返回子图列表"""
+    fig, axes = plt.subplots(count, 1, figsize=(figsize[0], figsize[1] * count), sharex=sharex, squeeze=False)
+    return fig, axes[:, 0]
+
+def _save(fig, results_dir, filename):
+    fig.tight_layout()
+    fig.savefig(os.path.join(results_dir, filename))
+    plt.close(fig)
+    return filename
+
+def plot_by_concurrency(df, results_dir):
+    """QPS、平均响应时间、响应时间分位数随并发度（容量探测时为探测负载）变化的对比图"""
+    x = level_column(df)
+    services = df.sort_values(x, kind='stable').groupby('服务名称', sort=False)
+
+    fig1 = plt.figure(figsize=(6, 4))
+    for service, service_data in services:
+        plt.plot(service_data[x], service_data['QPS'], marker='o', label=service)
+    plt.title('QPS')
+    plt.xlabel(x)
+    plt.ylabel('QPS')
+    plt.legend()
+    qps_path = _save(fig1, results_dir, 'qps_comparison.png')
+
+    fig2 = plt.figure(figsize=(6, 4))
+    for service, service_data in services:
+        plt.plot(service_data[x], service_data['平均响应时间(秒)'], marker='o', label=service)
+    plt.title('平均响应时间')
+    plt.xlabel(x)
+    plt.ylabel('响应时间(秒)')
+    plt.legend()
+    response_path = _save(fig2, results_dir, 'response_time_comparison.png')
+
+    # 延迟分位数对比图（实线 P95，虚线 P99）
+    fig3 = plt.figure(figsize=(6, 4))
+    for service, service_data in services:
+        line, = plt.plot(service_data[x], service_data['P95响应时间(秒)'], marker='o', label=f'{service} P95')
+        plt.plot(service_data[x], service_data['P99响应时间(秒)'], marker='x', linestyle='--',
+                 color=line.get_color(), label=f'{service} P99')
+    plt.title('响应时间分位数')
+    plt.xlabel(x)
+    plt.ylabel('响应时间(秒)')
+    plt.legend()
+    percentile_path = _save(fig3, results_dir, 'latency_percentile_comparison.png')
+
+    return qps_path, response_path, percentile_path
+
+def plot_throughput_latency(df, results_dir):
+    """吞吐-延迟曲线：横轴 QPS，纵轴 P50/P99，每个点标注并发度
+
+    曲线拐点之后增加并发只会推高延迟而不再提高吞吐。图中用星号标出
+    QPS/P99 最大的并发度，即吞吐与延迟综合最优的工作点。
+    """
+    df = df[df['P99响应时间(秒)'] > 0]
+    if df.empty:
+        return None
+    # 每个服务 QPS/P99 最大的一行
+    best = df.loc[(df['QPS'] / df['P99响应时间(秒)']).groupby(df['服务名称'], sort=False).idxmax()]
+
+    fig = plt.figure(figsize=(6, 4))
+    for service, service_data in df.groupby('服务名称', sort=False):
+        line, = plt.plot(service_data['QPS'], service_data['P99响应时间(秒)'], marker='o', label=f'{service} P99')
+        plt.plot(service_data['QPS'], service_data['P50响应时间(秒)'], marker='x', linestyle='--',
+                 color=line.get_color(), label=f'{service} P50')
+        for qps, latency, level in zip(service_data['QPS'], service_data['P99响应时间(秒)'], service_data[level_column(df)]):
+            plt.annotate(f'{level:g}', (qps, latency), textcoords='offset points', xytext=(4, 4), fontsize=7)
+    plt.scatter(best['QPS'], best['P99响应时间(秒)'], marker='*', s=150, color='black', zorder=3, label='最优工作点')
+    plt.title('吞吐-延迟曲线')
+    plt.xlabel('QPS')
+    plt.ylabel('响应时间(秒)')
+    plt.legend(fontsize=7)
+    return _save(fig, results_dir, 'throughput_latency.png')
+
+def plot_capacity(df, results_dir):
+    """容量探测图：每个服务一个子图，QPS 和 SLO 分位数随探测负载变化，竖线标出最大可持续负载"""
+    df = df.dropna(subset=['探测负载']).sort_values(['服务名称', '探测负载'], kind='stable')
+    groups = df.groupby('服务名称', sort=False)
+    fig, axes = _service_axes(groups.ngroups, (8, 3.5))
+    for ax, (service, data) in zip(axes, groups):
+        percentile = data['SLO分位数'].iloc[0]
+        latency = data[f'{percentile}响应时间(秒)']
+        passed = (data['满足SLO'] == '是').to_numpy()
+        ax.plot(data['探测负载'], data['QPS'], marker='o', color='tab:blue', label='QPS')
+        latency_ax = ax.twinx()
+        latency_ax.plot(data['探测负载'], latency, marker='x', linestyle='--', color='tab:orange', label=percentile)
+        latency_ax.scatter(data['探测负载'][~passed], latency[~passed], color='red', zorder=3, label='违反 SLO')
+        latency_ax.axhline(data['SLO响应时间(秒)'].iloc[0], color='gray', linestyle=':', label='SLO')
+        if passed.any():
+            best = data[passed].iloc[-1]
+            ax.axvline(best['探测负载'], color='green', alpha=0.5)
+            ax.annotate(f"最大可持续 QPS {best['QPS']:.2f}", (best['探测负载'], best['QPS']),
+                        textcoords='offset points', xytext=(6, -12), fontsize=8, color='green')
+        ax.set_title(f'{service} 容量探测')
+        ax.set_xlabel('探测负载')
+        ax.set_ylabel('QPS')
+        latency_ax.set_ylabel('响应时间(秒)')
+        lines, labels = ax.get_legend_handles_labels()
+        latency_lines, latency_labels = latency_ax.get_legend_handles_labels()
+        ax.legend(lines + latency_lines, labels + latency_labels, fontsize=7, loc='upper left')
+    return _save(fig, results_dir, 'capacity.png')
+
+def plot_latency_cdf(histograms, results_dir, filename='latency_cdf.png'):
+    """根据延迟直方图绘制累积分布曲线，每个服务一个子图，每个并发度一条曲线
+
+    histograms 每行是一个直方图桶：服务名称、并发用户数（容量探测时还有探测负载）、延迟上限(微秒)、请求数。
+    累计和在分组内一次向量化计算。
+    """
+    x = level_column(histograms)
+    group_columns = ['服务名称', x]
+    histograms = histograms.sort_values(group_columns + ['延迟上限(微秒)'], kind='stable')
+    groups = histograms.groupby(group_columns, sort=False)['请求数']
+    cdf = groups.cumsum() / groups.transform('sum')
+    latency = histograms['延迟上限(微秒)'].clip(lower=1) / 1e6
+
+    services = histograms['服务名称'].unique()
+    fig, axes = _service_axes(len(services), (8, 3.5), sharex=True)
+    for ax, service in zip(axes, services):
+        mask = (histograms['服务名称'] == service).to_numpy()
+        for value in histograms.loc[mask, x].unique():
+            level = mask & (histograms[x] == value).to_numpy()
+            ax.step(latency[level], cdf[level], where='post', label=f'{value} 用户' if x == '并发用户数' else f'负载 {value:g}')
+        ax.set_xscale('log')
+        ax.set_ylim(0, 1.01)
+        ax.grid(True, which='both', alpha=0.3)
+        ax.set_title(f'{service} 响应时间累积分布')
+        ax.set_ylabel('累积比例')
+        ax.legend(fontsize=7)
+    axes[-1].set_xlabel('响应时间(秒，对数刻度)')
+    return _save(fig, results_dir, filename)
+
+def plot_latency_heatmap(heatmap, results_dir, filename='latency_heatmap.png'):
+    """按秒的延迟热力图，每个服务一个子图，颜色表示请求数
+
+    heatmap 每行是一个格：服务名称、时间戳、延迟下限(微秒)、请求数。
+    横轴为相对整次测试开始的秒数，各并发度按时间先后排列。
+    """
+    seconds = (heatmap['时间戳'] - heatmap['时间戳'].min()).to_numpy()
+    latency = heatmap['延迟下限(微秒)'].clip(lower=1).to_numpy() / 1e6
+    counts = heatmap['请求数'].to_numpy()
+    time_edges = np.arange(seconds.max() + 2)
+    latency_edges = np.geomspace(latency.min(), latency.max() * 1.0001, HEATMAP_LATENCY_BINS + 1)
+
+    services = heatmap['服务名称'].unique()
+    fig, axes = _service_axes(len(services), (8, 3.5), sharex=True)
+    for ax, service in zip(axes, services):
+        mask = (heatmap['服务名称'] == service).to_numpy()
+        grid, _, _ = np.histogram2d(seconds[mask], latency[mask], bins=[time_edges, latency_edges], weights=counts[mask])
+        mesh = ax.pcolormesh(time_edges, latency_edges, np.ma.masked_equal(grid.T, 0), norm=LogNorm(), cmap='viridis')
+        fig.colorbar(mesh, ax=ax, label='请求数')
+        ax.set_yscale('log')
+        ax.set_title(f'{service} 响应时间热力图')
+        ax.set_ylabel('响应时间(秒)')
+    axes[-1].set_xlabel('运行时间(秒)')
+    return _save(fig, results_dir, filename)
+
+def plot_timeseries(timeseries_file, results_dir):
+    """根据按秒时间序列绘制 QPS 和响应时间随时间变化的图表"""
+    df = pd.read_csv(timeseries_file)
+    # 横轴为相对整次测试开始的秒数，各并发度按时间先后连成一条曲线
+    df['运行时间(秒)'] = df['时间戳'] - df['时间戳'].min()
+    services = df.groupby('服务名称', sort=False)
+    
+    fig1 = plt.figure(figsize=(8, 4))
+    for service, service_data in services:
+        plt.plot(service_data['运行时间(秒)'], service_data['请求数'], label=service)
+    plt.title('QPS 随时间变化')
+    plt.xlabel('运行时间(秒)')
+    plt.ylabel('QPS')
+    plt.legend()
+    qps_timeline_path = _save(fig1, results_dir, 'qps_timeline.png')
+    
+    fig2 = plt.figure(figsize=(8, 4))
+    for service, service_data in services:
+        line, = plt.plot(service_data['运行时间(秒)'], service_data['P50响应时间(秒)'], label=f'{service} P50')
+        plt.plot(service_data['运行时间(秒)'], service_data['P99响应时间(秒)'], linestyle='--',
+                 color=line.get_color(), label=f'{service} P99')
+    plt.title('响应时间随时间变化')
+    plt.xlabel('运行时间(秒)')
+    plt.ylabel('响应时间(秒)')
+    plt.legend()
+    latency_timeline_path = _save(fig2, results_dir, 'latency_timeline.png')
+    
+    return qps_timeline_path, latency_timeline_path
+
+def _raw_bucket_index(values):
+    """向量化的 stats.bucket_index"""
+    _, bit_length = np.frexp(values)
+    shift = np.maximum(bit_length - SUB_BUCKET_BITS, 0)
+    return np.where(values < SUB_BUCKET_COUNT, values, (shift << (SUB_BUCKET_BITS - 1)) + (values >> shift))
+
+def _raw_heatmap_cell(values):
+    """向量化的热力图格下限（微秒），与 stats.heatmap_lower_bound 一致"""
+    _, bit_length = np.frexp(values)
+    shift = np.maximum(bit_length - HEATMAP_SUB_BUCKET_BITS - 1, 0)
+    return (values >> shift) << shift
+
+def raw_log_frames(raw_file):
+    """把原始请求记录汇总为与结果文件同样格式的延迟直方图和热力图
+
+    记录按块从内存映射中读取，每块只做一次向量化的分桶计数，
+    上千万条记录不会转换成 Python 对象，也不会整体载入内存。
+    失败请求（状态码 0）没有响应时间，不计入。
+    """
+    records, base_time = load_raw_log(raw_file)
+    bucket_counts = np.zeros(bucket_index(MAX_TRACKABLE_US) + 1, dtype=np.int64)
+    cells = []
+    for offset in range(0, len(records), RAW_CHUNK_ROWS):
+        chunk = records[offset:offset + RAW_CHUNK_ROWS]
+        chunk = chunk[chunk['status'] != 0]
+        latency = np.minimum(chunk['latency_us'].astype(np.int64), MAX_TRACKABLE_US)
+        bucket_counts += np.bincount(_raw_bucket_index(latency), minlength=len(bucket_counts))
+        # 按完成时间分秒，与统计中的时间序列一致
+        second = (base_time + (chunk['start_us'] + chunk['latency_us']) / 1e6).astype(np.int64)
+        cells.append(pd.DataFrame({'时间戳': second, '延迟下限(微秒)': _raw_heatmap_cell(latency)})
+                     .value_counts().rename('请求数').reset_index())
+
+    indexes = np.flatnonzero(bucket_counts)
+    bounds = np.array([bucket_bounds(int(index)) for index in indexes]).reshape(-1, 2)
+    histogram = pd.DataFrame({
+        '延迟下限(微秒)': bounds[:, 0], '延迟上限(微秒)': bounds[:, 1], '请求数': bucket_counts[indexes]
+    })
+    heatmap = pd.DataFrame(columns=['时间戳', '延迟下限(微秒)', '请求数'])
+    if cells:
+        heatmap = pd.concat(cells).groupby(['时间戳', '延迟下限(微秒)'], as_index=False)['请求数'].sum()
+    return histogram, heatmap
+
+def analyze_raw_log(raw_file, results_dir=None):
+    """根据一个原始请求记录文件绘制散点图、累积分布和热力图，返回图表文件名"""
+    results_dir = results_dir or os.path.dirname(raw_file)
+    name = os.path.splitext(os.path.basename(raw_file))[0]
+    histogram, heatmap = raw_log_frames(raw_file)
+    if histogram.empty:
+        logger.warning(f"原始请求记录中没有成功响应: {raw_file}")
+        return {}
+    # 文件名格式为 raw_<服务>_<并发度>_<日期>_<时间>_<进程号>_<随机后缀>
+    users = name.split('_')[-5]
+    for frame in (histogram, heatmap):
+        frame['服务名称'] = name
+        frame['并发用户数'] = users
+    return {
+        'scatter': os.path.basename(plot_raw_log(raw_file, os.path.join(results_dir, f'{name}_scatter.png'))),
+        'cdf': plot_latency_cdf(histogram, results_dir, f'{name}_cdf.png'),
+        'heatmap': plot_latency_heatmap(heatmap, results_dir, f'{name}_heatmap.png'),
+    }
+
+def plot_raw_log(raw_file, output_path):
+    """根据原始请求记录绘制每个请求的响应时间散点图，失败请求（状态码非 2xx 或无响应）标红"""
+    records, _ = load_raw_log(raw_file)
+    step = max(1, len(records) // MAX_SCATTER_POINTS)
+    sample = np.asarray(records[::step])
+    start = sample['start_us'] / 1e6
+    latency = sample['latency_us'] / 1e6
+    failed = (sample['status'] < 200) | (sample['status'] >= 300)
+
+    fig = plt.figure(figsize=(8, 4))
+    plt.scatter(start[~failed], latency[~failed], s=1, alpha=0.3, label='成功')
+    plt.scatter(start[failed], latency[failed], s=1, alpha=0.5, color='red', label='失败')
+    title = '每个请求的响应时间'
+    if step > 1:
+        title += f'（每 {step} 条抽样 1 条）'
+    plt.title(title)
+    plt.xlabel('运行时间(秒)')
+    plt.ylabel('响应时间(秒)')
+    plt.legend(markerscale=8)
+    plt.tight_layout()
+    fig.savefig(output_path)
+    plt.close(fig)
+    return output_path
+
+def analyze_results(csv_file, results_dir=None):
+    """根据对比结果及旁边的明细文件生成全部图表，写入 results_dir（默认 results 目录）
+
+    返回 {图表名: 文件名}，缺少对应明细文件的图表为 None。
+    """
     try:
         # 清除所有现有图表
         plt.close('all')
         
-        # 读取CSV文件
-        df = pd.read_csv(csv_file)
-        
-        # 创建两个独立的图表
-        # QPS对比图
-        fig1 = plt.figure(figsize=(6, 4))
-        for service in df['服务名称'].unique():
-            service_data = df[df['服务名称'] == service]
-            plt.plot(service_data['并发用户数'], service_data['QPS'], marker='o', label=service)
-        plt.title('QPS')
-        plt.xlabel('并发用户数')
-        plt.ylabel('QPS')
-        plt.legend()
-        plt.tight_layout()
-        
         # 确保结果目录存在并使用正确的路径
-        results_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'results')
+        results_dir = results_dir or os.path.join(os.path.dirname(os.path.dirname(__file__)), 'results')
         os.makedirs(results_dir, exist_ok=True)
         
-        # 保存QPS图表
-        qps_path = os.path.join(results_dir, 'qps_comparison.png')
-        fig1.savefig(qps_path)
-        plt.close(fig1)
-        
-        # 响应时间对比图
-        fig2 = plt.figure(figsize=(6, 4))
-        for service in df['服务名称'].unique():
-            service_data = df[df['服务名称'] == service]
-            plt.plot(service_data['并发用户数'], service_data['平均响应时间(秒)'], marker='o', label=service)
-        plt.title('平均响应时间')
-        plt.xlabel('并发用户数')
-        plt.ylabel('响应时间(秒)')
-        plt.legend()
-        plt.tight_layout()
+        df = pd.read_csv(csv_file)
+        charts = dict.fromkeys(['qps', 'response', 'percentile', 'qps_timeline', 'latency_timeline',
+                                'throughput_latency', 'cdf', 'heatmap', 'capacity'])
+        charts['qps'], charts['response'], charts['percentile'] = plot_by_concurrency(df, results_dir)
+        charts['throughput_latency'] = plot_throughput_latency(df, results_dir)
+        if '探测负载' in df.columns:
+            charts['capacity'] = plot_capacity(df, results_dir)
         
-        # 保存响应时间图表
-        response_path = os.path.join(results_dir, 'response_time_comparison.png')
-        fig2.savefig(response_path)
-        plt.close(fig2)
+        # 按秒时间序列、延迟直方图、热力图（没有对应数据时为 None）
+        timeseries_file = get_timeseries_filename(csv_file)
+        if os.path.exists(timeseries_file):
+            charts['qps_timeline'], charts['latency_timeline'] = plot_timeseries(timeseries_file, results_dir)
+        histogram_file = get_companion_filename(csv_file, 'latency_histogram_')
+        if os.path.exists(histogram_file):
+            charts['cdf'] = plot_latency_cdf(pd.read_csv(histogram_file), results_dir)
+        heatmap_file = get_companion_filename(csv_file, 'latency_heatmap_')
+        if os.path.exists(heatmap_file):
+            charts['heatmap'] = plot_latency_heatmap(pd.read_csv(heatmap_file), results_dir)
         
-        return 'qps_comparison.png', 'response_time_comparison.png'  # 只返回文件名        
+        return charts  # 只返回文件名
     except Exception as e:
         logger.error(f"生成图表失败: {str(e)}")
         plt.close('all')  # 确保清理所有图表
-        raise
\ No newline at end of file
+        raise
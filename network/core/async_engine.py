@@ -0,0 +1,165 @@
+import asyncio
+import json
+import time
+import aiohttp
+from core.load_tester import LoadTester
+
+class AsyncLoadTester(LoadTester):
+    """基于 asyncio/aiohttp 的压测引擎
+
+    每个并发用户是一个协程，所有协程共用一个 aiohttp 连接器，
+    数千并发用户也只占用一个线程。统计与结果格式与 LoadTester 完全一致。
+    """
+    engine = 'async'
+
+    def execute(self):
+        return asyncio.run(self._run_users())
+
+    async def _run_users(self):
+        # 连接数上限等于并发用户数；关闭 keep-alive 时每个请求新建连接
+        connector = aiohttp.TCPConnector(
+            limit=self.num_threads,
+            force_close=not self.connection_pool.keep_alive
+        )
+        timeout = aiohttp.ClientTimeout(total=None)
+        trace_configs = [create_phase_trace_config()] if self.phase_timing else None
+        # 所有用户从同一个迭代器领取请求，总数与线程引擎相同
+        pending = iter(range(self.num_requests))
+
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout, trace_configs=trace_configs) as session:
+            if self.warmup:
+                # 预热使用同一个连接器，建立的连接留给正式测试
+                await self._warm_up(session)
+            start_ns = time.perf_counter_ns()
+            if self.arrival_rate:
+                await self._run_open_loop(session, start_ns)
+            else:
+                await asyncio.gather(*(self._run_user(session, pending) for _ in range(self.num_threads)))
+            end_ns = time.perf_counter_ns()
+
+        return (end_ns - start_ns) / 1e9
+
+    async def _run_user(self, session, pending):
+        for _ in pending:
+            if self.stop_event.is_set():
+                break
+            await self.make_request_async(session)
+
+    async def _warm_up(self, session):
+        """预热：以相同的并发用户数（或目标速率）发压，全部完成后切换统计"""
+        self.start_warmup()
+        if self.arrival_rate:
+            interval_ns = 1e9 / self.arrival_rate
+            start_ns = time.perf_counter_ns()
+            in_flight = set()
+            i = 0
+            while self.warming_up():
+                intended_start = start_ns + int(i * interval_ns)
+                delay = (intended_start - time.perf_counter_ns()) / 1e9
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                task = asyncio.create_task(self.make_request_async(session, intended_start))
+                in_flight.add(task)
+                task.add_done_callback(in_flight.discard)
+                i += 1
+            if in_flight:
+                await asyncio.gather(*in_flight)
+        else:
+            await asyncio.gather(*(self._warm_up_user(session) for _ in range(self.num_threads)))
+        self.finish_warmup()
+
+    async def _warm_up_user(self, session):
+        while self.warming_up():
+            await self.make_request_async(session)
+
+    async def _run_open_loop(self, session, start_ns):
+        """开环模式：按计划时间创建请求协程，在途请求数由连接器上限约束"""
+        interval_ns = 1e9 / self.arrival_rate
+        in_flight = set()
+        for i in range(self.num_requests):
+            intended_start = start_ns + int(i * interval_ns)
+            delay = (intended_start - time.perf_counter_ns()) / 1e9
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if self.stop_event.is_set():
+                break
+            task = asyncio.create_task(self.make_request_async(session, intended_start))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+        if in_flight:
+            await asyncio.gather(*in_flight)
+
+    async def make_request_async(self, session, intended_start=None):
+        request_info = {
+                'url': self.url,
+                'headers': self.headers
+            }
+
+        start_ns = None
+
+        try:
+            request_kwargs, log_message, log_args = self.prepare_request(request_info)
+
+            phases = {'dns': 0, 'connect': 0} if self.phase_timing else None
+            start_ns = time.perf_counter_ns()
+            async with session.post(self.url, headers=self.request_headers, trace_request_ctx=phases, **request_kwargs) as response:
+                headers_ns = time.perf_counter_ns()
+                body = await response.read()
+            end_ns = time.perf_counter_ns()
+
+            self.log_request(response.status != 200, log_message, *log_args, response.status)
+
+            if phases is not None:
+                phases['ttfb'] = max(0, headers_ns - start_ns - phases['dns'] - phases['connect'])
+                phases['body'] = end_ns - headers_ns
+                phases = {name: value / 1e9 for name, value in phases.items()}
+            if intended_start is not None:
+                start_ns = intended_start
+            error_response = None
+            if response.status != 200:
+                text = body.decode('utf-8', errors='replace')
+                try:
+                    error_response = json.loads(text)
+                except ValueError:
+                    error_response = text
+            self.record_response(response.status, end_ns - start_ns, error_response, request_info, phases)
+            if self.raw_log:
+                self.record_raw(start_ns, end_ns - start_ns, response.status, request_kwargs, len(body))
+
+            return response.status
+        except Exception as e:
+            self.record_exception(e, request_info)
+            if self.raw_log and start_ns is not None:
+                # 与成功路径一致，开环模式下从计划发送时间算起
+                if intended_start is not None:
+                    start_ns = intended_start
+                self.record_raw(start_ns, time.perf_counter_ns() - start_ns, 0, request_kwargs, 0)
+            return None
+
+def create_phase_trace_config():
+    """记录 DNS 解析和建连耗时的 aiohttp TraceConfig
+
+    aiohttp 的建连事件包含 DNS 解析、TCP 连接和 TLS 握手，无法单独区分 TLS，
+    因此异步引擎的 TCP 连接耗时包含 TLS 握手。
+    """
+    async def on_dns_start(session, context, params):
+        context.dns_start = time.perf_counter_ns()
+
+    async def on_dns_end(session, context, params):
+        context.trace_request_ctx['dns'] += time.perf_counter_ns() - context.dns_start
+
+    async def on_connection_start(session, context, params):
+        context.connection_start = time.perf_counter_ns()
+        context.dns_before = context.trace_request_ctx['dns']
+
+    async def on_connection_end(session, context, params):
+        phases = context.trace_request_ctx
+        elapsed = time.perf_counter_ns() - context.connection_start
+        phases['connect'] += max(0, elapsed - (phases['dns'] - context.dns_before))
+
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_dns_resolvehost_start.append(on_dns_start)
+    trace_config.on_dns_resolvehost_end.append(on_dns_end)
+    trace_config.on_connection_create_start.append(on_connection_start)
+    trace_config.on_connection_create_end.append(on_connection_end)
+    return trace_config
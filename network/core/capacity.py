@@ -0,0 +1,239 @@
+import math
+import threading
+import time
+from loguru import logger
+from core.load_tester import create_load_tester
+from core.stats import PERCENTILES
+from core.cooldown import Cooldown
+
+# 用户数模式下每个用户的请求数足够大，探测由时长控制结束
+UNBOUNDED_REQUESTS_PER_USER = 10 ** 9
+# 监控线程检查是否提前结束的间隔（秒）
+CHECK_INTERVAL = 0.5
+# 至少完成这么多请求后才判断是否明显违反 SLO
+MIN_CHECK_REQUESTS = 200
+# 延迟或错误率超过限制的这个倍数视为明显违反，立即结束本次探测
+CLEAR_VIOLATION_FACTOR = 2
+# 开环模式下实际 QPS 低于目标速率的这个比例时，视为无法维持该速率
+MIN_RATE_ACHIEVED = 0.9
+CAPACITY_MODES = ('users', 'rate')
+
+def parse_capacity(settings):
+    """解析容量探测配置，缺省值见 README"""
+    mode = settings.get('mode', 'users')
+    if mode not in CAPACITY_MODES:
+        raise ValueError(f"不支持的容量探测模式: {mode}，可选值: {', '.join(CAPACITY_MODES)}")
+    percentile = settings.get('percentile', 'P99')
+    percents = {label: percent for percent, label in PERCENTILES}
+    if percentile not in percents:
+        raise ValueError(f"不支持的分位数: {percentile}，可选值: {', '.join(percents)}")
+    if 'latency_slo' not in settings:
+        raise ValueError("容量探测需要配置 latency_slo（秒）")
+    parsed = {
+        'mode': mode,
+        'percentile': percentile,
+        'percent': percents[percentile],
+        'latency_slo': float(settings['latency_slo']),
+        'max_error_rate': float(settings.get('max_error_rate', 0.01)),
+        'start': settings.get('start', 1 if mode == 'users' else 10),
+        'max': settings.get('max', 1024 if mode == 'users' else 100000),
+        'duration': float(settings.get('duration', 20)),
+        'precision': float(settings.get('precision', 0.05)),
+        'max_probes': int(settings.get('max_probes', 12)),
+        'max_in_flight': int(settings.get('max_in_flight', 200)),
+    }
+    if parsed['latency_slo'] <= 0 or parsed['duration'] <= 0 or not 0 < parsed['start'] <= parsed['max']:
+        raise ValueError(f"无效的容量探测配置: {settings}")
+    return parsed
+
+class CapacitySearch:
+    """按延迟 SLO 和错误率自动探测一个服务的最大可持续负载
+
+    先从 start 开始每次加倍探测，直到某次探测违反 SLO（或达到 max），
+    再在最后一次满足与第一次违反之间二分，直到区间小于 precision。
+    每次探测是一次独立的定时压测；运行中延迟或错误率明显超标时立即结束，不必跑满时长。
+    mode 为 users 时探测并发用户数（闭环），为 rate 时探测开环到达速率（请求/秒）。
+    """
+
+    def __init__(self, service, config, connection_pool=None, progress=None, stop_event=None):
+        self.service = service
+        self.config = config
+        self.settings = parse_capacity(config['capacity'])
+        self.connection_pool = connection_pool
+        self.progress = progress
+        self.stop_event = stop_event if stop_event else threading.Event()
+        self.probes = []
+        # 两次探测之间等待服务恢复
+        self.cooldown = Cooldown(service, config, connection_pool, self.stop_event)
+
+    def _integral(self):
+        return self.settings['mode'] == 'users'
+
+    def _label(self, load):
+        if self._integral():
+            return f"{load} 用户"
+        return f"{load:g} 请求/秒"
+
+    def _create_tester(self, load, probe_stop):
+        settings = self.settings
+        if settings['mode'] == 'users':
+            service = dict(self.service, arrival_rate=None)
+            config = dict(self.config, arrival_rate=None, requests_per_user=UNBOUNDED_REQUESTS_PER_USER)
+            users = load
+        else:
+            # 开环模式下用户数是在途请求上限，请求总数按速率和时长计算
+            users = settings['max_in_flight']
+            service = dict(self.service, arrival_rate=load)
+            config = dict(self.config, arrival_rate=load,
+                          requests_per_user=math.ceil(load * settings['duration'] / users))
+        tester = create_load_tester(service, config, users, connection_pool=self.connection_pool, stop_event=probe_stop)
+        if tester.engine not in ('thread', 'async'):
+            raise ValueError("容量探测模式只支持单进程的 thread 或 async 引擎")
+        return tester, users
+
+    def _watch(self, tester, probe_stop, finished, verdict):
+        """到达时长或明显违反 SLO 时结束探测，预热期间不计时也不判断"""
+        settings = self.settings
+        start = None if tester.warmup else time.perf_counter()
+        while not finished.wait(CHECK_INTERVAL):
+            if self.stop_event.is_set():
+                probe_stop.set()
+                return
+            if tester.warmup and tester.warmup_stats is None:
+                continue
+            if start is None:
+                start = time.perf_counter()
+            if time.perf_counter() - start >= settings['duration']:
+                probe_stop.set()
+                return
+            snapshot = tester.stats.snapshot()
+            completed = snapshot.success_count + snapshot.failure_count
+            if completed < MIN_CHECK_REQUESTS:
+                continue
+            latency = snapshot.histogram.percentile(settings['percent'])
+            error_rate = snapshot.failure_count / completed
+            if latency > settings['latency_slo'] * CLEAR_VIOLATION_FACTOR:
+                verdict['early_stop'] = f"{settings['percentile']} {latency:.3f} 秒明显超过 SLO"
+            elif error_rate > settings['max_error_rate'] * CLEAR_VIOLATION_FACTOR:
+                verdict['early_stop'] = f"错误率 {error_rate:.2%} 明显超过限制"
+            else:
+                continue
+            logger.warning(f"提前结束探测: {verdict['early_stop']}")
+            probe_stop.set()
+            return
+
+    def probe(self, load):
+        """以指定负载压测一次，返回 (是否满足 SLO, 结果)"""
+        settings = self.settings
+        label = self._label(load)
+        logger.info(f"\n容量探测: {label}")
+        probe_stop = threading.Event()
+        tester, users = self._create_tester(load, probe_stop)
+        finished = threading.Event()
+        verdict = {}
+        watcher = threading.Thread(target=self._watch, args=(tester, probe_stop, finished, verdict), daemon=True)
+        if self.progress:
+            self.progress.start_level(self.service['name'], label, tester)
+        watcher.start()
+        try:
+            results = tester.run_load_test()
+        finally:
+            finished.set()
+            watcher.join()
+            if self.progress:
+                self.progress.finish_level()
+
+        completed = results['成功请求数'] + results['失败请求数']
+        latency = float(results[f"{settings['percentile']}响应时间(秒)"])
+        error_rate = results['失败请求数'] / completed if completed else 1
+        qps = float(results['QPS'])
+        passed = (
+            completed > 0 and not verdict.get('early_stop')
+            and latency <= settings['latency_slo'] and error_rate <= settings['max_error_rate']
+        )
+        if settings['mode'] == 'rate' and qps < load * MIN_RATE_ACHIEVED:
+            # 服务或压测端跟不上目标速率
+            passed = False
+        results.update({
+            '服务名称': self.service['name'],
+            '并发用户数': users,
+            '阶段': label,
+            '总请求数': completed,
+            '探测负载': load,
+            'SLO分位数': settings['percentile'],
+            'SLO响应时间(秒)': settings['latency_slo'],
+            '错误率': f"{error_rate:.4f}",
+            '满足SLO': '是' if passed else '否',
+            '提前终止': verdict.get('early_stop', ''),
+        })
+        logger.info(f"探测结果: {label}, QPS {qps:.2f}, {settings['percentile']} {latency:.3f} 秒, "
+                    f"错误率 {error_rate:.2%}, {'满足' if passed else '不满足'} SLO")
+        self.probes.append((load, passed, results))
+        return passed, results
+
+    def _next_probe(self):
+        """两次探测之间冷却，返回是否还可以继续探测"""
+        if self.stop_event.is_set() or len(self.probes) >= self.settings['max_probes']:
+            return False
+        _, _, results = self.probes[-1]
+        results['冷却时间(秒)'] = f"{self.cooldown.wait():.2f}"
+        return not self.stop_event.is_set()
+
+    def run(self):
+        """执行探测，返回 (按负载排序的每次探测结果, 汇总)"""
+        settings = self.settings
+        low, high = None, None  # 满足 SLO 的最大负载，违反 SLO 的最小负载
+
+        self.cooldown.start()
+        # 指数探测：负载逐次加倍，直到违反 SLO 或达到上限
+        load = settings['start']
+        while True:
+            passed, _ = self.probe(load)
+            if not passed:
+                high = load
+                break
+            low = load
+            if load >= settings['max'] or not self._next_probe():
+                break
+            load = min(load * 2, settings['max'])
+
+        # 二分：在 [low, high] 之间逼近 SLO 边界
+        while low is not None and high is not None:
+            if high - low <= max(1 if self._integral() else 0, low * settings['precision']):
+                break
+            if not self._next_probe():
+                break
+            load = (low + high) // 2 if self._integral() else round((low + high) / 2, 2)
+            passed, _ = self.probe(load)
+            if passed:
+                low = load
+            else:
+                high = load
+
+        return sorted((results for _, _, results in self.probes), key=lambda results: results['探测负载']), \
+            self._summary(low, high)
+
+    def _summary(self, low, high):
+        settings = self.settings
+        best = next((results for load, passed, results in self.probes if passed and load == low), None)
+        summary = {
+            '服务名称': self.service['name'],
+            '探测模式': '并发用户数' if self._integral() else '到达速率',
+            'SLO': f"{settings['percentile']} <= {settings['latency_slo']} 秒，错误率 <= {settings['max_error_rate']:.2%}",
+            '最大可持续负载': low if low is not None else 0,
+            '最大可持续QPS': best['QPS'] if best else '0.00',
+            '首个违反SLO的负载': high,
+            '探测次数': len(self.probes),
+        }
+        if low is None:
+            logger.warning(f"起始负载 {self._label(settings['start'])} 已不满足 SLO")
+        elif high is None:
+            logger.info(f"达到探测上限 {self._label(low)} 仍满足 SLO，实际容量可能更高")
+        logger.info("\n容量探测结果:")
+        for key, value in summary.items():
+            logger.info(f"{key}: {value}")
+        return summary
+
+def run_capacity_search(service, config, connection_pool=None, progress=None, stop_event=None):
+    """按 config['capacity'] 对一个服务执行容量探测，返回 (每次探测的结果, 汇总)"""
+    return CapacitySearch(service, config, connection_pool, progress, stop_event).run()
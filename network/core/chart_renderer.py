@@ -0,0 +1,115 @@
+import os
+import json
+import shutil
+import hashlib
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from loguru import logger
+from core.analyse_plt import analyze_results, get_companion_filename
+
+# 渲染图表的工作进程数
+CHART_WORKERS = 2
+# 图表目录名：<会话结果目录>/charts/<输入数据哈希>/
+CHARTS_DIR = 'charts'
+# 图表目录中记录 {图表名: 文件名} 的清单，存在即表示该目录已渲染完成
+MANIFEST_FILE = 'charts.json'
+# 对比结果旁边参与绘图的明细文件前缀
+CHART_INPUT_PREFIXES = ('timeseries_', 'latency_histogram_', 'latency_heatmap_')
+
+def chart_inputs(csv_file):
+    """绘图用到的输入文件：(文件角色, 路径)，文件名中的时间戳不参与哈希"""
+    inputs = [('performance_comparison_', csv_file)]
+    for prefix in CHART_INPUT_PREFIXES:
+        path = get_companion_filename(csv_file, prefix)
+        if os.path.exists(path):
+            inputs.append((prefix, path))
+    return inputs
+
+def input_digest(inputs):
+    """输入文件内容的 sha256，相同数据得到同一个图表目录"""
+    digest = hashlib.sha256()
+    for role, path in inputs:
+        digest.update(role.encode('utf-8'))
+        digest.update(str(os.path.getsize(path)).encode('utf-8'))
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+    return digest.hexdigest()
+
+def read_manifest(output_dir):
+    try:
+        with open(os.path.join(output_dir, MANIFEST_FILE), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def _render(csv_file, output_dir):
+    """在工作进程中生成图表，先写入临时目录再整体改名，不会留下只渲染了一半的目录"""
+    tmp_dir = f"{output_dir}.tmp-{os.getpid()}"
+    os.makedirs(tmp_dir, exist_ok=True)
+    try:
+        charts = analyze_results(csv_file, tmp_dir)
+        with open(os.path.join(tmp_dir, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+            json.dump(charts, f, ensure_ascii=False)
+        os.rename(tmp_dir, output_dir)
+    except OSError:
+        # 相同输入已由其他进程生成
+        charts = read_manifest(output_dir)
+        if charts is None:
+            raise
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return charts
+
+class ChartRenderer:
+    """在独立进程池中渲染图表，按输入数据哈希缓存
+
+    matplotlib 绘图是纯 CPU 计算，放在工作进程中不会占用 Web 服务进程的 GIL。
+    图表写入 <结果目录>/charts/<哈希>/，同一份数据再次请求时直接返回已有图表；
+    同时提交的相同数据只渲染一次。
+    """
+
+    def __init__(self, max_workers=CHART_WORKERS):
+        self.max_workers = max_workers
+        self._executor = None
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        if self._executor is None:
+            ctx = multiprocessing.get_context('spawn')
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=ctx)
+        return self._executor
+
+    def render(self, csv_file, results_dir):
+        """渲染对比结果的全部图表，返回 {图表名: 图表文件路径}，没有数据的图表为 None"""
+        output_dir = os.path.join(results_dir, CHARTS_DIR, input_digest(chart_inputs(csv_file)))
+        charts = read_manifest(output_dir)
+        if charts is not None:
+            logger.info(f"图表缓存命中: {output_dir}")
+        else:
+            with self._lock:
+                future = self._pending.get(output_dir)
+                submitted = future is None
+                if submitted:
+                    os.makedirs(os.path.dirname(output_dir), exist_ok=True)
+                    future = self._pending[output_dir] = self._get_executor().submit(_render, csv_file, output_dir)
+            if submitted:
+                future.add_done_callback(lambda _: self._forget(output_dir))
+            try:
+                charts = future.result()
+            except BrokenProcessPool:
+                # 工作进程异常退出后进程池不可再用，下次渲染时重建
+                with self._lock:
+                    self._executor = None
+                raise
+        return {
+            name: os.path.join(output_dir, filename) if filename else None
+            for name, filename in charts.items()
+        }
+
+    def _forget(self, output_dir):
+        with self._lock:
+            self._pending.pop(output_dir, None)
@@ -0,0 +1,122 @@
+import statistics
+import threading
+import time
+from collections import deque
+from loguru import logger
+from core.load_tester import create_load_tester
+
+# 测不到基线时退回的固定冷却时间（秒）
+FALLBACK_COOLDOWN = 2
+# 基线很小时允许的绝对误差（秒），避免毫秒级抖动导致一直无法恢复
+ABSOLUTE_SLACK = 0.005
+
+def parse_cooldown(settings):
+    """解析冷却配置，返回 None（不冷却）、固定秒数或自适应冷却参数
+
+    - 不配置或为 true：自适应冷却，使用默认参数
+    - 数字：固定冷却的秒数，0 或 false 表示不冷却
+    - 对象：自适应冷却，覆盖默认参数
+    """
+    if settings is None or settings is True:
+        settings = {}
+    if settings is False:
+        return None
+    if isinstance(settings, (int, float)):
+        return float(settings) if settings > 0 else None
+    parsed = {
+        'tolerance': float(settings.get('tolerance', 0.2)),
+        'max_wait': float(settings.get('max_wait', 30)),
+        'min_wait': float(settings.get('min_wait', 0)),
+        'probe_requests': int(settings.get('probe_requests', 5)),
+        'probe_interval': float(settings.get('probe_interval', 0.1)),
+    }
+    if parsed['tolerance'] < 0 or parsed['probe_requests'] < 1 or parsed['max_wait'] < parsed['min_wait']:
+        raise ValueError(f"无效的冷却配置: {settings}")
+    return parsed
+
+class Cooldown:
+    """测试之间的自适应冷却
+
+    开始测试前以很低的速率向服务发送少量探测请求，取响应时间中位数作为基线；
+    每个测试结束后继续低速探测，直到最近 probe_requests 次探测全部成功且中位数
+    回到基线的 (1 + tolerance) 倍以内，或等待达到 max_wait。
+    重负载后服务还在排空队列时多等一会儿，轻负载后几乎不必等待。
+    配置为固定秒数时退化为原来的固定暂停。
+    """
+
+    def __init__(self, service, config, connection_pool=None, stop_event=None):
+        self.service = service
+        self.config = config
+        self.settings = parse_cooldown(service.get('cooldown', config.get('cooldown')))
+        self.connection_pool = connection_pool
+        self.stop_event = stop_event if stop_event else threading.Event()
+        self.baseline = None
+        self.tester = None
+
+    def adaptive(self):
+        return isinstance(self.settings, dict)
+
+    def _create_tester(self):
+        # 探测请求始终用单线程 thread 引擎直接发送，不预热，只记录失败请求的日志，不写错误样本和原始记录
+        service = dict(self.service, engine='thread', processes=1, agents=None, arrival_rate=None,
+                       raw_log=False, request_log='errors', warmup=None)
+        config = dict(self.config, engine='thread', processes=1, agents=None, arrival_rate=None,
+                      raw_log=False, request_log='errors', warmup=None)
+        return create_load_tester(service, config, 1, connection_pool=self.connection_pool,
+                                  stop_event=self.stop_event, error_stream=False)
+
+    def _probe(self):
+        """发送一次探测请求，返回响应时间（秒），失败时返回 None"""
+        start = time.perf_counter()
+        status = self.tester.make_request()
+        if status != 200:
+            return None
+        return time.perf_counter() - start
+
+    def start(self):
+        """测试开始前测量基线响应时间"""
+        if not self.adaptive():
+            return
+        self.tester = self._create_tester()
+        latencies = []
+        for _ in range(self.settings['probe_requests']):
+            if self.stop_event.is_set():
+                return
+            latency = self._probe()
+            if latency is not None:
+                latencies.append(latency)
+            self.stop_event.wait(self.settings['probe_interval'])
+        if not latencies:
+            logger.warning(f"无法测量 {self.service['name']} 的基线响应时间，测试之间固定冷却 {FALLBACK_COOLDOWN} 秒")
+            return
+        self.baseline = statistics.median(latencies)
+        logger.info(f"{self.service['name']} 基线响应时间: {self.baseline:.4f} 秒")
+
+    def wait(self):
+        """等待服务恢复，返回实际冷却时间（秒）"""
+        if self.settings is None:
+            return 0.0
+        if not self.adaptive() or self.baseline is None:
+            seconds = self.settings if not self.adaptive() else FALLBACK_COOLDOWN
+            self.stop_event.wait(seconds)
+            return float(seconds)
+
+        settings = self.settings
+        threshold = max(self.baseline * (1 + settings['tolerance']), self.baseline + ABSOLUTE_SLACK)
+        start = time.perf_counter()
+        self.stop_event.wait(settings['min_wait'])
+        # 最近几次探测的响应时间，失败记为无穷大
+        recent = deque(maxlen=settings['probe_requests'])
+        while not self.stop_event.is_set():
+            latency = self._probe()
+            recent.append(latency if latency is not None else float('inf'))
+            elapsed = time.perf_counter() - start
+            if len(recent) == recent.maxlen and max(recent) != float('inf') and statistics.median(recent) <= threshold:
+                logger.info(f"{self.service['name']} 已恢复，冷却 {elapsed:.2f} 秒")
+                break
+            if elapsed >= settings['max_wait']:
+                logger.warning(f"{self.service['name']} 冷却 {elapsed:.2f} 秒后响应时间仍未回到基线 "
+                               f"{self.baseline:.4f} 秒附近，继续下一个测试")
+                break
+            self.stop_event.wait(settings['probe_interval'])
+        return time.perf_counter() - start
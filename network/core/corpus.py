@@ -0,0 +1,128 @@
+import os
+import mmap
+import threading
+from array import array
+from collections import OrderedDict
+from loguru import logger
+
+CORPUS_ORDERS = ('round_robin', 'random')
+# 目录模式下同时保持映射的文件数上限，每个映射占用一个文件描述符
+MAX_MAPPED_FILES = 256
+
+def resolve_corpus_path(root, corpus):
+    """把外部提交的语料路径解析到 root 目录下，路径越出 root 或不存在时返回 None"""
+    root = os.path.realpath(root)
+    path = os.path.realpath(os.path.join(root, corpus))
+    if os.path.commonpath([root, path]) != root or path == root or not os.path.exists(path):
+        return None
+    return path
+
+def _map_file(path):
+    """只读映射整个文件，空文件返回空的 memoryview"""
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return memoryview(b'')
+        return memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+class PayloadCorpus:
+    """请求载荷语料库
+
+    path 可以是目录（每个文件是一个载荷，如图片）或 JSONL 文件（每行是一个 JSON 请求体）。
+    打开时建立索引：目录记录文件列表，JSONL 映射整个文件并记录每行的偏移。
+    载荷以指向 mmap 的 memoryview 返回，不把整个语料读入内存；目录模式最多同时映射
+    MAX_MAPPED_FILES 个文件，超出时按 LRU 关闭，文件数再多也不会耗尽文件描述符。
+    同一路径的语料在进程内共享，各并发度不重复建索引；目录或文件修改后重新建索引。
+    """
+    _instances = {}
+    _instances_lock = threading.Lock()
+
+    @classmethod
+    def open(cls, path):
+        key = os.path.abspath(path)
+        stat = os.stat(key)
+        # 目录增删文件、JSONL 文件被改写时修改时间会变化
+        signature = (stat.st_mtime_ns, stat.st_size)
+        with cls._instances_lock:
+            cached = cls._instances.get(key)
+            if cached is None or cached[0] != signature:
+                cls._instances[key] = (signature, cls(key))
+            return cls._instances[key][1]
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        if os.path.isdir(path):
+            self.files = sorted(
+                os.path.join(path, name) for name in os.listdir(path)
+                if os.path.isfile(os.path.join(path, name))
+            )
+            # 文件序号 -> 映射，按最近使用排序
+            self._mapped = OrderedDict()
+            self.size = len(self.files)
+            self.kind = 'directory'
+        else:
+            self._data = _map_file(path)
+            self._offsets = self._index_lines(self._data)
+            self.size = len(self._offsets) // 2
+            self.kind = 'jsonl'
+        if self.size == 0:
+            raise ValueError(f"语料为空: {path}")
+        logger.info(f"已加载语料 {path}，共 {self.size} 个载荷")
+
+    @staticmethod
+    def _index_lines(data):
+        """记录每个非空行的 [起始, 结束) 偏移，两个偏移一组存放在紧凑数组中"""
+        offsets = array('q')
+        raw = data.obj if isinstance(data.obj, mmap.mmap) else bytes(data)
+        start = 0
+        length = len(data)
+        while start < length:
+            end = raw.find(b'\n', start)
+            if end == -1:
+                end = length
+            line_end = end - 1 if end > start and data[end - 1] == ord('\r') else end
+            # 跳过空行（只检查短行是否全为空白，避免复制大行）
+            if line_end - start > 16 or data[start:line_end].tobytes().strip():
+                offsets.append(start)
+                offsets.append(line_end)
+            start = end + 1
+        return offsets
+
+    def payload(self, index):
+        """第 index 个载荷（memoryview）"""
+        index %= self.size
+        if self.kind == 'jsonl':
+            return self._data[self._offsets[2 * index]:self._offsets[2 * index + 1]]
+        with self._lock:
+            mapped = self._mapped.get(index)
+            if mapped is not None:
+                self._mapped.move_to_end(index)
+                return memoryview(mapped)
+        # 缓存 mmap 对象本身，每次返回新的 memoryview，淘汰时没有在途请求的映射可以立即关闭
+        mapped = _map_file(self.files[index]).obj
+        with self._lock:
+            # 并发映射同一文件时以先放入的为准，多余的映射随引用释放
+            cached = self._mapped.get(index)
+            if cached is not None:
+                return memoryview(cached)
+            self._mapped[index] = mapped
+            while len(self._mapped) > MAX_MAPPED_FILES:
+                _, evicted = self._mapped.popitem(last=False)
+                self._close(evicted)
+            return memoryview(mapped)
+
+    @staticmethod
+    def _close(mapped):
+        """关闭淘汰的映射；仍有请求在发送时关闭会失败，映射在引用释放后自动关闭"""
+        if isinstance(mapped, mmap.mmap):
+            try:
+                mapped.close()
+            except BufferError:
+                pass
+
+    def describe(self, index):
+        """载荷的可读标识，用于错误记录和日志"""
+        index %= self.size
+        if self.kind == 'jsonl':
+            return f"{os.path.basename(self.path)}#{index + 1}"
+        return os.path.basename(self.files[index])
@@ -0,0 +1,173 @@
+import os
+import base64
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from loguru import logger
+from core.load_tester import LoadTester, get_tester_class
+from core.sharding import plan_shards, PROGRESS_INTERVAL
+
+# 从下发配置到同时开始发压预留的时间（秒），各节点在此期间完成初始化
+AGENT_START_DELAY = 3
+# 连接 agent 和下发配置的超时时间（秒）
+AGENT_REQUEST_TIMEOUT = 10
+# 携带共享令牌的请求头，agent 配置了令牌时所有 /agent/* 请求都要带上
+AGENT_TOKEN_HEADER = 'X-Agent-Token'
+
+def agent_url(agent, path):
+    return agent.rstrip('/') + path
+
+def agent_headers():
+    """访问 agent 的请求头，设置了环境变量 AGENT_TOKEN 时带上共享令牌"""
+    token = os.environ.get('AGENT_TOKEN')
+    return {AGENT_TOKEN_HEADER: token} if token else {}
+
+def measure_clock_offset(agent):
+    """估算 agent 时钟与本机时钟的差值（秒），取请求往返的中点对齐"""
+    sent = time.time()
+    response = requests.get(agent_url(agent, '/agent/health'), headers=agent_headers(), timeout=AGENT_REQUEST_TIMEOUT)
+    received = time.time()
+    response.raise_for_status()
+    return response.json()['time'] - (sent + received) / 2
+
+def shift_timeline(stats, seconds):
+    """把 export_stats 导出的按秒统计平移到控制端时钟"""
+    if seconds:
+        stats['stats']['timeline'] = {
+            str(int(second) - seconds): bucket
+            for second, bucket in stats['stats'].get('timeline', {}).items()
+        }
+    return stats
+
+class DistributedLoadTester(LoadTester):
+    """多节点压测引擎（控制端）
+
+    把一个并发度的用户数和请求数均匀拆分到多个 agent 节点（network/agent.py），
+    各节点按对齐后的时钟在同一时刻开始发压，结束后控制端合并成功/失败数、
+    延迟直方图、按秒时间序列和错误记录，输出与单机测试相同的结果。
+    """
+    engine = 'distributed'
+
+    def __init__(self, agents, agent_engine='thread', agent_processes=1, **kwargs):
+        # 原始请求记录写在各 agent 本地，结果中只汇总文件名
+        super().__init__(**dict(kwargs, raw_log=False))
+        if not agents:
+            raise ValueError("分布式模式至少需要一个 agent")
+        get_tester_class(agent_engine)  # 提前校验引擎名称
+        self.agents = agents[:max(1, min(len(agents), self.num_threads))]
+        self.agent_engine = agent_engine
+        self.agent_processes = agent_processes
+        # agent 重新构造测试实例所需的参数，结果文件写在控制端，session_dir 不下发
+        self.agent_kwargs = {
+            key: value for key, value in kwargs.items()
+            if key not in ('connection_pool', 'stop_event', 'num_threads', 'num_requests', 'session_dir', 'image_path', 'error_stream')
+        }
+
+    def log_test_info(self):
+        super().log_test_info()
+        logger.info(f"压测节点: {', '.join(self.agents)}，节点内引擎: {self.agent_engine}，进程数: {self.agent_processes}")
+
+    def build_payload(self, threads, num_requests, start_at, warmup=None, rate_share=1.0):
+        kwargs = dict(self.agent_kwargs, num_threads=threads, num_requests=num_requests, warmup=warmup)
+        if self.arrival_rate:
+            # 开环速率按 plan_shards 给出的比例拆分到各节点
+            kwargs['arrival_rate'] = self.arrival_rate * rate_share
+        payload = {
+            'tester_kwargs': kwargs,
+            'engine': self.agent_engine,
+            'processes': self.agent_processes,
+            'keep_alive': self.connection_pool.keep_alive,
+            'start_at': start_at
+        }
+        if self.image_data is not None:
+            # 图片随配置下发，agent 不需要访问控制端的文件
+            payload['image_data'] = base64.b64encode(self.image_data).decode('ascii')
+        return payload
+
+    def execute(self):
+        # 分不到线程或请求的节点不参与本次测试
+        plan = plan_shards(self.num_threads, self.num_requests, self.warmup, len(self.agents))
+        if not plan:
+            return 0.0
+        agents = [self.agents[i] for i, *_ in plan]
+        offsets = [measure_clock_offset(agent) for agent in agents]
+        for agent, offset in zip(agents, offsets):
+            if abs(offset) > 1:
+                logger.warning(f"agent {agent} 的时钟与控制端相差 {offset:.3f} 秒，已按差值对齐开始时间")
+
+        start_at = time.time() + AGENT_START_DELAY
+
+        done = threading.Event()
+        watcher = threading.Thread(target=self._watch_agents, args=(agents, done), daemon=True)
+        watcher.start()
+        try:
+            with ThreadPoolExecutor(max_workers=len(agents)) as executor:
+                futures = [
+                    executor.submit(
+                        self._run_agent, agent,
+                        self.build_payload(threads, requests, start_at + offset, warmup, share)
+                    )
+                    for agent, offset, (_, threads, requests, warmup, share) in zip(agents, offsets, plan)
+                ]
+                agent_results = [future.result() for future in futures]
+        finally:
+            done.set()
+            watcher.join()
+
+        errors = [f"{agent}: {error}" for agent, (_, error) in zip(agents, agent_results) if error]
+        if errors:
+            raise RuntimeError(f"压测节点执行失败: {'; '.join(errors)}")
+
+        start_time = end_time = None
+        for offset, (stats, _) in zip(offsets, agent_results):
+            self.merge_stats(shift_timeline(stats, round(offset)))
+            agent_start = stats['start_time'] - offset
+            agent_end = stats['end_time'] - offset
+            start_time = agent_start if start_time is None else min(start_time, agent_start)
+            end_time = agent_end if end_time is None else max(end_time, agent_end)
+        # 完整统计已合并，之后的进度直接读取合并后的统计
+        self.remote_progress = {}
+        return end_time - start_time
+
+    def _run_agent(self, agent, payload):
+        """在一个 agent 上执行测试，阻塞到测试结束，返回 (stats, error)"""
+        try:
+            response = requests.post(
+                agent_url(agent, '/agent/run'), json=payload, headers=agent_headers(),
+                timeout=(AGENT_REQUEST_TIMEOUT, None)
+            )
+            data = response.json()
+            if response.status_code != 200:
+                return None, data.get('error', f"状态码: {response.status_code}")
+            return data, None
+        except Exception as e:
+            return None, f"{type(e).__name__}: {str(e)}"
+
+    def _watch_agents(self, agents, done):
+        """测试期间每秒拉取各 agent 的实时进度，测试被取消时通知所有 agent 停止发送请求"""
+        stopped = False
+        next_poll = time.perf_counter()
+        while not done.wait(0.5):
+            if self.stop_event.is_set() and not stopped:
+                stopped = True
+                for agent in agents:
+                    try:
+                        requests.post(agent_url(agent, '/agent/stop'), headers=agent_headers(), timeout=AGENT_REQUEST_TIMEOUT)
+                    except Exception as e:
+                        logger.error(f"通知 agent {agent} 停止失败: {str(e)}")
+            if time.perf_counter() >= next_poll:
+                next_poll = time.perf_counter() + PROGRESS_INTERVAL
+                for agent in agents:
+                    self._poll_progress(agent)
+
+    def _poll_progress(self, agent):
+        """拉取一个 agent 的实时进度，失败时保留上一次的进度"""
+        try:
+            response = requests.get(agent_url(agent, '/agent/progress'), headers=agent_headers(), timeout=PROGRESS_INTERVAL)
+            progress = response.json()
+        except Exception as e:
+            logger.debug(f"获取 agent {agent} 的进度失败: {str(e)}")
+            return
+        if progress:
+            self.remote_progress[agent] = progress
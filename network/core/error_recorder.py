@@ -0,0 +1,163 @@
+import os
+import re
+import json
+import time
+import uuid
+import threading
+from datetime import datetime
+
+# 每组错误写入样本文件的最大条数
+MAX_SAMPLES_PER_GROUP = 20
+# 每组错误在内存中保留、写入汇总的样本条数
+SUMMARY_SAMPLES_PER_GROUP = 3
+# 最多区分的错误组数，超出后归入同一组
+MAX_GROUPS = 1000
+# 错误消息和样本中响应内容的最大长度
+MAX_MESSAGE_LENGTH = 200
+MAX_RESPONSE_LENGTH = 4096
+
+OVERFLOW_GROUP = (None, None, '错误种类过多，其余错误合并统计')
+
+# 归一化时替换为 # 的易变内容：UUID、长十六进制串、数字
+_VOLATILE = re.compile(r'[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}|\b[0-9a-fA-F]{16,}\b|\d+')
+
+def _to_text(value):
+    if isinstance(value, str):
+        return value
+    return json.dumps(value, ensure_ascii=False, sort_keys=True)
+
+def normalize_message(message):
+    """去掉消息中的编号、时间等易变内容，使同类错误归入同一组"""
+    return _VOLATILE.sub('#', _to_text(message))[:MAX_MESSAGE_LENGTH]
+
+def _format_time(timestamp):
+    return datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S')
+
+class ErrorRecorder:
+    """有界的错误聚合记录
+
+    错误按 (状态码, 异常类型, 归一化消息) 分组计数，每组最多把 max_samples 条样本
+    边运行边追加写入 JSONL 文件，内存中只保留少量样本用于汇总。
+    内存占用只与错误种类数有关，与错误总数无关。
+    stream_dir 为空时不写样本文件（例如多进程分片，由父进程合并后统一写入）。
+    """
+
+    def __init__(self, stream_dir=None, max_samples=MAX_SAMPLES_PER_GROUP):
+        self.stream_dir = stream_dir
+        self.max_samples = max_samples
+        self.groups = {}
+        self.total = 0
+        self.samples_file = None
+        self._file = None
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def record(self, status_code, error_response, request_info, exception=None):
+        key = (status_code, exception, normalize_message(error_response))
+        now = time.time()
+        with self._lock:
+            self.total += 1
+            group = self._group(key, now)
+            group['count'] += 1
+            group['last_seen'] = now
+            if group['sampled'] >= self.max_samples:
+                return
+            group['sampled'] += 1
+            sample = self._make_sample(now, status_code, exception, error_response, request_info)
+            if len(group['samples']) < SUMMARY_SAMPLES_PER_GROUP:
+                group['samples'].append(sample)
+            self._write(sample)
+
+    def _group(self, key, now):
+        group = self.groups.get(key)
+        if group is None:
+            if len(self.groups) >= MAX_GROUPS:
+                key = OVERFLOW_GROUP
+                group = self.groups.get(key)
+            if group is None:
+                group = self.groups[key] = {
+                    'count': 0, 'sampled': 0, 'samples': [],
+                    'first_seen': now, 'last_seen': now
+                }
+        return group
+
+    @staticmethod
+    def _make_sample(now, status_code, exception, error_response, request_info):
+        request_info = dict(request_info)
+        if isinstance(request_info.get('body'), bytes):
+            # 请求体只在保留样本时才解析回 JSON，便于阅读
+            request_info['body'] = json.loads(request_info['body'])
+        if len(_to_text(error_response)) > MAX_RESPONSE_LENGTH:
+            error_response = _to_text(error_response)[:MAX_RESPONSE_LENGTH] + '...(已截断)'
+        return {
+            'timestamp': _format_time(now),
+            'status_code': status_code,
+            'exception': exception,
+            'error_response': error_response,
+            'request_info': request_info
+        }
+
+    def _write(self, sample):
+        if not self.stream_dir or self._closed:
+            return
+        if self._file is None:
+            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+            self.samples_file = f"error_samples_{timestamp}_{uuid.uuid4().hex[:6]}.jsonl"
+            self._file = open(os.path.join(self.stream_dir, self.samples_file), 'a', encoding='utf-8')
+        self._file.write(json.dumps(sample, ensure_ascii=False) + '\n')
+        self._file.flush()
+
+    def close(self):
+        with self._lock:
+            # 关闭后仍可能有在途请求记录错误，只计数不再写文件
+            self._closed = True
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def to_dict(self):
+        """导出可合并的分组数据，用于多进程/多节点汇总"""
+        with self._lock:
+            return {
+                'total': self.total,
+                'groups': [
+                    dict(group, status_code=key[0], exception=key[1], message=key[2])
+                    for key, group in self.groups.items()
+                ]
+            }
+
+    def merge(self, data):
+        """合并 to_dict 导出的分组，带来的样本同样写入本地样本文件"""
+        with self._lock:
+            self.total += data['total']
+            for item in data['groups']:
+                key = (item['status_code'], item['exception'], item['message'])
+                group = self._group(key, item['first_seen'])
+                group['count'] += item['count']
+                group['first_seen'] = min(group['first_seen'], item['first_seen'])
+                group['last_seen'] = max(group['last_seen'], item['last_seen'])
+                for sample in item['samples']:
+                    if group['sampled'] >= self.max_samples:
+                        break
+                    group['sampled'] += 1
+                    if len(group['samples']) < SUMMARY_SAMPLES_PER_GROUP:
+                        group['samples'].append(sample)
+                    self._write(sample)
+
+    def summary(self):
+        """按出现次数从多到少排列的分组汇总"""
+        with self._lock:
+            groups = sorted(self.groups.items(), key=lambda item: item[1]['count'], reverse=True)
+            return {
+                'total': self.total,
+                'samples_file': self.samples_file,
+                'groups': [{
+                    'status_code': key[0],
+                    'exception': key[1],
+                    'message': key[2],
+                    'count': group['count'],
+                    'first_seen': _format_time(group['first_seen']),
+                    'last_seen': _format_time(group['last_seen']),
+                    'samples': group['samples']
+                } for key, group in groups]
+            }
@@ -0,0 +1,128 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from uuid import uuid4
+from loguru import logger
+from core.progress import ProgressTracker
+
+class JobQueueFull(Exception):
+    """等待队列已满"""
+
+class JobCancelled(Exception):
+    """任务被取消"""
+
+class Job:
+    """一次后台压测任务"""
+
+    def __init__(self, test_session, config):
+        self.job_id = str(uuid4())
+        self.test_session = test_session
+        self.session_id = test_session.session_id
+        self.config = config
+        self.status = 'queued'  # queued / running / succeeded / failed / cancelled
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.result = None
+        self.error = None
+        self.progress = ProgressTracker()
+        self.cancel_event = threading.Event()
+        self.done_event = threading.Event()
+        self.future = None
+
+    @property
+    def finished(self):
+        return self.done_event.is_set()
+
+    def to_dict(self):
+        return {
+            'job_id': self.job_id,
+            'status': self.status,
+            'cancelling': self.cancel_event.is_set() and not self.finished,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'error': self.error
+        }
+
+class JobManager:
+    """后台压测任务管理
+
+    任务提交到有界的后台线程池执行，超出 max_running 的任务在队列中等待，
+    队列最多 max_queued 个。默认同时只运行一个任务，避免两个重负载任务争抢
+    压测端 CPU 导致两边的测量结果都失真。
+    """
+
+    def __init__(self, runner, max_running=1, max_queued=8, max_history=50):
+        self.runner = runner
+        self.max_queued = max_queued
+        self.max_history = max_history
+        self.jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_running, thread_name_prefix='load-test-job')
+
+    def submit(self, test_session, config):
+        with self._lock:
+            queued = sum(1 for job in self.jobs.values() if job.status == 'queued')
+            if queued >= self.max_queued:
+                raise JobQueueFull(f"等待中的任务已达上限 {self.max_queued}")
+            job = Job(test_session, config)
+            self.jobs[job.job_id] = job
+            self._prune()
+            job.future = self._executor.submit(self._run, job)
+        logger.info(f"已提交压测任务: {job.job_id}")
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def queue_position(self, job):
+        """排在该任务前面的等待任务数"""
+        with self._lock:
+            position = 0
+            for other in self.jobs.values():
+                if other is job:
+                    return position
+                if other.status == 'queued':
+                    position += 1
+        return position
+
+    def cancel(self, job):
+        """取消任务：等待中的任务直接移出队列，运行中的任务在当前请求结束后停止"""
+        if job.finished:
+            return False
+        job.cancel_event.set()
+        if job.future.cancel():
+            self._finish(job, 'cancelled')
+        logger.info(f"已请求取消压测任务: {job.job_id}")
+        return True
+
+    def _run(self, job):
+        if job.cancel_event.is_set():
+            self._finish(job, 'cancelled')
+            return
+        job.status = 'running'
+        job.started_at = time.time()
+        try:
+            job.result = self.runner(job)
+            self._finish(job, 'succeeded')
+        except JobCancelled:
+            self._finish(job, 'cancelled')
+        except Exception as e:
+            logger.exception(f"压测任务执行失败: {job.job_id}")
+            job.error = str(e)
+            self._finish(job, 'failed')
+
+    def _finish(self, job, status):
+        job.status = status
+        job.finished_at = time.time()
+        job.done_event.set()
+        logger.info(f"压测任务 {job.job_id} 结束，状态: {status}")
+
+    def _prune(self):
+        """只保留最近 max_history 个已结束的任务"""
+        finished = [job_id for job_id, job in self.jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(finished) - self.max_history)]:
+            del self.jobs[job_id]
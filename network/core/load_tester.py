@@ -1,24 +1,35 @@
 import os
+import sys
 import requests
 import time
 import threading
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ThreadPoolExecutor, wait
 import json
 import argparse
 import uuid
 import random
-import string
+import itertools
 from loguru import logger
 import csv
 from datetime import datetime
-from core.analyse_plt import analyze_results
+from core.analyse_plt import analyze_results, get_timeseries_filename
 import io
 import cv2
 import numpy as np
-from core.utils import ImageCache
+from core.utils import ImageCache, ConnectionPool
+from core.stats import ShardedStats, StatsShard, PERCENTILES, PHASE_PERCENTILES, size_class
+from core.timing import PHASES, start_phase_timing, finish_phase_timing
+from core.templating import RequestTemplate
+from core.corpus import PayloadCorpus, CORPUS_ORDERS
+from core.error_recorder import ErrorRecorder
+from core.raw_log import create_raw_log
+from core.run_store import RunStore, resolve_baseline, format_report
+from core.request_log import RequestLogPolicy, request_logger, configure_logging
 
 class LoadTester:
-    def __init__(self, name, url, request_type, request_body, headers, num_threads, num_requests, session_dir=None, image_path=None):
+    engine = 'thread'
+
+    def __init__(self, name, url, request_type, request_body, headers, num_threads, num_requests, session_dir=None, image_path=None, connection_pool=None, arrival_rate=None, request_log='all', request_log_sample_rate=100, stop_event=None, phase_timing=False, template_fields=None, image_encode=None, corpus=None, corpus_order='round_robin', error_stream=True, raw_log=False, warmup=None):
         if session_dir is None:
             session_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'results')
             os.makedirs(session_dir, exist_ok=True)
@@ -30,155 +41,536 @@ class LoadTester:
         self.base_request_body = request_body
         self.image_path = image_path
         self.headers = headers if headers else {'Content-Type': 'application/json'}
+        # JSON 请求体以字节发送，未指定 Content-Type 时补上
+        self.request_headers = dict(self.headers)
+        if request_type == 'json' and not any(key.lower() == 'content-type' for key in self.request_headers):
+            self.request_headers['Content-Type'] = 'application/json'
         self.num_threads = num_threads
         self.num_requests = num_requests
-        self.success_count = 0
-        self.failure_count = 0
-        self.response_times = []
-        self.lock = threading.Lock()
+        # 开环模式的目标速率（请求/秒），为空时使用闭环模式
+        self.arrival_rate = arrival_rate
+        # 设置后不再发送新请求，用于取消测试
+        self.stop_event = stop_event if stop_event else threading.Event()
+        # 是否记录 DNS/TCP/TLS/首字节/响应体分阶段耗时
+        self.phase_timing = phase_timing
+        # 单请求日志策略
+        self.request_log = RequestLogPolicy(request_log, request_log_sample_rate)
+        # 按线程分片的计数与延迟直方图，内存占用与请求数无关
+        self.stats = ShardedStats()
         self.image_cache = ImageCache.get_instance()
         self.image_data = None
-        self.error_records = []  # 添加错误记录列表
-        self.error_lock = threading.Lock()  # 添加错误记录的锁
+        # 错误按类型聚合计数，样本边运行边写入 JSONL 文件；error_stream=False 时只在内存中汇总
+        self.error_stream = error_stream
+        self.error_recorder = self.create_error_recorder()
+        # 可选的逐请求原始记录，由后台线程写入二进制文件
+        self.raw_log = create_raw_log(self.session_dir, name, num_threads) if raw_log else None
+        # 多进程/多节点汇总时各分片的原始记录文件
+        self.raw_log_files = [os.path.basename(self.raw_log.filepath)] if self.raw_log else []
+        # 可选的预热阶段：以相同并发度发压，统计单独记录，不计入正式结果
+        self.warmup = parse_warmup(warmup)
+        self.warmup_stats = None
+        self.warmup_time = 0.0
+        self._warmup_start = None
+        # 正在预热，供进度显示
+        self.in_warmup = False
+        # 多进程/多节点模式下各子进程或 agent 上报的实时进度（export_progress 的结果）
+        self.remote_progress = {}
+        self._warmup_counter = itertools.count()
+        # 未传入连接池时使用独立的池，保证单独调用 make_request 也能复用连接
+        self.connection_pool = connection_pool if connection_pool else ConnectionPool()
 
-        # 如果是图片请求，从缓存获取图片数据
-        if self.request_type == 'image' and self.image_path:
-            self.image_data = self.image_cache.get_image_data(self.image_path)
+        # 如果是图片请求，从缓存获取图片数据；默认原样发送文件内容，image_encode 指定格式时重新编码
+        self.image_encode = image_encode
+        if self.request_type == 'image' and self.image_path and not corpus:
+            self.image_data = self.image_cache.get_image_data(self.image_path, encode=image_encode)
+        # 语料模式：每个请求从目录或 JSONL 文件中取一个载荷原样发送
+        self.corpus_path = corpus
+        self.corpus = PayloadCorpus.open(corpus) if corpus else None
+        if corpus_order not in CORPUS_ORDERS:
+            raise ValueError(f"不支持的语料顺序: {corpus_order}")
+        self.corpus_order = corpus_order
+        self._payload_counter = itertools.count()
+        # JSON 请求体模板只编译一次，每个请求只生成 template_fields 中的动态字段
+        self.template_fields = template_fields
+        self.template = RequestTemplate(request_body, template_fields) if self.request_type == 'json' and not self.corpus else None
         
-    def record_error(self, status_code, error_response, request_info):
+    def create_error_recorder(self):
+        return ErrorRecorder(self.session_dir if self.error_stream else None)
+
+    def record_error(self, status_code, error_response, request_info, exception=None):
         """记录错误信息"""
-        with self.error_lock:
-            self.error_records.append({
-                'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                'status_code': status_code,
-                'error_response': error_response,
-                'request_info': request_info
-            })
-
-    def save_error_records(self):
-        """保存错误记录到文件"""
-        if not self.error_records:
+        self.error_recorder.record(status_code, error_response, request_info, exception)
+
+    def save_error_records(self, error_recorder=None):
+        """关闭样本文件并保存错误分组汇总，返回汇总文件名"""
+        if error_recorder is None:
+            error_recorder = self.error_recorder
+        error_recorder.close()
+        if not error_recorder.total:
             return None
             
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = f"error_records_{timestamp}.json"
+        filename = f"error_summary_{timestamp}_{uuid.uuid4().hex[:6]}.json"
         filepath = os.path.join(self.session_dir, filename)
         
         with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump({
-                'service_name': self.name,
-                'errors': self.error_records
-            }, f, ensure_ascii=False, indent=2)
+            json.dump(dict(error_recorder.summary(), service_name=self.name), f, ensure_ascii=False, indent=2)
         
         return filename
     
-    def generate_bizno(self):
-        """生成随机的业务编号"""
-        # 方法1：使用UUID
-        # return str(uuid.uuid4())
-        
-        # 方法2：时间戳+随机数
-        timestamp = time.strftime('%Y%m%d%H%M%S')
-        random_str = ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
-        return f"BIZ{timestamp}{random_str}"
+    def next_payload_index(self):
+        """语料模式下本次请求使用的载荷序号"""
+        if self.corpus_order == 'random':
+            return random.randrange(self.corpus.size)
+        return next(self._payload_counter)
+
+    def prepare_request(self, request_info):
+        """生成本次请求的请求体并写入 request_info，返回 (发送参数, 日志消息, 日志参数)"""
+        if self.request_type != 'json':
+            request_info['type'] = 'image'
+        if self.corpus:
+            index = self.next_payload_index()
+            payload = self.corpus.payload(index)
+            request_info['payload'] = self.corpus.describe(index)
+            request_info['payload_size'] = size_class(payload.nbytes)
+            return {'data': payload}, "payload: {}, status: {}", (request_info['payload'],)
+        if self.request_type == 'json':
+            request_body, fields = self.template.render()
+            request_info['body'] = request_body
+            return {'data': request_body}, "fields: {}, status: {}", (fields,)
+        return {'data': self.image_data}, "Image request completed, status: {}", ()
+
+    def record_response(self, status_code, elapsed_ns, error_response, request_info, phases=None):
+        """记录一次已收到响应的请求，elapsed_ns 为响应时间（纳秒），error_response 仅在非 200 时使用"""
+        self.stats.record(elapsed_ns / 1e9, status_code == 200, time.time(), phases, request_info.get('payload_size'))
+        if status_code != 200:
+            self.record_error(status_code, error_response, request_info)
+
+    def record_exception(self, e, request_info):
+        """记录一次未收到响应的请求"""
+        self.stats.record_failure(time.time(), request_info.get('payload_size'))
+        self.record_error(0, str(e), request_info, type(e).__name__)
+        self.log_request(True, "请求失败: {}", e)
+
+    def record_raw(self, start_ns, elapsed_ns, status_code, request_kwargs, bytes_received):
+        """写入一条原始请求记录（开启 raw_log 时），预热请求不写入，分析原始记录时不会混入预热延迟"""
+        if self.in_warmup:
+            return
+        data = request_kwargs.get('data')
+        self.raw_log.record(start_ns, elapsed_ns, status_code, len(data) if data is not None else 0, bytes_received)
+
+    def close_raw_log(self):
+        """发压结束后写完剩余的原始请求记录"""
+        if self.raw_log:
+            self.raw_log.close()
+
+    def log_request(self, is_error, message, *args):
+        """按日志策略输出单请求日志，未输出的计入抑制数
 
-    def make_request(self):
+        被策略跳过的日志不会格式化消息；输出的日志仍在调用线程中格式化，
+        只有写入 stderr 由 loguru 的后台线程完成。
+        """
+        if self.request_log.should_log(is_error):
+            request_logger.log('ERROR' if is_error else 'INFO', message, *args)
+        else:
+            self.stats.shard().suppressed_logs += 1
+
+    def make_request(self, intended_start=None):
+        """发送一次请求。intended_start 为开环模式下计划的发送时间（perf_counter_ns），
+        响应时间从计划时间算起，包含排队等待，避免协调遗漏（coordinated omission）"""
         request_info = {
                 'url': self.url,
                 'headers': self.headers
             }
+        start_ns = None
         
         try:
-            if self.request_type == 'json':
-                # JSON请求
-                request_body = self.base_request_body.copy()
-                request_body['bizno'] = self.generate_bizno()
-                request_info['body'] = request_body
-                
-                start_time = time.time()
-                response = requests.post(self.url, json=request_body, headers=self.headers)
-                end_time = time.time()
-                
-                logger.info(f"bizno: {request_body['bizno']}, status: {response.status_code}")
+            request_kwargs, log_message, log_args = self.prepare_request(request_info)
+            
+            phases = start_phase_timing() if self.phase_timing else None
+            # 单调时钟计时，不受系统时间调整影响
+            start_ns = time.perf_counter_ns()
+            # 分阶段计时时先只读取响应头，再单独计时读取响应体
+            response = self.connection_pool.post(self.url, headers=self.request_headers, stream=self.phase_timing, **request_kwargs)
+            headers_ns = time.perf_counter_ns()
+            if self.phase_timing:
+                response.content
+            end_ns = time.perf_counter_ns()
             
-            else:  # image request
-                request_info['type'] = 'image'
-                # 图片请求
-                start_time = time.time()
-                response = requests.post(self.url, headers=self.headers, data=self.image_data)
-                end_time = time.time()
-                
-                logger.info(f"Image request completed, status: {response.status_code}")
+            self.log_request(response.status_code != 200, log_message, *log_args, response.status_code)
             
             # 记录响应时间
-            response_time = end_time - start_time
-            with self.lock:
-                self.response_times.append(response_time)
-                
-                if response.status_code == 200:
-                    self.success_count += 1
-                else:
-                    self.failure_count += 1
-                    try:
-                        error_response = response.json()
-                    except:
-                        error_response = response.text
-                    self.record_error(response.status_code, error_response, request_info)
+            if phases is not None:
+                phases = finish_phase_timing(phases, start_ns, headers_ns, end_ns)
+            if intended_start is not None:
+                start_ns = intended_start
+            error_response = None
+            if response.status_code != 200:
+                try:
+                    error_response = response.json()
+                except:
+                    error_response = response.text
+            self.record_response(response.status_code, end_ns - start_ns, error_response, request_info, phases)
+            if self.raw_log:
+                self.record_raw(start_ns, end_ns - start_ns, response.status_code, request_kwargs, len(response.content))
             
             return response.status_code
         except Exception as e:
-            with self.lock:
-                self.failure_count += 1
-            self.record_error(0, str(e), request_info)
-            logger.error(f"请求失败: {str(e)}")
+            self.record_exception(e, request_info)
+            if self.raw_log and start_ns is not None:
+                # 与成功路径一致，开环模式下从计划发送时间算起
+                if intended_start is not None:
+                    start_ns = intended_start
+                self.record_raw(start_ns, time.perf_counter_ns() - start_ns, 0, request_kwargs, 0)
             return None
-        
-    def run_load_test(self):
+
+    def export_stats(self):
+        """导出可合并的统计数据，用于多进程/多节点汇总"""
+        exported = {
+            'stats': self.stats.snapshot().to_dict(),
+            'errors': self.error_recorder.to_dict(),
+            'raw_log_files': self.raw_log_files
+        }
+        if self.warmup_stats is not None:
+            exported['warmup'] = {'stats': self.warmup_stats.snapshot().to_dict(), 'time': self.warmup_time}
+        return exported
+
+    def merge_stats(self, stats):
+        """合并 export_stats 导出的统计数据"""
+        self.stats.add_shard(StatsShard.from_dict(stats['stats']))
+        self.error_recorder.merge(stats['errors'])
+        self.raw_log_files.extend(stats.get('raw_log_files', []))
+        if stats.get('warmup'):
+            if self.warmup_stats is None:
+                self.warmup_stats = ShardedStats()
+            self.warmup_stats.add_shard(StatsShard.from_dict(stats['warmup']['stats']))
+            self.warmup_time = max(self.warmup_time, stats['warmup']['time'])
+
+    def progress(self):
+        """实时进度：返回 (统计快照, 最近一个完整秒的请求数, 是否在预热)
+
+        统计在其他进程或节点中时合并它们最近一次上报的进度。
+        """
+        if self.remote_progress:
+            return merge_progress(self.remote_progress.values())
+        stats = self.stats.snapshot()
+        bucket = stats.timeline.get(int(time.time()) - 1)
+        return stats, bucket.requests if bucket else 0, self.in_warmup
+
+    def export_progress(self):
+        """导出实时进度，供父进程或控制端在测试结束前汇总
+
+        每秒请求数由本机按自己的时钟计算，不带按秒时间序列，上报的数据量与运行时长无关。
+        """
+        stats, qps, warmup = self.progress()
+        stats.timeline = {}
+        return {'stats': stats.to_dict(), 'qps': qps, 'warmup': warmup}
+
+    def start_warmup(self):
+        self._warmup_start = time.perf_counter()
+        # 预热期间的错误只在内存中计数，不写样本文件，结果中只报告预热失败数
+        self.error_recorder.close()
+        self.error_recorder = ErrorRecorder(None)
+        self.in_warmup = True
+
+    def warming_up(self):
+        """预热是否还要继续发送请求，按请求数预热时每次调用领取一个请求"""
+        if self.stop_event.is_set():
+            return False
+        if 'duration' in self.warmup:
+            return time.perf_counter() - self._warmup_start < self.warmup['duration']
+        return next(self._warmup_counter) < self.warmup['requests']
+
+    def finish_warmup(self):
+        """预热结束：预热期间的统计单独保存，切换到新的统计对象开始正式测试"""
+        self.warmup_time = time.perf_counter() - self._warmup_start
+        self.warmup_stats, _ = self.reset_stats()
+        self.in_warmup = False
+        logger.info(f"预热结束，耗时 {self.warmup_time:.2f} 秒，开始正式测试")
+
+    def run_request(self, intended_start=None):
+        """工作线程执行一次请求，测试已取消时直接跳过"""
+        if self.stop_event.is_set():
+            return None
+        return self.make_request(intended_start)
+
+    def log_test_info(self):
         logger.info(f"开始压力测试...")
         logger.info(f"目标 URL: {self.url}")
+        logger.info(f"压测引擎: {self.engine}")
         logger.info(f"并发线程数: {self.num_threads}")
         logger.info(f"总请求数: {self.num_requests}")
         logger.info(f"基础请求体: {json.dumps(self.base_request_body, ensure_ascii=False)}")
-        logger.info(f"bizno: 将为每个请求动态生成")
+        if self.template:
+            logger.info(f"动态字段: {json.dumps(self.template.fields, ensure_ascii=False)}")
+        if self.corpus:
+            logger.info(f"语料: {self.corpus.path}（{self.corpus.size} 个载荷，{self.corpus_order}）")
+        logger.info(f"连接模式: {'keep-alive 连接池' if self.connection_pool.keep_alive else '每请求新建连接'}")
+        logger.info(f"请求日志: {self.request_log.describe()}")
+        if self.phase_timing:
+            logger.info("分阶段计时: 开启")
+        if self.raw_log:
+            logger.info(f"原始请求记录: {self.raw_log.filepath}")
+        if self.arrival_rate:
+            logger.info(f"开环模式，目标速率: {self.arrival_rate} 请求/秒，响应时间从计划发送时间算起")
+        if self.warmup:
+            logger.info(f"预热: {describe_warmup(self.warmup)}，不计入测试结果")
         logger.info("-" * 50)
 
-        start_time = time.time()
+    def execute(self):
+        """发送全部请求，返回总耗时（秒）。不同的压测引擎重写此方法"""
+        if self.arrival_rate:
+            return self.execute_open_loop()
+        self.connection_pool.resize(self.num_threads)
+        # 工作线程从共享计数器领取请求序号，内存只与并发数有关，与总请求数无关
+        counter = itertools.count()
+        start_barrier = threading.Barrier(self.num_threads + 1, action=self.start_warmup if self.warmup else None)
+        # 预热结束时所有线程在此汇合，切换统计后用同一批线程和连接进入正式测试
+        warmup_barrier = threading.Barrier(self.num_threads + 1, action=self.finish_warmup) if self.warmup else None
         
         with ThreadPoolExecutor(max_workers=self.num_threads) as executor:
-            futures = [executor.submit(self.make_request) for _ in range(self.num_requests)]
+            for _ in range(self.num_threads):
+                executor.submit(self.run_worker, counter, start_barrier, warmup_barrier)
+            # 所有线程创建完毕后才开始计时，线程启动开销不计入总耗时
+            start_barrier.wait()
+            if warmup_barrier:
+                warmup_barrier.wait()
+            start_time = time.perf_counter()
             
-        end_time = time.time()
+        end_time = time.perf_counter()
+        # 归还会话，连接保持在池中供下一个并发度使用
+        self.connection_pool.release_all()
+        return end_time - start_time
+
+    def run_worker(self, counter, start_barrier, warmup_barrier=None):
+        """闭环模式的工作线程：先预热（如果配置），再循环领取请求序号，直到请求发完或测试取消"""
+        start_barrier.wait()
+        if warmup_barrier:
+            while self.warming_up():
+                self.make_request()
+            warmup_barrier.wait()
+        while next(counter) < self.num_requests and not self.stop_event.is_set():
+            self.make_request()
+
+    def execute_open_loop(self):
+        """开环模式：按固定速率调度请求，不等待之前的请求完成
+
+        并发线程数是同时在途请求的上限，线程全忙时请求在队列中排队，
+        排队时间计入响应时间。
+        """
+        interval = 1.0 / self.arrival_rate
+        interval_ns = 1e9 / self.arrival_rate
+        self.connection_pool.resize(self.num_threads)
         
-        # 计算统计数据
-        total_time = end_time - start_time
-        avg_response_time = sum(self.response_times) / len(self.response_times) if self.response_times else 0
-        max_response_time = max(self.response_times) if self.response_times else 0
-        min_response_time = min(self.response_times) if self.response_times else 0
-        qps = self.num_requests / total_time if total_time > 0 else 0
+        with ThreadPoolExecutor(max_workers=self.num_threads) as executor:
+            if self.warmup:
+                self.warm_up_open_loop(executor)
+            start_ns = time.perf_counter_ns()
+            for i in range(self.num_requests):
+                intended_start = start_ns + int(i * interval_ns)
+                delay = (intended_start - time.perf_counter_ns()) / 1e9
+                if delay > 0:
+                    time.sleep(delay)
+                if self.stop_event.is_set():
+                    break
+                executor.submit(self.run_request, intended_start)
+            dispatch_lag = (time.perf_counter_ns() - start_ns) / 1e9 - (self.num_requests - 1) * interval
+            
+        end_ns = time.perf_counter_ns()
+        self.connection_pool.release_all()
+        if dispatch_lag > max(0.1, 0.1 * self.num_requests * interval):
+            logger.warning(f"调度落后计划 {dispatch_lag:.2f} 秒，压测端无法维持目标速率")
+        return (end_ns - start_ns) / 1e9
+
+    def warm_up_open_loop(self, executor):
+        """开环模式的预热：按目标速率发送请求，等预热请求全部完成后再切换统计"""
+        interval_ns = 1e9 / self.arrival_rate
+        futures = []
+        self.start_warmup()
+        start_ns = time.perf_counter_ns()
+        for i in itertools.count():
+            if not self.warming_up():
+                break
+            intended_start = start_ns + int(i * interval_ns)
+            delay = (intended_start - time.perf_counter_ns()) / 1e9
+            if delay > 0:
+                time.sleep(delay)
+            futures.append(executor.submit(self.run_request, intended_start))
+        wait(futures)
+        self.finish_warmup()
+
+    def reset_stats(self):
+        """切换到新的统计对象和错误记录，返回切换前的 (stats, error_recorder)"""
+        stats, error_recorder = self.stats, self.error_recorder
+        self.stats = ShardedStats()
+        self.error_recorder = self.create_error_recorder()
+        return stats, error_recorder
+
+    def build_results(self, total_time, stats=None, error_recorder=None):
+        """根据已记录的数据计算统计结果，默认使用当前的统计对象和错误记录"""
+        snapshot = (stats if stats is not None else self.stats).snapshot()
+        histogram = snapshot.histogram
+        completed = snapshot.success_count + snapshot.failure_count
+        qps = completed / total_time if total_time > 0 else 0
         
         # 保存错误记录
-        error_file = None
-        if self.error_records:
-            error_file = self.save_error_records()
+        error_file = self.save_error_records(error_recorder)
         
         # 准备测试结果数据
         test_results = {
             "总耗时(秒)": f"{total_time:.2f}",
-            "成功请求数": self.success_count,
-            "失败请求数": self.failure_count,
-            "平均响应时间(秒)": f"{avg_response_time:.3f}",
-            "最大响应时间(秒)": f"{max_response_time:.3f}",
-            "最小响应时间(秒)": f"{min_response_time:.3f}",
-            "QPS": f"{qps:.2f}",
-            "error_file": error_file  # 添加错误文件路径
+            "成功请求数": snapshot.success_count,
+            "失败请求数": snapshot.failure_count,
+            "平均响应时间(秒)": f"{histogram.mean:.3f}",
+            "最大响应时间(秒)": f"{histogram.max:.3f}",
+            "最小响应时间(秒)": f"{histogram.min:.3f}",
+        }
+        for label, value in histogram.percentiles().items():
+            test_results[f"{label}响应时间(秒)"] = f"{value:.3f}"
+        phase_percentiles = snapshot.phase_percentiles()
+        for name, label in PHASES:
+            for percentile_label, value in phase_percentiles.get(name, {}).items():
+                test_results[f"{label}耗时{percentile_label}(秒)"] = f"{value:.4f}"
+        test_results["QPS"] = f"{qps:.2f}"
+        if stats is None and self.warmup_stats is not None:
+            test_results.update(self.warmup_results())
+        test_results["抑制日志数"] = snapshot.suppressed_logs
+        if self.arrival_rate:
+            test_results["目标速率(请求/秒)"] = f"{self.arrival_rate:.2f}"
+        if snapshot.payload_sizes:
+            test_results["载荷大小分布"] = snapshot.payload_size_rows()
+        test_results["error_file"] = error_file  # 添加错误文件路径
+        if self.raw_log_files:
+            test_results["raw_log_files"] = self.raw_log_files
+        test_results["timeline"] = snapshot.timeline_rows()  # 按秒的时间序列
+        test_results["延迟直方图"] = snapshot.histogram.bucket_rows()
+        test_results["延迟热力图"] = snapshot.heatmap_rows()
+        return test_results
+        
+    def warmup_results(self):
+        """预热阶段的统计，冷启动开销单独展示，不影响正式结果"""
+        snapshot = self.warmup_stats.snapshot()
+        histogram = snapshot.histogram
+        return {
+            "预热耗时(秒)": f"{self.warmup_time:.2f}",
+            "预热请求数": snapshot.success_count + snapshot.failure_count,
+            "预热失败请求数": snapshot.failure_count,
+            "预热平均响应时间(秒)": f"{histogram.mean:.3f}",
+            "预热P99响应时间(秒)": f"{histogram.percentile(99):.3f}",
+            "预热最大响应时间(秒)": f"{histogram.max:.3f}",
         }
+
+    def run_load_test(self):
+        self.log_test_info()
+        total_time = self.execute()
+        self.close_raw_log()
+        test_results = self.build_results(total_time)
         
         # 输出测试结果到日志
         logger.info("\n测试结果:")
         for key, value in test_results.items():
+            if isinstance(value, list):
+                continue
             logger.info(f"{key}: {value}")
             
         return test_results
+
+def merge_progress(progress_list):
+    """合并多个 export_progress 导出的进度，返回与 LoadTester.progress 相同的三元组"""
+    stats = StatsShard()
+    qps = 0
+    warmup = False
+    for progress in list(progress_list):
+        stats.merge(StatsShard.from_dict(progress['stats']))
+        qps += progress['qps']
+        warmup = warmup or progress['warmup']
+    return stats, qps, warmup
+
+def parse_warmup(settings):
+    """解析预热配置：{"duration": 秒} 或 {"requests": 请求数}，未配置或为 0 时不预热"""
+    if not settings:
+        return None
+    if isinstance(settings, dict) and len(settings) == 1:
+        key, value = next(iter(settings.items()))
+        if key in ('duration', 'requests'):
+            value = float(value) if key == 'duration' else int(value)
+            if value >= 0:
+                return {key: value} if value else None
+    raise ValueError(f"无效的预热配置: {settings}，应为 {{\"duration\": 秒}} 或 {{\"requests\": 请求数}}")
+
+def describe_warmup(warmup):
+    if 'duration' in warmup:
+        return f"{warmup['duration']:g} 秒"
+    return f"{warmup['requests']} 个请求"
+
+def get_tester_class(engine):
+    """根据引擎名称返回压测类"""
+    if engine == 'thread':
+        return LoadTester
+    if engine == 'async':
+        from core.async_engine import AsyncLoadTester
+        return AsyncLoadTester
+    raise ValueError(f"不支持的压测引擎: {engine}")
+
+def create_load_tester(service, config, concurrent_users, level_index=None, **kwargs):
+    """根据配置为服务的某个并发度创建压测实例
+
+    level_index 为该并发度在 concurrent_users 中的位置，arrival_rate 为列表时按位置取速率。
+
+    engine 可在服务或全局配置中指定：thread（默认，线程池）或 async（asyncio/aiohttp）。
+    配置 arrival_rate 时使用开环模式，按目标速率发送请求。
+    processes 大于 1（或为 "auto"）时，同一并发度会拆分到多个进程中执行，
+    每个进程内部使用 engine 指定的引擎。
+    配置 agents（压测节点地址列表）时，测试拆分到各节点同时执行后汇总，
+    engine 和 processes 作用于每个节点。
+    """
+    engine = service.get('engine', config.get('engine', 'thread'))
+    processes = service.get('processes', config.get('processes', 1))
+    if processes == 'auto':
+        processes = os.cpu_count() or 1
+    # 开环速率可以是固定值，也可以是与 concurrent_users 一一对应的列表
+    arrival_rate = service.get('arrival_rate', config.get('arrival_rate'))
+    if isinstance(arrival_rate, list):
+        if level_index is None:
+            raise ValueError("arrival_rate 为列表时只能用于按 concurrent_users 逐级测试，负载曲线和容量探测模式请使用固定速率")
+        arrival_rate = arrival_rate[level_index]
+    request_log = service.get('request_log', config.get('request_log', 'all'))
+    request_log_sample_rate = service.get('request_log_sample_rate', config.get('request_log_sample_rate', 100))
+    phase_timing = service.get('phase_timing', config.get('phase_timing', False))
+    if config.get('image_cache_max_mb'):
+        ImageCache.get_instance(max_bytes=int(config['image_cache_max_mb'] * 1024 * 1024))
+    
+    tester_kwargs = dict(
+        name=service['name'],
+        url=service['url'],
+        request_type=service.get('request_type', 'json'),
+        request_body=service.get('request_body'),
+        image_path=service.get('image_path'),
+        headers=service.get('headers'),
+        num_threads=concurrent_users,
+        num_requests=concurrent_users * config.get('requests_per_user', 0),
+        session_dir=config.get('session_dir'),
+        arrival_rate=arrival_rate,
+        request_log=request_log,
+        request_log_sample_rate=request_log_sample_rate,
+        phase_timing=phase_timing,
+        template_fields=service.get('template_fields'),
+        image_encode=service.get('image_encode'),
+        corpus=service.get('corpus'),
+        corpus_order=service.get('corpus_order', 'round_robin'),
+        raw_log=service.get('raw_log', config.get('raw_log', False)),
+        warmup=service.get('warmup', config.get('warmup')),
+        **kwargs
+    )
+    
+    agents = service.get('agents', config.get('agents'))
+    if agents:
+        from core.distributed import DistributedLoadTester
+        return DistributedLoadTester(agents=agents, agent_engine=engine, agent_processes=processes, **tester_kwargs)
+    if processes > 1:
+        from core.sharding import ProcessShardedLoadTester
+        return ProcessShardedLoadTester(processes=processes, shard_engine=engine, **tester_kwargs)
+    return get_tester_class(engine)(**tester_kwargs)
     
 def save_results(self, results):
     if not self.session_dir:
@@ -203,7 +595,23 @@ def save_results(self, results):
 
 def load_config(config_file):
     with open(config_file, 'r', encoding='utf-8') as f:
-        return json.load(f)
+        config = json.load(f)
+    check_arrival_rates(config)
+    return config
+
+def check_arrival_rates(config):
+    """检查列表形式的 arrival_rate 与 concurrent_users 一一对应，不对应时抛出 ValueError"""
+    levels = config.get('concurrent_users') or []
+    for service in config.get('services', []):
+        arrival_rate = service.get('arrival_rate', config.get('arrival_rate'))
+        if isinstance(arrival_rate, list) and len(arrival_rate) != len(levels):
+            raise ValueError(f"服务 {service.get('name')} 的 arrival_rate 有 {len(arrival_rate)} 个速率，"
+                             f"与 concurrent_users 的 {len(levels)} 个并发度不一致")
+
+# 配置预热时在对比结果中额外输出的列
+WARMUP_HEADERS = ['预热耗时(秒)', '预热请求数', '预热失败请求数', '预热平均响应时间(秒)', '预热P99响应时间(秒)', '预热最大响应时间(秒)']
+# 容量探测模式在对比结果中额外输出的列
+CAPACITY_HEADERS = ['阶段', '探测负载', 'SLO分位数', 'SLO响应时间(秒)', '错误率', '满足SLO', '提前终止']
 
 def save_comparison_results_to_csv(all_results):
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
@@ -211,74 +619,191 @@ def save_comparison_results_to_csv(all_results):
     
     # 准备CSV数据
     headers = ['服务名称', '并发用户数', '总请求数', '总耗时(秒)', '成功请求数', '失败请求数', 
-              '平均响应时间(秒)', '最大响应时间(秒)', '最小响应时间(秒)', 'QPS']
+              '平均响应时间(秒)', '最大响应时间(秒)', '最小响应时间(秒)'] + \
+              [f'{label}响应时间(秒)' for _, label in PERCENTILES] + ['QPS']
+    # 开启分阶段计时的测试才有分阶段列，其他测试留空
+    phase_headers = [
+        f'{label}耗时{percentile_label}(秒)'
+        for _, label in PHASES for percentile_label in PHASE_PERCENTILES
+    ]
+    headers += [header for header in phase_headers if any(header in result for result in all_results)]
+    # 容量探测模式的每次探测结果
+    if any('探测负载' in result for result in all_results):
+        headers += CAPACITY_HEADERS
+    # 预热阶段的统计
+    if any('预热请求数' in result for result in all_results):
+        headers += WARMUP_HEADERS
+    # 测试之后实际等待服务恢复的时间
+    if any('冷却时间(秒)' in result for result in all_results):
+        headers.append('冷却时间(秒)')
     
     with open(filename, 'w', newline='', encoding='utf-8') as f:
         writer = csv.writer(f)
         writer.writerow(headers)
         
         for result in all_results:
-            writer.writerow([
-                result['服务名称'],
-                result['并发用户数'],
-                result['总请求数'],
-                result['总耗时(秒)'],
-                result['成功请求数'],
-                result['失败请求数'],
-                result['平均响应时间(秒)'],
-                result['最大响应时间(秒)'],
-                result['最小响应时间(秒)'],
-                result['QPS']
-            ])
+            writer.writerow([result.get(header, '') for header in headers])
     
     logger.info(f"对比测试结果已保存到文件: {filename}")
+    save_timeseries_to_csv(all_results, get_timeseries_filename(filename))
+    save_payload_sizes_to_csv(all_results, filename.replace('performance_comparison_', 'payload_sizes_'))
+    save_result_rows_to_csv(all_results, '延迟直方图', filename.replace('performance_comparison_', 'latency_histogram_'))
+    save_result_rows_to_csv(all_results, '延迟热力图', filename.replace('performance_comparison_', 'latency_heatmap_'))
+    return filename
+
+def save_payload_sizes_to_csv(all_results, filename):
+    """把语料模式下按载荷大小区间的统计写到对比结果旁边"""
+    rows = [result for result in all_results if result.get('载荷大小分布')]
+    if not rows:
+        return None
+    
+    columns = list(rows[0]['载荷大小分布'][0].keys())
+    with open(filename, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['服务名称', '并发用户数'] + columns)
+        for result in rows:
+            for row in result['载荷大小分布']:
+                writer.writerow([result['服务名称'], result['并发用户数']] + [row[column] for column in columns])
+    
+    logger.info(f"载荷大小统计已保存到文件: {filename}")
+    return filename
+
+def save_result_rows_to_csv(all_results, key, filename):
+    """把每个测试结果中 key 对应的明细行写到对比结果旁边，供图表分析使用"""
+    rows = [result for result in all_results if result.get(key)]
+    if not rows:
+        return None
+    
+    columns = list(rows[0][key][0].keys())
+    # 容量探测的各次探测用探测负载区分，开环探测时并发用户数都相同
+    levels = ['探测负载'] if any('探测负载' in result for result in rows) else []
+    with open(filename, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['服务名称', '并发用户数'] + levels + columns)
+        for result in rows:
+            for row in result[key]:
+                writer.writerow([result['服务名称'], result['并发用户数']] + [result[level] for level in levels] +
+                                [row[column] for column in columns])
+    
+    logger.info(f"{key}已保存到文件: {filename}")
+    return filename
+
+def save_timeseries_to_csv(all_results, filename):
+    """把每个测试的按秒时间序列写到对比结果旁边"""
+    timelines = [result for result in all_results if result.get('timeline')]
+    if not timelines:
+        return None
+    
+    columns = list(timelines[0]['timeline'][0].keys())
+    with open(filename, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['服务名称', '并发用户数'] + columns)
+        for result in timelines:
+            for row in result['timeline']:
+                writer.writerow([result['服务名称'], result['并发用户数']] + [row[column] for column in columns])
+    
+    logger.info(f"时间序列已保存到文件: {filename}")
     return filename
 
 def main():
     parser = argparse.ArgumentParser(description='HTTP接口压力测试工具')
     parser.add_argument('--config', type=str, help='配置文件路径', default='config.json')
+    parser.add_argument('--tag', help='本次运行的标签，保存到运行历史，例如 baseline')
+    parser.add_argument('--baseline-tag', help='运行结束后与带此标签的最近一次运行对比，有显著回归时退出码为 1')
     args = parser.parse_args()
 
     # 加载配置文件
     config = load_config(args.config)
+    configure_logging()
     
     # 存储所有测试结果
     all_results = []
     
-    # 对每个服务进行不同并发度的测试
-    for service in config['services']:
-        logger.info(f"\n开始测试服务: {service['name']}")
-        
-        for concurrent_users in config['concurrent_users']:
-            logger.info(f"\n并发用户数: {concurrent_users}")
-            
-            tester = LoadTester(
-                name=service['name'],
-                url=service['url'],
-                request_type=service.get('request_type', 'json'),
-                request_body=service.get('request_body'),
-                image_path=service.get('image_path'),
-                headers=service.get('headers'),
-                num_threads=concurrent_users,
-                num_requests=concurrent_users * config['requests_per_user']
-            )
-            
-            results = tester.run_load_test()
-            results['服务名称'] = service['name']
-            results['并发用户数'] = concurrent_users
-            results['总请求数'] = concurrent_users * config['requests_per_user']
-            results['请求类型'] = service.get('request_type', 'json')
+    parallel = config.get('parallel_services') and len(config['services']) > 1
+    if parallel and config.get('capacity'):
+        logger.warning("容量探测模式不支持服务并行，按顺序逐个探测")
+        parallel = False
+    
+    if parallel:
+        # 所有服务同时测试，每个服务使用独立的连接池、工作池和统计
+        from core.parallel import run_services_parallel
+        connection_pools = {
+            service['name']: ConnectionPool(keep_alive=service.get('keep_alive', config.get('keep_alive', True)))
+            for service in config['services']
+        }
+        try:
+            results_by_service = run_services_parallel(config, connection_pools)
+        finally:
+            for connection_pool in connection_pools.values():
+                connection_pool.close()
+        for service in config['services']:
+            for results in results_by_service[service['name']]:
+                results['请求类型'] = service.get('request_type', 'json')
+                all_results.append(results)
+    else:
+        # 对每个服务进行不同并发度的测试
+        for service in config['services']:
+            logger.info(f"\n开始测试服务: {service['name']}")
+            # 同一服务的所有并发度共用连接池，保持连接常驻
+            connection_pool = ConnectionPool(keep_alive=service.get('keep_alive', config.get('keep_alive', True)))
             
-            all_results.append(results)
+            if config.get('profile'):
+                # 负载曲线模式：整条曲线在同一个工作池中连续执行，阶段之间不暂停
+                from core.profile import run_profile
+                for results in run_profile(service, config, connection_pool):
+                    results['请求类型'] = service.get('request_type', 'json')
+                    all_results.append(results)
+            elif config.get('capacity'):
+                # 容量探测模式：按 SLO 自动搜索最大可持续负载
+                from core.capacity import run_capacity_search
+                probe_results, _ = run_capacity_search(service, config, connection_pool)
+                for results in probe_results:
+                    results['请求类型'] = service.get('request_type', 'json')
+                    all_results.append(results)
+            else:
+                # 开始前测量服务的基线响应时间，用于测试之间的自适应冷却
+                from core.cooldown import Cooldown
+                cooldown = Cooldown(service, config, connection_pool)
+                cooldown.start()
+                for index, concurrent_users in enumerate(config['concurrent_users']):
+                    logger.info(f"\n并发用户数: {concurrent_users}")
+                    
+                    tester = create_load_tester(service, config, concurrent_users, level_index=index,
+                                                connection_pool=connection_pool)
+                    
+                    results = tester.run_load_test()
+                    results['服务名称'] = service['name']
+                    results['并发用户数'] = concurrent_users
+                    results['总请求数'] = concurrent_users * config['requests_per_user']
+                    results['请求类型'] = service.get('request_type', 'json')
+                    
+                    all_results.append(results)
+                    
+                    # 等待服务从本次测试中恢复后再开始下一个测试
+                    if index < len(config['concurrent_users']) - 1:
+                        results['冷却时间(秒)'] = f"{cooldown.wait():.2f}"
             
-            # 每个测试之间暂停一段时间，避免服务器过载
-            time.sleep(2)
+            connection_pool.close()
     
     logger.info(f"所有测试结果: {all_results}")
 
     # 保存对比结果
     filename = save_comparison_results_to_csv(all_results)
     analyze_results(filename)
+    
+    # 保存到运行历史，并按需与基线对比
+    store = RunStore()
+    run_id = store.save_run(all_results, config, tag=args.tag or config.get('tag'), csv_file=os.path.abspath(filename))
+    logger.info(f"运行已保存到历史记录: {run_id}")
+    if args.baseline_tag:
+        baseline_id = resolve_baseline(store, run_id, baseline_tag=args.baseline_tag)
+        if baseline_id is None:
+            logger.warning(f"没有找到标签为 {args.baseline_tag} 的基线运行，跳过对比")
+            return
+        report = store.compare(run_id, baseline_id)
+        logger.info("\n" + format_report(report))
+        if report['regressions']:
+            sys.exit(1)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,91 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from loguru import logger
+from core.load_tester import create_load_tester
+from core.profile import run_profile
+from core.cooldown import Cooldown
+
+def run_in_parallel(services, prepare):
+    """每个服务一个线程同时执行，返回与 services 顺序一致的结果列表
+
+    prepare(service) 在服务自己的线程中做准备工作（创建压测实例、加载图片等），
+    返回实际执行测试的函数。所有服务准备好后才同时开始，各服务处于同一时间窗口。
+    """
+    barrier = threading.Barrier(len(services))
+
+    def run(service):
+        try:
+            execute = prepare(service)
+        except Exception:
+            # 让其他服务不再等待
+            barrier.abort()
+            raise
+        barrier.wait()
+        return execute()
+
+    with ThreadPoolExecutor(max_workers=len(services), thread_name_prefix='service') as executor:
+        futures = [executor.submit(run, service) for service in services]
+        errors = [future.exception() for future in futures]
+    # 优先抛出真正的错误，而不是其他服务等待时收到的 BrokenBarrierError
+    for error in errors:
+        if error and not isinstance(error, threading.BrokenBarrierError):
+            raise error
+    return [future.result() for future in futures]
+
+def prepare_level(service, config, index, connection_pool=None, progress=None, stop_event=None):
+    """创建一个服务在第 index 个并发度下的压测实例，返回执行测试并补全结果的函数"""
+    concurrent_users = config['concurrent_users'][index]
+    tester = create_load_tester(service, config, concurrent_users, level_index=index,
+                                connection_pool=connection_pool, stop_event=stop_event)
+
+    def execute():
+        if progress:
+            progress.start_level(service['name'], concurrent_users, tester)
+        try:
+            results = tester.run_load_test()
+        finally:
+            if progress:
+                progress.finish_level(service['name'])
+        results['服务名称'] = service['name']
+        results['并发用户数'] = concurrent_users
+        results['总请求数'] = concurrent_users * config['requests_per_user']
+        return results
+    return execute
+
+def run_services_parallel(config, connection_pools, progress=None, stop_event=None):
+    """所有服务同时测试，返回 {服务名称: 结果列表}
+
+    每个并发度下所有服务同时开始，各自使用独立的压测实例、工作池和统计，
+    全部结束并冷却后再进入下一个并发度；负载曲线模式下各服务的整条曲线同时执行。
+    connection_pools 为 {服务名称: ConnectionPool}。
+    """
+    services = config['services']
+    all_results = {service['name']: [] for service in services}
+    logger.info(f"\n并行测试服务: {', '.join(all_results)}")
+
+    if config.get('profile'):
+        profile_results = run_in_parallel(services, lambda service: lambda: run_profile(
+            service, config, connection_pools[service['name']], progress, stop_event))
+        for service, results in zip(services, profile_results):
+            all_results[service['name']].extend(results)
+        return all_results
+
+    # 每个服务各自测量基线、各自等待恢复，全部恢复后才进入下一个并发度
+    cooldowns = {
+        service['name']: Cooldown(service, config, connection_pools[service['name']], stop_event)
+        for service in services
+    }
+    run_in_parallel(services, lambda service: cooldowns[service['name']].start)
+    for index, concurrent_users in enumerate(config['concurrent_users']):
+        logger.info(f"\n并发用户数: {concurrent_users}")
+        level_results = run_in_parallel(services, lambda service: prepare_level(
+            service, config, index, connection_pools[service['name']], progress, stop_event))
+        for service, results in zip(services, level_results):
+            all_results[service['name']].append(results)
+        if stop_event and stop_event.is_set():
+            break
+        if index < len(config['concurrent_users']) - 1:
+            waited = run_in_parallel(services, lambda service: cooldowns[service['name']].wait)
+            for results, seconds in zip(level_results, waited):
+                results['冷却时间(秒)'] = f"{seconds:.2f}"
+    return all_results
@@ -0,0 +1,147 @@
+import threading
+import time
+from loguru import logger
+from core.load_tester import create_load_tester
+
+# 控制循环调整用户数的间隔（秒）
+CONTROL_INTERVAL = 0.1
+
+def parse_profile(stages):
+    """解析负载曲线配置
+
+    每个阶段是以下两种之一：
+    - {"duration": N, "users": U}：用 U 个用户持续 N 秒（保持或阶跃）
+    - {"duration": M, "from": A, "to": B}：M 秒内从 A 个用户线性变化到 B 个，from 缺省为上一阶段的用户数
+    """
+    parsed = []
+    users = 0
+    for stage in stages:
+        duration = stage['duration']
+        if 'to' in stage:
+            start_users = stage.get('from', users)
+            end_users = stage['to']
+            label = f"{start_users}→{end_users} 用户 {duration}秒"
+        else:
+            start_users = end_users = stage['users']
+            label = f"{end_users} 用户 {duration}秒"
+        if duration <= 0 or start_users < 0 or end_users < 0:
+            raise ValueError(f"无效的负载阶段配置: {stage}")
+        parsed.append({
+            'duration': duration,
+            'start_users': start_users,
+            'end_users': end_users,
+            'label': label
+        })
+        users = end_users
+    return parsed
+
+class ProfileRunner:
+    """按负载曲线执行一次连续压测
+
+    整个曲线共用一个 LoadTester 和一组常驻用户线程，控制循环按当前阶段的目标
+    用户数增减线程，阶段之间不重建测试实例也不暂停。每个阶段结束时单独统计一行结果。
+    """
+
+    def __init__(self, tester, stages):
+        self.tester = tester
+        self.stages = parse_profile(stages)
+        self._users = []  # 当前运行的用户 [(线程, 停止事件)]
+        self._threads = []  # 可能仍在运行的用户线程（含已通知停止、仍在完成当前请求的），每个阶段结束时清理已退出的
+
+    def _user_loop(self, stop_event):
+        while not stop_event.is_set() and not self.tester.stop_event.is_set():
+            self.tester.make_request()
+
+    def _set_users(self, target):
+        """增减用户线程到目标数量，多余的用户完成当前请求后退出"""
+        while len(self._users) < target:
+            stop_event = threading.Event()
+            thread = threading.Thread(target=self._user_loop, args=(stop_event,), daemon=True)
+            thread.start()
+            self._users.append((thread, stop_event))
+            self._threads.append(thread)
+        while len(self._users) > target:
+            _, stop_event = self._users.pop()
+            stop_event.set()
+
+    def _stop_users(self):
+        """停止所有用户线程并等待在途请求完成"""
+        self._set_users(0)
+        for thread in self._threads:
+            thread.join()
+
+    def run(self):
+        max_users = max(max(stage['start_users'], stage['end_users']) for stage in self.stages)
+        self.tester.connection_pool.resize(max_users)
+        self.tester.log_test_info()
+        stage_results = []
+
+        try:
+            for index, stage in enumerate(self.stages):
+                logger.info(f"\n负载阶段: {stage['label']}")
+                stage_start = time.perf_counter()
+                while not self.tester.stop_event.is_set():
+                    elapsed = time.perf_counter() - stage_start
+                    if elapsed >= stage['duration']:
+                        break
+                    progress = elapsed / stage['duration']
+                    target = round(stage['start_users'] + (stage['end_users'] - stage['start_users']) * progress)
+                    self._set_users(target)
+                    time.sleep(min(CONTROL_INTERVAL, stage['duration'] - elapsed))
+                if index == len(self.stages) - 1 or self.tester.stop_event.is_set():
+                    # 最后一个阶段等在途请求完成后再汇总，这些请求计入本阶段而不是被丢弃
+                    self._stop_users()
+                stage_time = time.perf_counter() - stage_start
+                # 长时间的爬坡曲线会反复增减用户，只保留还在运行的线程供最终等待
+                self._threads = [thread for thread in self._threads if thread.is_alive()]
+
+                # 每个阶段边界只切换一次统计对象，边界之后完成的请求计入下一阶段
+                stats, error_recorder = self.tester.reset_stats()
+                results = self._build_stage_results(stats, error_recorder, stage_time)
+                results['阶段'] = stage['label']
+                results['并发用户数'] = stage['end_users']
+                stage_results.append(results)
+                if self.tester.stop_event.is_set():
+                    break
+        finally:
+            self._stop_users()
+            # 最后一次切换之后没有请求，只需关闭错误记录（异常退出时其中可能有样本文件）
+            self.tester.error_recorder.close()
+            self.tester.connection_pool.release_all()
+            self.tester.close_raw_log()
+
+        return stage_results
+
+    def _build_stage_results(self, stats, error_recorder, stage_time):
+        results = self.tester.build_results(stage_time, stats, error_recorder)
+        snapshot = stats.snapshot()
+        results['总请求数'] = snapshot.success_count + snapshot.failure_count
+
+        logger.info("\n阶段结果:")
+        for key, value in results.items():
+            if isinstance(value, list):
+                continue
+            logger.info(f"{key}: {value}")
+        return results
+
+def run_profile(service, config, connection_pool=None, progress=None, stop_event=None):
+    """按 config['profile'] 对一个服务执行连续压测，返回每个阶段的结果"""
+    stages = parse_profile(config['profile'])
+    max_users = max(max(stage['start_users'], stage['end_users']) for stage in stages)
+    tester = create_load_tester(service, config, max_users, connection_pool=connection_pool, stop_event=stop_event)
+    if tester.engine != 'thread':
+        raise ValueError("负载曲线模式只支持 thread 引擎")
+    if tester.warmup:
+        # 曲线各阶段连续执行、逐阶段统计，没有单独的预热阶段
+        logger.warning(f"负载曲线模式不执行预热，已忽略 {service['name']} 的 warmup 配置；"
+                       f"需要预热时可在曲线开头加一个低负载阶段")
+        tester.warmup = None
+
+    if progress:
+        progress.start_level(service['name'], '负载曲线', tester)
+    stage_results = ProfileRunner(tester, config['profile']).run()
+    if progress:
+        progress.finish_level(service['name'])
+    for results in stage_results:
+        results['服务名称'] = service['name']
+    return stage_results
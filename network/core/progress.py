@@ -0,0 +1,75 @@
+import threading
+from core.stats import StatsShard
+
+class ProgressTracker:
+    """跟踪一次压测的进度并生成实时快照
+
+    run_load_tests 在每个测试开始/结束时更新当前服务、并发度和测试实例，
+    snapshot() 从当前测试实例的实时进度（LoadTester.progress）合并出已完成请求数、
+    实时 QPS、分位数和错误数。多进程和多节点引擎的进度由子进程和 agent 每秒上报。
+    多个服务并行测试时同时跟踪多个测试实例，快照为所有运行中服务的合计。
+    快照字段尽量精简，推送给前端时每次只有百余字节。
+    """
+
+    def __init__(self):
+        self.total_levels = 0
+        self.finished_levels = 0
+        self.service = None
+        self.level = None
+        # 服务名称 -> 正在运行的测试实例
+        self.testers = {}
+        self._lock = threading.Lock()
+
+    def start_run(self, total_levels):
+        with self._lock:
+            self.total_levels = total_levels
+            self.finished_levels = 0
+
+    def start_level(self, service_name, level, tester):
+        with self._lock:
+            self.service = service_name
+            self.level = level
+            self.testers[service_name] = tester
+
+    def finish_level(self, service_name=None):
+        """结束一个服务的当前测试，service_name 为空时结束所有服务"""
+        with self._lock:
+            self.finished_levels += 1
+            if service_name is None:
+                self.testers = {}
+            else:
+                self.testers.pop(service_name, None)
+
+    def snapshot(self):
+        with self._lock:
+            testers = list(self.testers.values())
+            snapshot = {
+                'service': ', '.join(self.testers) if len(self.testers) > 1 else self.service,
+                'level': self.level,
+                'finished': self.finished_levels,
+                'total': self.total_levels
+            }
+        if not testers:
+            return snapshot
+
+        stats = StatsShard()
+        # 实时 QPS 取各测试实例最近一个完整秒的请求数之和
+        qps = 0
+        warmup = False
+        for tester in testers:
+            tester_stats, tester_qps, tester_warmup = tester.progress()
+            stats.merge(tester_stats)
+            qps += tester_qps
+            warmup = warmup or tester_warmup
+        histogram = stats.histogram
+        snapshot.update({
+            'done': stats.success_count + stats.failure_count,
+            'errors': stats.failure_count,
+            'qps': qps,
+            'p50': round(histogram.percentile(50), 4),
+            'p95': round(histogram.percentile(95), 4),
+            'p99': round(histogram.percentile(99), 4)
+        })
+        if warmup:
+            snapshot['warmup'] = True
+        return snapshot
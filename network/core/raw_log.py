@@ -0,0 +1,118 @@
+import os
+import queue
+import struct
+import threading
+import time
+import uuid
+from datetime import datetime
+import numpy as np
+from loguru import logger
+
+# 文件头：魔数、每条记录字节数、测试开始的 Unix 时间戳
+RAW_LOG_MAGIC = b'PTRAW001'
+HEADER_FORMAT = '<8sQd'
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+
+# 每个请求一条定长记录，共 22 字节
+RECORD_DTYPE = np.dtype([
+    ('start_us', '<u8'),       # 相对测试开始的发送时间（微秒）
+    ('latency_us', '<u4'),     # 响应时间（微秒）
+    ('status', '<u2'),         # 状态码，未收到响应为 0
+    ('bytes_sent', '<u4'),     # 请求体字节数
+    ('bytes_received', '<u4'), # 响应体字节数
+])
+
+# 每个线程攒够这么多条记录后整块交给后台线程写入
+CHUNK_ROWS = 8192
+# 等待写入的块数上限，写盘跟不上时发压线程等待，内存不会无限增长
+MAX_PENDING_CHUNKS = 64
+
+_UINT32_MAX = 0xFFFFFFFF
+
+class RawLogWriter:
+    """逐请求原始记录的后台写入器
+
+    发压线程只把一个元组追加到本线程的缓冲列表，攒满 CHUNK_ROWS 条后整块放入队列；
+    后台线程把整块转换为定长二进制记录追加到文件。十亿级请求的记录也只落盘不占内存。
+    """
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self.base_ns = time.perf_counter_ns()
+        self.base_time = time.time()
+        self.rows = 0
+        self._local = threading.local()
+        # 各线程尚未交给后台线程的缓冲列表
+        self._buffers = {}
+        self._lock = threading.Lock()
+        self._queue = queue.Queue(maxsize=MAX_PENDING_CHUNKS)
+        self._file = open(filepath, 'wb')
+        self._file.write(struct.pack(HEADER_FORMAT, RAW_LOG_MAGIC, RECORD_DTYPE.itemsize, self.base_time))
+        self._writer = threading.Thread(target=self._write_chunks, name='raw-log-writer', daemon=True)
+        self._writer.start()
+
+    def record(self, start_ns, latency_ns, status, bytes_sent, bytes_received):
+        buffer = getattr(self._local, 'buffer', None)
+        if buffer is None:
+            buffer = self._new_buffer()
+        buffer.append((
+            max(0, start_ns - self.base_ns) // 1000,
+            min(max(0, latency_ns) // 1000, _UINT32_MAX),
+            status,
+            min(bytes_sent, _UINT32_MAX),
+            min(bytes_received, _UINT32_MAX),
+        ))
+        if len(buffer) >= CHUNK_ROWS:
+            with self._lock:
+                del self._buffers[id(buffer)]
+            self._queue.put(buffer)
+            self._new_buffer()
+
+    def _new_buffer(self):
+        buffer = self._local.buffer = []
+        with self._lock:
+            self._buffers[id(buffer)] = buffer
+        return buffer
+
+    def _write_chunks(self):
+        while True:
+            chunk = self._queue.get()
+            if chunk is None:
+                break
+            try:
+                self._file.write(np.array(chunk, dtype=RECORD_DTYPE).tobytes())
+                self.rows += len(chunk)
+            except Exception as e:
+                logger.error(f"写入原始请求记录失败: {str(e)}")
+
+    def close(self):
+        """写入所有线程中剩余的记录并关闭文件，调用时发压线程应已结束"""
+        with self._lock:
+            remaining = [buffer for buffer in self._buffers.values() if buffer]
+            self._buffers = {}
+        for buffer in remaining:
+            self._queue.put(buffer)
+        self._queue.put(None)
+        self._writer.join()
+        self._file.close()
+        logger.info(f"原始请求记录已保存到文件: {self.filepath}（{self.rows} 条）")
+
+def create_raw_log(session_dir, name, num_threads):
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    safe_name = ''.join(c if c.isalnum() else '_' for c in name)
+    # 同一进程同一秒内可能有多个同名同并发度的测试（并行服务、重复的容量探测），加随机后缀避免互相覆盖
+    filename = f"raw_{safe_name}_{num_threads}_{timestamp}_{os.getpid()}_{uuid.uuid4().hex[:6]}.bin"
+    return RawLogWriter(os.path.join(session_dir, filename))
+
+def load_raw_log(filepath):
+    """以内存映射方式读取原始请求记录，返回 (记录数组, 测试开始的 Unix 时间戳)
+
+    记录数组是 RECORD_DTYPE 结构化数组，按需从磁盘读取，不会整体载入内存。
+    """
+    with open(filepath, 'rb') as f:
+        magic, record_size, base_time = struct.unpack(HEADER_FORMAT, f.read(HEADER_SIZE))
+    if magic != RAW_LOG_MAGIC or record_size != RECORD_DTYPE.itemsize:
+        raise ValueError(f"不是有效的原始请求记录文件: {filepath}")
+    if os.path.getsize(filepath) == HEADER_SIZE:
+        return np.empty(0, dtype=RECORD_DTYPE), base_time
+    return np.memmap(filepath, dtype=RECORD_DTYPE, mode='r', offset=HEADER_SIZE), base_time
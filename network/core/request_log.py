@@ -0,0 +1,53 @@
+import sys
+import itertools
+from loguru import logger
+
+REQUEST_LOG_MODES = ('all', 'off', 'sample', 'errors')
+
+# 单请求日志单独打标，由 configure_logging 路由到后台队列 sink
+request_logger = logger.bind(request_log=True)
+
+def _is_request_log(record):
+    return record['extra'].get('request_log', False)
+
+def configure_logging():
+    """配置日志输出
+
+    普通日志保持同步输出；单请求日志写入 enqueue=True 的 sink。
+    loguru 在调用线程中格式化消息和记录，只把写 stderr 交给后台线程，
+    因此压测线程不会阻塞在终端输出上，但格式化的开销仍然存在，
+    高并发时应通过 request_log 策略减少输出的条数。
+    """
+    logger.remove()
+    logger.add(sys.stderr, filter=lambda record: not _is_request_log(record))
+    logger.add(sys.stderr, filter=_is_request_log, enqueue=True)
+
+class RequestLogPolicy:
+    """单请求日志策略
+
+    - all: 每个请求都记录（默认）
+    - off: 不记录
+    - sample: 每 sample_rate 个请求记录 1 个
+    - errors: 只记录失败的请求
+    """
+
+    def __init__(self, mode='all', sample_rate=100):
+        if mode not in REQUEST_LOG_MODES:
+            raise ValueError(f"不支持的请求日志模式: {mode}")
+        self.mode = mode
+        self.sample_rate = max(1, int(sample_rate))
+        self._counter = itertools.count()
+
+    def should_log(self, is_error):
+        if self.mode == 'all':
+            return True
+        if self.mode == 'errors':
+            return is_error
+        if self.mode == 'sample':
+            return next(self._counter) % self.sample_rate == 0
+        return False
+
+    def describe(self):
+        if self.mode == 'sample':
+            return f"sample (1/{self.sample_rate})"
+        return self.mode
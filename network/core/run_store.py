@@ -0,0 +1,409 @@
+import os
+import sys
+import json
+import time
+import sqlite3
+import argparse
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+import numpy as np
+from core.stats import PERCENTILES
+
+# 运行历史数据库，不在 results 目录下，服务重启清空结果目录时保留
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'history', 'runs.sqlite3')
+
+# 结果中按列存储、可直接查询的指标：(列名, 结果键)
+METRIC_COLUMNS = [
+    ('total_time', '总耗时(秒)'),
+    ('success_count', '成功请求数'),
+    ('failure_count', '失败请求数'),
+    ('mean', '平均响应时间(秒)'),
+    ('max', '最大响应时间(秒)'),
+    ('min', '最小响应时间(秒)'),
+] + [
+    (f"p{str(percent).replace('.', '')}", f'{label}响应时间(秒)') for percent, label in PERCENTILES
+] + [
+    ('qps', 'QPS'),
+]
+
+# 基线对比检验的延迟分位数
+COMPARE_PERCENTILES = [(50, 'P50'), (95, 'P95'), (99, 'P99')]
+# bootstrap 重采样次数和置信水平
+BOOTSTRAP_SAMPLES = 1000
+CONFIDENCE = 0.95
+# 变化小于该比例时即使统计显著也不判为回归，避免样本量很大时微小波动也被标记
+MIN_EFFECT = 0.05
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at REAL NOT NULL,
+    tag TEXT,
+    session_id TEXT,
+    csv_file TEXT,
+    config TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_runs_created_at ON runs(created_at);
+CREATE INDEX IF NOT EXISTS idx_runs_tag ON runs(tag, created_at);
+CREATE INDEX IF NOT EXISTS idx_runs_session ON runs(session_id, created_at);
+
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    service TEXT NOT NULL,
+    level TEXT NOT NULL,
+    users INTEGER,
+    {metric_columns},
+    histogram TEXT,
+    timeline TEXT,
+    extra TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_results_run ON results(run_id);
+CREATE INDEX IF NOT EXISTS idx_results_service ON results(service, level);
+""".format(metric_columns=',\n    '.join(f'{column} REAL' for column, _ in METRIC_COLUMNS))
+
+# 结果中不写入 extra 的键：已按列存储，或是单独存储的明细
+_STORED_KEYS = {key for _, key in METRIC_COLUMNS} | {
+    '服务名称', '并发用户数', '阶段', '延迟直方图', '延迟热力图', 'timeline', '载荷大小分布', 'error_file', 'raw_log_files'
+}
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def _parse_time(value):
+    """把 YYYY-MM-DD[ HH:MM:SS] 或 Unix 时间戳转换为时间戳"""
+    if value is None or value == '':
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    for fmt in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d'):
+        try:
+            return datetime.strptime(value, fmt).timestamp()
+        except ValueError:
+            continue
+    raise ValueError(f"无法解析的时间: {value}")
+
+class RunStore:
+    """压测运行历史
+
+    每次运行保存一行 runs（配置、标签、会话），每个服务每个并发度（或负载阶段）保存一行 results：
+    聚合指标和分位数按列存储，可以直接按服务、时间、标签查询；
+    延迟直方图和按秒请求数以 JSON 保存，用于与基线做 bootstrap 对比。
+    """
+
+    def __init__(self, path=DEFAULT_DB_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        """打开一个连接，正常结束时提交，出错时回滚，最后关闭"""
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA foreign_keys=ON')
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def save_run(self, all_results, config, tag=None, session_id=None, csv_file=None):
+        """保存一次运行的全部结果，返回 run_id"""
+        with self._lock, self._connect() as conn:
+            cursor = conn.execute(
+                'INSERT INTO runs (created_at, tag, session_id, csv_file, config) VALUES (?, ?, ?, ?, ?)',
+                (time.time(), tag, session_id, csv_file, json.dumps(config, ensure_ascii=False, default=str))
+            )
+            run_id = cursor.lastrowid
+            columns = ['run_id', 'service', 'level', 'users'] + [column for column, _ in METRIC_COLUMNS] + \
+                      ['histogram', 'timeline', 'extra']
+            conn.executemany(
+                f"INSERT INTO results ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                [self._result_row(run_id, result) for result in all_results]
+            )
+        return run_id
+
+    @staticmethod
+    def _result_row(run_id, result):
+        histogram = [
+            [row['延迟下限(微秒)'], row['延迟上限(微秒)'], row['请求数']]
+            for row in result.get('延迟直方图', [])
+        ]
+        timeline = [row['请求数'] for row in result.get('timeline', [])]
+        extra = {
+            key: value for key, value in result.items()
+            if key not in _STORED_KEYS and not isinstance(value, (list, dict))
+        }
+        return (
+            run_id, result['服务名称'], str(result.get('阶段', result.get('并发用户数'))), result.get('并发用户数')
+        ) + tuple(_to_float(result.get(key)) for _, key in METRIC_COLUMNS) + (
+            json.dumps(histogram), json.dumps(timeline), json.dumps(extra, ensure_ascii=False, default=str)
+        )
+
+    def set_tag(self, run_id, tag):
+        with self._lock, self._connect() as conn:
+            return conn.execute('UPDATE runs SET tag = ? WHERE id = ?', (tag, run_id)).rowcount > 0
+
+    def list_runs(self, service=None, tag=None, since=None, until=None, session_id=None, limit=50):
+        """按条件查询运行，新的在前；since/until 为 YYYY-MM-DD[ HH:MM:SS] 或 Unix 时间戳"""
+        conditions, params = [], []
+        if service:
+            conditions.append('id IN (SELECT run_id FROM results WHERE service = ?)')
+            params.append(service)
+        if tag:
+            conditions.append('tag = ?')
+            params.append(tag)
+        if since is not None:
+            conditions.append('created_at >= ?')
+            params.append(_parse_time(since))
+        if until is not None:
+            conditions.append('created_at <= ?')
+            params.append(_parse_time(until))
+        if session_id:
+            conditions.append('session_id = ?')
+            params.append(session_id)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        with self._connect() as conn:
+            rows = conn.execute(
+                f'SELECT id, created_at, tag, session_id, csv_file FROM runs {where} ORDER BY created_at DESC, id DESC LIMIT ?',
+                params + [limit]
+            ).fetchall()
+            services = {}
+            if rows:
+                ids = [row['id'] for row in rows]
+                for item in conn.execute(
+                    f"SELECT DISTINCT run_id, service FROM results WHERE run_id IN ({', '.join('?' * len(ids))})", ids
+                ):
+                    services.setdefault(item['run_id'], []).append(item['service'])
+        return [self._run_dict(row, services.get(row['id'], [])) for row in rows]
+
+    @staticmethod
+    def _run_dict(row, services):
+        return {
+            'id': row['id'],
+            'created_at': datetime.fromtimestamp(row['created_at']).strftime('%Y-%m-%d %H:%M:%S'),
+            'tag': row['tag'],
+            'session_id': row['session_id'],
+            'csv_file': row['csv_file'],
+            'services': services
+        }
+
+    def latest_run(self, **filters):
+        runs = self.list_runs(limit=1, **filters)
+        return runs[0] if runs else None
+
+    def get_run(self, run_id, with_samples=False):
+        """运行详情：配置和每个服务/并发度的指标；with_samples 时附带直方图和按秒请求数"""
+        with self._connect() as conn:
+            row = conn.execute('SELECT * FROM runs WHERE id = ?', (run_id,)).fetchone()
+            if row is None:
+                return None
+            results = conn.execute('SELECT * FROM results WHERE run_id = ? ORDER BY id', (run_id,)).fetchall()
+        run = self._run_dict(row, sorted({result['service'] for result in results}))
+        run['config'] = json.loads(row['config'])
+        run['results'] = []
+        for result in results:
+            item = {
+                '服务名称': result['service'],
+                '级别': result['level'],
+                '并发用户数': result['users'],
+            }
+            item.update({key: result[column] for column, key in METRIC_COLUMNS})
+            item.update(json.loads(result['extra'] or '{}'))
+            if with_samples:
+                item['histogram'] = json.loads(result['histogram'] or '[]')
+                item['timeline'] = json.loads(result['timeline'] or '[]')
+            run['results'].append(item)
+        return run
+
+    def compare(self, run_id, baseline_id, **options):
+        """当前运行与基线运行的对比报告，见 compare_runs"""
+        current = self.get_run(run_id, with_samples=True)
+        baseline = self.get_run(baseline_id, with_samples=True)
+        if current is None or baseline is None:
+            raise KeyError(f"运行不存在: {run_id if current is None else baseline_id}")
+        return compare_runs(current, baseline, **options)
+
+def _histogram_arrays(histogram):
+    """直方图 [[下限, 上限, 次数]] 转换为 (桶中间值秒数组, 次数数组)"""
+    if not histogram:
+        return np.empty(0), np.empty(0, dtype=np.int64)
+    data = np.asarray(histogram, dtype=np.float64)
+    return (data[:, 0] + data[:, 1]) / 2 / 1e6, data[:, 2].astype(np.int64)
+
+def _histogram_percentiles(values, counts, percent):
+    """每行是一组桶计数，向量化计算每组的分位数"""
+    totals = counts.sum(axis=-1, keepdims=True)
+    targets = np.maximum(1, np.floor(totals * percent / 100 + 0.5))
+    return values[np.argmax(np.cumsum(counts, axis=-1) >= targets, axis=-1)]
+
+def bootstrap_percentile_delta(baseline, current, percent, rng, samples=BOOTSTRAP_SAMPLES):
+    """两组直方图分位数之差（当前 - 基线）的 bootstrap 分布
+
+    每次重采样按原直方图的桶比例做一次多项分布抽样，相当于对全部请求有放回抽样，
+    但只需处理桶数而不是请求数。
+    """
+    deltas = []
+    for values, counts, sign in ((*baseline, -1), (*current, 1)):
+        resampled = rng.multinomial(counts.sum(), counts / counts.sum(), size=samples)
+        deltas.append(sign * _histogram_percentiles(values, resampled, percent))
+    return deltas[0] + deltas[1]
+
+def bootstrap_mean_delta(baseline, current, rng, samples=BOOTSTRAP_SAMPLES):
+    """两组按秒请求数均值之差（当前 - 基线）的 bootstrap 分布"""
+    means = []
+    for series in (baseline, current):
+        indexes = rng.integers(0, len(series), size=(samples, len(series)))
+        means.append(series[indexes].mean(axis=1))
+    return means[1] - means[0]
+
+def _steady_seconds(timeline):
+    """按秒请求数去掉首尾两个不完整的秒"""
+    series = np.asarray(timeline, dtype=np.float64)
+    return series[1:-1] if len(series) > 2 else series
+
+def _verdict(low, high, change, higher_is_worse, min_effect):
+    worse = low > 0 if higher_is_worse else high < 0
+    better = high < 0 if higher_is_worse else low > 0
+    if worse and abs(change) >= min_effect:
+        return '回归'
+    if better and abs(change) >= min_effect:
+        return '改善'
+    return '无显著变化'
+
+def compare_runs(current, baseline, samples=BOOTSTRAP_SAMPLES, confidence=CONFIDENCE, min_effect=MIN_EFFECT, seed=0):
+    """按服务和级别对比两次运行的 P50/P95/P99 延迟和 QPS
+
+    差值的置信区间由 bootstrap 得到：区间不包含 0 且变化幅度不小于 min_effect 时，
+    判为回归（延迟变大或 QPS 变小）或改善。两次运行都有的服务/级别才参与对比。
+    """
+    rng = np.random.default_rng(seed)
+    tail = (1 - confidence) / 2 * 100
+    baseline_results = {(item['服务名称'], item['级别']): item for item in baseline['results']}
+    rows = []
+    for item in current['results']:
+        base = baseline_results.get((item['服务名称'], item['级别']))
+        if base is None:
+            continue
+        checks = []
+        current_hist, base_hist = _histogram_arrays(item['histogram']), _histogram_arrays(base['histogram'])
+        if current_hist[1].sum() and base_hist[1].sum():
+            for percent, label in COMPARE_PERCENTILES:
+                deltas = bootstrap_percentile_delta(base_hist, current_hist, percent, rng, samples)
+                base_value = float(_histogram_percentiles(*base_hist, percent))
+                current_value = float(_histogram_percentiles(*current_hist, percent))
+                checks.append((f'{label}响应时间(秒)', base_value, current_value, deltas, True))
+        current_qps, base_qps = _steady_seconds(item['timeline']), _steady_seconds(base['timeline'])
+        if len(current_qps) and len(base_qps):
+            deltas = bootstrap_mean_delta(base_qps, current_qps, rng, samples)
+            checks.append(('QPS', float(base_qps.mean()), float(current_qps.mean()), deltas, False))
+
+        for metric, base_value, current_value, deltas, higher_is_worse in checks:
+            low, high = np.percentile(deltas, [tail, 100 - tail])
+            change = (current_value - base_value) / base_value if base_value else 0
+            rows.append({
+                '服务名称': item['服务名称'],
+                '级别': item['级别'],
+                '指标': metric,
+                '基线': round(base_value, 6),
+                '当前': round(current_value, 6),
+                '变化(%)': round(change * 100, 2),
+                '差值置信区间': [round(float(low), 6), round(float(high), 6)],
+                '结论': _verdict(low, high, change, higher_is_worse, min_effect)
+            })
+    return {
+        'run_id': current['id'],
+        'baseline_id': baseline['id'],
+        'confidence': confidence,
+        'min_effect': min_effect,
+        'regressions': sum(row['结论'] == '回归' for row in rows),
+        'rows': rows
+    }
+
+def format_report(report):
+    """对比报告的文本形式，用于命令行输出"""
+    lines = [f"运行 {report['run_id']} 对比基线 {report['baseline_id']}"
+             f"（置信水平 {report['confidence']:.0%}，最小变化 {report['min_effect']:.0%}）"]
+    for row in report['rows']:
+        low, high = row['差值置信区间']
+        lines.append(
+            f"[{row['结论']}] {row['服务名称']} {row['级别']} {row['指标']}: "
+            f"{row['基线']} -> {row['当前']} ({row['变化(%)']:+.2f}%)，差值区间 [{low}, {high}]"
+        )
+    if not report['rows']:
+        lines.append('没有可对比的服务/级别')
+    lines.append(f"回归项: {report['regressions']}")
+    return '\n'.join(lines)
+
+def resolve_baseline(store, run_id, baseline=None, baseline_tag='baseline'):
+    """确定基线运行：指定的运行 id，或早于当前运行、带有 baseline_tag 标签的最近一次运行"""
+    if baseline is not None:
+        return int(baseline)
+    for run in store.list_runs(tag=baseline_tag, limit=100):
+        if run['id'] < run_id:
+            return run['id']
+    return None
+
+def main():
+    parser = argparse.ArgumentParser(description='压测运行历史查询与基线对比')
+    parser.add_argument('--db', default=DEFAULT_DB_PATH, help='运行历史数据库路径')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    list_parser = subparsers.add_parser('list', help='查询运行')
+    list_parser.add_argument('--service')
+    list_parser.add_argument('--tag')
+    list_parser.add_argument('--since', help='开始时间，YYYY-MM-DD[ HH:MM:SS]')
+    list_parser.add_argument('--until', help='结束时间，YYYY-MM-DD[ HH:MM:SS]')
+    list_parser.add_argument('--limit', type=int, default=20)
+
+    tag_parser = subparsers.add_parser('tag', help='设置运行标签')
+    tag_parser.add_argument('run_id', type=int)
+    tag_parser.add_argument('tag')
+
+    compare_parser = subparsers.add_parser('compare', help='与基线对比，有回归时退出码为 1')
+    compare_parser.add_argument('--run', default='latest', help='运行 id，默认最近一次')
+    compare_parser.add_argument('--baseline', type=int, help='基线运行 id')
+    compare_parser.add_argument('--baseline-tag', default='baseline', help='未指定基线时使用带此标签的最近一次运行')
+    compare_parser.add_argument('--min-effect', type=float, default=MIN_EFFECT)
+    compare_parser.add_argument('--json', action='store_true', help='输出 JSON')
+    args = parser.parse_args()
+
+    store = RunStore(args.db)
+    if args.command == 'list':
+        for run in store.list_runs(service=args.service, tag=args.tag, since=args.since, until=args.until, limit=args.limit):
+            print(f"{run['id']}\t{run['created_at']}\t{run['tag'] or '-'}\t{', '.join(run['services'])}")
+        return 0
+    if args.command == 'tag':
+        if not store.set_tag(args.run_id, args.tag):
+            print(f"运行不存在: {args.run_id}", file=sys.stderr)
+            return 2
+        return 0
+
+    if args.run == 'latest':
+        latest = store.latest_run()
+        if latest is None:
+            print('没有运行记录', file=sys.stderr)
+            return 2
+        run_id = latest['id']
+    else:
+        run_id = int(args.run)
+    baseline_id = resolve_baseline(store, run_id, args.baseline, args.baseline_tag)
+    if baseline_id is None:
+        print(f"没有找到标签为 {args.baseline_tag} 的基线运行", file=sys.stderr)
+        return 2
+    report = store.compare(run_id, baseline_id, min_effect=args.min_effect)
+    print(json.dumps(report, ensure_ascii=False, indent=2) if args.json else format_report(report))
+    return 1 if report['regressions'] else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -8,6 +8,7 @@ class TestSession:
         self.session_id = session_id
         self.created_at = datetime.now()
         self.results_dir = None
+        self.error_files = []  # 最近一次测试的错误记录文件
         self.setup_directories()
         
     def setup_directories(self):
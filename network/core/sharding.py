@@ -0,0 +1,174 @@
+import multiprocessing
+import queue
+import threading
+import time
+from loguru import logger
+from core.load_tester import LoadTester, get_tester_class, parse_warmup
+from core.utils import ConnectionPool
+from core.request_log import configure_logging
+
+# 等待所有分片进程就绪的最长时间（秒）
+SHARD_START_TIMEOUT = 120
+# 子进程和 agent 上报实时进度的间隔（秒）
+PROGRESS_INTERVAL = 1
+
+def split_evenly(total, parts):
+    """把 total 尽量均匀地拆成 parts 份"""
+    base, extra = divmod(total, parts)
+    return [base + (1 if i < extra else 0) for i in range(parts)]
+
+def split_warmup(warmup, parts):
+    """把按请求数的预热拆分到多个进程或节点，按时长的预热各自执行相同时长"""
+    warmup = parse_warmup(warmup)
+    if not warmup or 'duration' in warmup:
+        return [warmup] * parts
+    return [{'requests': requests} for requests in split_evenly(warmup['requests'], parts)]
+
+def _has_work(requests, warmup):
+    return requests > 0 or bool(warmup and (warmup.get('duration') or warmup.get('requests')))
+
+def plan_shards(num_threads, num_requests, warmup, parts):
+    """把一个并发度拆分到 parts 个进程或节点，返回 [(序号, 线程数, 请求数, 预热, 开环速率占比)]
+
+    开环速率按请求数比例拆分；总请求数为 0（只预热）时按线程数比例拆分。
+    没有线程或没有任何请求（含预热）的分片不启动，否则它会以 0 速率退化为闭环。
+    """
+    threads_per_shard = split_evenly(num_threads, parts)
+    # 请求只分给有线程的分片
+    requests_per_shard = split_evenly(num_requests, sum(1 for threads in threads_per_shard if threads)) if num_threads else []
+    warmup_per_shard = split_warmup(warmup, parts)
+    plan = []
+    for i, threads in enumerate(threads_per_shard):
+        if not threads:
+            continue
+        requests = requests_per_shard[i]
+        if not _has_work(requests, warmup_per_shard[i]):
+            continue
+        share = requests / num_requests if num_requests else threads / num_threads
+        plan.append((i, threads, requests, warmup_per_shard[i], share))
+    return plan
+
+def _report_progress(shard_index, tester, result_queue, done):
+    """定期把分片的实时进度发给父进程"""
+    while not done.wait(PROGRESS_INTERVAL):
+        result_queue.put(('progress', shard_index, tester.export_progress()))
+
+def _run_shard(shard_index, engine, tester_kwargs, keep_alive, start_barrier, result_queue, stop_event):
+    """子进程入口：执行一个分片，测试期间每秒上报进度，结束后把可合并的统计数据发回父进程
+
+    stop_event 是父进程创建的跨进程事件，取消测试时由父进程设置，分片随即停止发压。
+    """
+    configure_logging()
+    try:
+        # 错误样本由父进程合并后统一写入样本文件
+        tester = get_tester_class(engine)(connection_pool=ConnectionPool(keep_alive=keep_alive), stop_event=stop_event,
+                                          error_stream=False, **tester_kwargs)
+        # 所有分片都完成初始化后同时开始发压
+        start_barrier.wait()
+        done = threading.Event()
+        reporter = threading.Thread(target=_report_progress, args=(shard_index, tester, result_queue, done), daemon=True)
+        reporter.start()
+        start_time = time.time()
+        try:
+            tester.execute()
+        finally:
+            # 结果必须是分片发出的最后一条消息，父进程收齐结果后不再读取队列
+            done.set()
+            reporter.join()
+        end_time = time.time()
+        tester.connection_pool.close()
+        tester.close_raw_log()
+
+        stats = tester.export_stats()
+        # 预热时间不计入总耗时
+        stats['start_time'] = start_time + tester.warmup_time
+        stats['end_time'] = end_time
+        result_queue.put(('result', shard_index, stats, None))
+    except Exception as e:
+        start_barrier.abort()
+        result_queue.put(('result', shard_index, None, f"{type(e).__name__}: {str(e)}"))
+
+class ProcessShardedLoadTester(LoadTester):
+    """多进程压测引擎
+
+    把一个并发度的用户数和请求数均匀拆分到多个子进程，每个子进程内部使用
+    shard_engine 指定的引擎发压，结束后父进程合并成功/失败数、响应时间和错误记录。
+    总耗时取最早开始到最晚结束的时间，QPS 随进程数扩展而不受单进程 GIL 限制。
+    """
+    engine = 'process'
+
+    def __init__(self, processes, shard_engine='thread', **kwargs):
+        # 原始请求记录由各子进程分别写入，父进程只汇总文件名
+        super().__init__(**dict(kwargs, raw_log=False))
+        get_tester_class(shard_engine)  # 提前校验引擎名称
+        self.processes = max(1, min(processes, self.num_threads))
+        self.shard_engine = shard_engine
+        # 子进程重新构造测试实例所需的参数（连接池和停止事件不能跨进程传递，
+        # 停止事件由 execute 换成跨进程事件转发给子进程）
+        self.shard_kwargs = {
+            key: value for key, value in kwargs.items()
+            if key not in ('connection_pool', 'stop_event', 'num_threads', 'num_requests', 'error_stream')
+        }
+
+    def log_test_info(self):
+        super().log_test_info()
+        logger.info(f"进程数: {self.processes}，进程内引擎: {self.shard_engine}")
+
+    def execute(self):
+        plan = plan_shards(self.num_threads, self.num_requests, self.warmup, self.processes)
+        if not plan:
+            return 0.0
+        ctx = multiprocessing.get_context('spawn')
+        start_barrier = ctx.Barrier(len(plan), timeout=SHARD_START_TIMEOUT)
+        result_queue = ctx.Queue()
+        # 父进程的停止事件只在本进程内有效，取消时通过跨进程事件通知各分片
+        shard_stop = ctx.Event()
+
+        workers = []
+        for i, threads, requests, warmup, share in plan:
+            shard_kwargs = dict(self.shard_kwargs, num_threads=threads, num_requests=requests, warmup=warmup)
+            if self.arrival_rate:
+                shard_kwargs['arrival_rate'] = self.arrival_rate * share
+            worker = ctx.Process(
+                target=_run_shard,
+                args=(i, self.shard_engine, shard_kwargs, self.connection_pool.keep_alive, start_barrier, result_queue, shard_stop),
+                daemon=True
+            )
+            worker.start()
+            workers.append(worker)
+
+        shard_results = self._collect_results(workers, result_queue, shard_stop)
+        for worker in workers:
+            worker.join()
+
+        errors = [error for _, stats, error in shard_results if error]
+        if errors:
+            raise RuntimeError(f"压测子进程执行失败: {'; '.join(errors)}")
+
+        for _, stats, _ in shard_results:
+            self.merge_stats(stats)
+        # 完整统计已合并，之后的进度直接读取合并后的统计
+        self.remote_progress = {}
+
+        start_time = min(stats['start_time'] for _, stats, _ in shard_results)
+        end_time = max(stats['end_time'] for _, stats, _ in shard_results)
+        return end_time - start_time
+
+    def _collect_results(self, workers, result_queue, shard_stop):
+        """等待所有分片返回结果，期间记录各分片上报的实时进度并转发取消信号，子进程异常退出时不会一直阻塞"""
+        results = []
+        while len(results) < len(workers):
+            if self.stop_event.is_set() and not shard_stop.is_set():
+                shard_stop.set()
+            try:
+                kind, *message = result_queue.get(timeout=1)
+                if kind == 'progress':
+                    shard_index, progress = message
+                    self.remote_progress[shard_index] = progress
+                else:
+                    results.append(tuple(message))
+            except queue.Empty:
+                dead = [w for w in workers if not w.is_alive() and w.exitcode != 0]
+                if dead:
+                    raise RuntimeError(f"压测子进程异常退出，退出码: {[w.exitcode for w in dead]}")
+        return results
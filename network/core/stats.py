@@ -0,0 +1,405 @@
+import threading
+
+# 每个 2 的幂区间划分为 64 个线性子桶，相对误差不超过 1/64
+SUB_BUCKET_BITS = 7
+SUB_BUCKET_COUNT = 1 << SUB_BUCKET_BITS
+# 可记录的最大延迟：1 小时（微秒），超过的值按最大值记录
+MAX_TRACKABLE_US = 3600 * 1000 * 1000
+
+# 结果中输出的分位数
+PERCENTILES = [
+    (50, 'P50'),
+    (90, 'P90'),
+    (95, 'P95'),
+    (99, 'P99'),
+    (99.9, 'P99.9'),
+]
+# 按秒时间序列中输出的分位数
+TIMELINE_PERCENTILES = ('P50', 'P95', 'P99')
+# 请求分阶段耗时输出的分位数
+PHASE_PERCENTILES = ('P50', 'P95', 'P99')
+
+# 按载荷大小分组统计延迟的区间：(上限字节数, 标签)，上限为 None 表示不封顶
+SIZE_CLASSES = [
+    (1024, '<1KB'),
+    (10 * 1024, '1KB-10KB'),
+    (100 * 1024, '10KB-100KB'),
+    (1024 * 1024, '100KB-1MB'),
+    (None, '>=1MB'),
+]
+
+def size_class(nbytes):
+    """载荷大小对应的区间标签"""
+    for limit, label in SIZE_CLASSES:
+        if limit is None or nbytes < limit:
+            return label
+
+def bucket_index(value):
+    """微秒值对应的桶下标"""
+    if value < SUB_BUCKET_COUNT:
+        return value
+    shift = value.bit_length() - SUB_BUCKET_BITS
+    return (shift << (SUB_BUCKET_BITS - 1)) + (value >> shift)
+
+def bucket_bounds(index):
+    """桶下标对应的微秒区间 [lower, upper]"""
+    if index < SUB_BUCKET_COUNT:
+        return index, index
+    shift = (index >> (SUB_BUCKET_BITS - 1)) - 1
+    mantissa = index - (shift << (SUB_BUCKET_BITS - 1))
+    return mantissa << shift, ((mantissa + 1) << shift) - 1
+
+# 热力图纵轴每个 2 的幂区间划分的格数，比统计直方图粗，控制输出行数
+HEATMAP_SUB_BUCKET_BITS = 3
+
+def heatmap_lower_bound(index):
+    """桶下标对应的热力图格下限（微秒）"""
+    lower, _ = bucket_bounds(index)
+    shift = max(0, lower.bit_length() - HEATMAP_SUB_BUCKET_BITS - 1)
+    return (lower >> shift) << shift
+
+class LatencyHistogram:
+    """HDR 风格的对数线性延迟直方图
+
+    以微秒为单位按对数线性分桶计数，只保存非空桶，桶总数有固定上限，
+    无论记录多少请求内存都保持不变。直方图之间可以直接相加合并。
+    """
+
+    def __init__(self):
+        self.counts = {}
+        self.total_count = 0
+        self.total_us = 0
+        self.min_us = None
+        self.max_us = 0
+
+    def record(self, seconds):
+        self.record_us(int(seconds * 1000000))
+
+    def record_us(self, value):
+        value = min(max(value, 0), MAX_TRACKABLE_US)
+        index = bucket_index(value)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.total_count += 1
+        self.total_us += value
+        if self.min_us is None or value < self.min_us:
+            self.min_us = value
+        if value > self.max_us:
+            self.max_us = value
+
+    def merge(self, other):
+        for index, count in other.counts.copy().items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.total_count += other.total_count
+        self.total_us += other.total_us
+        if other.min_us is not None and (self.min_us is None or other.min_us < self.min_us):
+            self.min_us = other.min_us
+        self.max_us = max(self.max_us, other.max_us)
+
+    def percentile(self, percent):
+        """返回分位数（秒），取所在桶的中间值"""
+        if self.total_count == 0:
+            return 0
+        target = max(1, int(self.total_count * percent / 100 + 0.5))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= target:
+                lower, upper = bucket_bounds(index)
+                value = min(max((lower + upper) / 2, self.min_us), self.max_us)
+                return value / 1000000
+        return self.max_us / 1000000
+
+    def percentiles(self):
+        """返回 {标签: 秒} 形式的全部分位数"""
+        return {label: self.percentile(percent) for percent, label in PERCENTILES}
+
+    @property
+    def mean(self):
+        return self.total_us / self.total_count / 1000000 if self.total_count else 0
+
+    @property
+    def min(self):
+        return self.min_us / 1000000 if self.min_us is not None else 0
+
+    @property
+    def max(self):
+        return self.max_us / 1000000
+
+    def bucket_rows(self):
+        """按延迟从小到大输出非空桶，用于绘制分布曲线"""
+        rows = []
+        for index in sorted(self.counts):
+            lower, upper = bucket_bounds(index)
+            rows.append({'延迟下限(微秒)': lower, '延迟上限(微秒)': upper, '请求数': self.counts[index]})
+        return rows
+
+    def to_dict(self):
+        return {
+            'counts': {str(index): count for index, count in self.counts.items()},
+            'total_count': self.total_count,
+            'total_us': self.total_us,
+            'min_us': self.min_us,
+            'max_us': self.max_us
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        histogram = cls()
+        histogram.counts = {int(index): count for index, count in data['counts'].items()}
+        histogram.total_count = data['total_count']
+        histogram.total_us = data['total_us']
+        histogram.min_us = data['min_us']
+        histogram.max_us = data['max_us']
+        return histogram
+
+class TimelineBucket:
+    """一秒内完成的请求统计"""
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.histogram = LatencyHistogram()
+
+    def merge(self, other):
+        self.requests += other.requests
+        self.errors += other.errors
+        self.histogram.merge(other.histogram)
+
+    def to_dict(self):
+        return {
+            'requests': self.requests,
+            'errors': self.errors,
+            'histogram': self.histogram.to_dict()
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        bucket = cls()
+        bucket.requests = data['requests']
+        bucket.errors = data['errors']
+        bucket.histogram = LatencyHistogram.from_dict(data['histogram'])
+        return bucket
+
+def merge_timeline(target, source):
+    """把 source 的按秒统计合并到 target（键为 Unix 时间戳秒）"""
+    for second, bucket in list(source.items()):
+        if second in target:
+            target[second].merge(bucket)
+        else:
+            merged = TimelineBucket()
+            merged.merge(bucket)
+            target[second] = merged
+
+class StatsShard:
+    """一个线程独占的统计分片"""
+
+    def __init__(self):
+        self.histogram = LatencyHistogram()
+        self.success_count = 0
+        self.failure_count = 0
+        self.suppressed_logs = 0
+        # 开启分阶段计时时每个阶段一个直方图
+        self.phases = {}
+        # 语料模式下按载荷大小区间分组的统计
+        self.payload_sizes = {}
+        # 按完成时间（Unix 时间戳秒）分桶的统计，跨进程/节点合并时天然对齐
+        self.timeline = {}
+
+    def merge(self, other):
+        self.histogram.merge(other.histogram)
+        self.success_count += other.success_count
+        self.failure_count += other.failure_count
+        self.suppressed_logs += other.suppressed_logs
+        for name, histogram in list(other.phases.items()):
+            self.phase_histogram(name).merge(histogram)
+        for label, bucket in list(other.payload_sizes.items()):
+            self.payload_size_bucket(label).merge(bucket)
+        merge_timeline(self.timeline, other.timeline)
+
+    def phase_histogram(self, name):
+        histogram = self.phases.get(name)
+        if histogram is None:
+            histogram = self.phases[name] = LatencyHistogram()
+        return histogram
+
+    def payload_size_bucket(self, label):
+        bucket = self.payload_sizes.get(label)
+        if bucket is None:
+            bucket = self.payload_sizes[label] = TimelineBucket()
+        return bucket
+
+    def phase_percentiles(self):
+        """返回 {阶段: {标签: 秒}} 形式的分阶段分位数"""
+        return {
+            name: {label: histogram.percentile(percent) for percent, label in PERCENTILES if label in PHASE_PERCENTILES}
+            for name, histogram in self.phases.items()
+        }
+
+    def timeline_rows(self):
+        """按秒输出时间序列，中间没有请求的秒补零"""
+        if not self.timeline:
+            return []
+        first, last = min(self.timeline), max(self.timeline)
+        rows = []
+        for second in range(first, last + 1):
+            bucket = self.timeline.get(second) or TimelineBucket()
+            row = {
+                '时间戳': second,
+                '秒': second - first,
+                '请求数': bucket.requests,
+                '错误数': bucket.errors,
+            }
+            for percent, label in PERCENTILES:
+                if label in TIMELINE_PERCENTILES:
+                    row[f'{label}响应时间(秒)'] = round(bucket.histogram.percentile(percent), 6)
+            rows.append(row)
+        return rows
+
+    def heatmap_rows(self):
+        """按秒和延迟格输出请求数，只输出非空格"""
+        rows = []
+        for second in sorted(self.timeline):
+            cells = {}
+            for index, count in self.timeline[second].histogram.counts.items():
+                lower = heatmap_lower_bound(index)
+                cells[lower] = cells.get(lower, 0) + count
+            for lower in sorted(cells):
+                rows.append({'时间戳': second, '延迟下限(微秒)': lower, '请求数': cells[lower]})
+        return rows
+
+    def payload_size_rows(self):
+        """按载荷大小区间输出统计"""
+        rows = []
+        for _, label in SIZE_CLASSES:
+            bucket = self.payload_sizes.get(label)
+            if bucket is None:
+                continue
+            row = {
+                '载荷大小': label,
+                '请求数': bucket.requests,
+                '错误数': bucket.errors,
+                '平均响应时间(秒)': round(bucket.histogram.mean, 6),
+            }
+            for percent, percentile_label in PERCENTILES:
+                if percentile_label in TIMELINE_PERCENTILES:
+                    row[f'{percentile_label}响应时间(秒)'] = round(bucket.histogram.percentile(percent), 6)
+            rows.append(row)
+        return rows
+
+    def to_dict(self):
+        return {
+            'histogram': self.histogram.to_dict(),
+            'success_count': self.success_count,
+            'failure_count': self.failure_count,
+            'suppressed_logs': self.suppressed_logs,
+            'phases': {name: histogram.to_dict() for name, histogram in self.phases.items()},
+            'payload_sizes': {label: bucket.to_dict() for label, bucket in self.payload_sizes.items()},
+            'timeline': {str(second): bucket.to_dict() for second, bucket in self.timeline.items()}
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        shard = cls()
+        shard.histogram = LatencyHistogram.from_dict(data['histogram'])
+        shard.success_count = data['success_count']
+        shard.failure_count = data['failure_count']
+        shard.suppressed_logs = data.get('suppressed_logs', 0)
+        shard.phases = {
+            name: LatencyHistogram.from_dict(histogram)
+            for name, histogram in data.get('phases', {}).items()
+        }
+        shard.payload_sizes = {
+            label: TimelineBucket.from_dict(bucket)
+            for label, bucket in data.get('payload_sizes', {}).items()
+        }
+        shard.timeline = {
+            int(second): TimelineBucket.from_dict(bucket)
+            for second, bucket in data.get('timeline', {}).items()
+        }
+        return shard
+
+class ShardedStats:
+    """按线程分片的压测统计
+
+    每个线程第一次记录时分配自己的分片，之后的记录只写本线程分片，热路径无需加锁；
+    读取时把所有分片合并成一个快照。分片只保留当前一秒的时间序列桶，
+    进入下一秒时才加锁把上一秒并入共享的时间序列，时间序列内存只与运行时长有关。
+    """
+
+    def __init__(self):
+        self._shards = []
+        self._timeline = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def shard(self):
+        """当前线程的分片"""
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = StatsShard()
+            with self._lock:
+                self._shards.append(shard)
+            self._local.shard = shard
+        return shard
+
+    def record(self, response_time, success, timestamp, phases=None, payload_size=None):
+        """记录一次收到响应的请求，timestamp 为完成时间（Unix 时间戳），
+        phases 为可选的 {阶段: 秒} 分阶段耗时，payload_size 为可选的载荷大小区间"""
+        shard = self.shard()
+        shard.histogram.record(response_time)
+        if phases:
+            for name, seconds in phases.items():
+                shard.phase_histogram(name).record(seconds)
+        if payload_size:
+            bucket = shard.payload_size_bucket(payload_size)
+            bucket.requests += 1
+            bucket.histogram.record(response_time)
+            if not success:
+                bucket.errors += 1
+        if success:
+            shard.success_count += 1
+        else:
+            shard.failure_count += 1
+        bucket = self._timeline_bucket(shard, timestamp)
+        bucket.requests += 1
+        bucket.histogram.record(response_time)
+        if not success:
+            bucket.errors += 1
+
+    def record_failure(self, timestamp, payload_size=None):
+        """记录未收到响应的失败请求（不计入响应时间）"""
+        shard = self.shard()
+        shard.failure_count += 1
+        if payload_size:
+            bucket = shard.payload_size_bucket(payload_size)
+            bucket.requests += 1
+            bucket.errors += 1
+        bucket = self._timeline_bucket(shard, timestamp)
+        bucket.requests += 1
+        bucket.errors += 1
+
+    def _timeline_bucket(self, shard, timestamp):
+        second = int(timestamp)
+        bucket = shard.timeline.get(second)
+        if bucket is None:
+            if shard.timeline:
+                # 进入新的一秒，把分片中已结束的桶并入共享时间序列
+                with self._lock:
+                    merge_timeline(self._timeline, shard.timeline)
+                    shard.timeline = {}
+            bucket = shard.timeline[second] = TimelineBucket()
+        return bucket
+
+    def add_shard(self, shard):
+        """加入外部（其他进程或节点）汇总来的分片"""
+        with self._lock:
+            self._shards.append(shard)
+
+    def snapshot(self):
+        """合并所有分片，返回一个新的 StatsShard"""
+        merged = StatsShard()
+        with self._lock:
+            for shard in self._shards:
+                merged.merge(shard)
+            merge_timeline(merged.timeline, self._timeline)
+        return merged
@@ -0,0 +1,128 @@
+import copy
+import itertools
+import json
+import random
+import string
+import threading
+import time
+import uuid
+
+# 未配置 template_fields 时的默认动态字段，与原来每个请求生成 bizno 的行为一致
+DEFAULT_TEMPLATE_FIELDS = {'bizno': 'bizno'}
+
+# 与 requests 的 json= 参数相同的序列化方式
+def _dumps(value):
+    return json.dumps(value, allow_nan=False)
+
+class BiznoGenerator:
+    """业务编号：BIZ + 时间戳 + 6 位随机字符，时间戳部分每秒只格式化一次"""
+
+    def __init__(self):
+        self._second = None
+        self._prefix = None
+
+    def __call__(self):
+        now = int(time.time())
+        if now != self._second:
+            # 多线程同时刷新时各自写入同一秒的前缀，结果一致，无需加锁
+            self._prefix = 'BIZ' + time.strftime('%Y%m%d%H%M%S', time.localtime(now))
+            self._second = now
+        suffix = ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
+        return f'"{self._prefix}{suffix}"'
+
+class CounterGenerator:
+    """自增整数，多线程下不重复"""
+
+    def __init__(self, start=0):
+        self._counter = itertools.count(start)
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            return str(next(self._counter))
+
+class ChoiceGenerator:
+    """从候选值中随机选取，候选值预先序列化"""
+
+    def __init__(self, values):
+        if not values:
+            raise ValueError("choice 字段的候选值不能为空")
+        self._encoded = [_dumps(value) for value in values]
+
+    def __call__(self):
+        return random.choice(self._encoded)
+
+def create_generator(spec):
+    """根据字段配置创建生成器，生成器返回已序列化的 JSON 值
+
+    - "bizno": 业务编号
+    - "uuid": 随机 UUID
+    - "counter" 或 {"counter": 起始值}: 自增整数
+    - {"choice": [...]}: 从列表中随机选取
+    - "timestamp" / "timestamp_ms": 当前 Unix 时间戳（秒 / 毫秒）
+    """
+    if isinstance(spec, dict):
+        if 'choice' in spec:
+            return ChoiceGenerator(spec['choice'])
+        if 'counter' in spec:
+            return CounterGenerator(int(spec['counter']))
+    elif spec == 'bizno':
+        return BiznoGenerator()
+    elif spec == 'uuid':
+        return lambda: f'"{uuid.uuid4()}"'
+    elif spec == 'counter':
+        return CounterGenerator()
+    elif spec == 'timestamp':
+        return lambda: str(int(time.time()))
+    elif spec == 'timestamp_ms':
+        return lambda: str(int(time.time() * 1000))
+    raise ValueError(f"不支持的模板字段类型: {spec}")
+
+def _set_path(body, path, value):
+    """按 a.b.0 形式的路径设置字段，列表用数字下标"""
+    keys = path.split('.')
+    target = body
+    for key in keys[:-1]:
+        target = target[int(key)] if isinstance(target, list) else target.setdefault(key, {})
+    last = keys[-1]
+    if isinstance(target, list):
+        target[int(last)] = value
+    else:
+        target[last] = value
+
+class RequestTemplate:
+    """预编译的 JSON 请求体模板
+
+    编译时把动态字段替换为占位符并整体序列化一次，按占位符切分成静态字节片段；
+    每个请求只生成动态字段的值并与静态片段拼接，不再复制和序列化整个请求体。
+    """
+
+    def __init__(self, body, fields=None):
+        self.fields = dict(DEFAULT_TEMPLATE_FIELDS if fields is None else fields)
+
+        template = copy.deepcopy(body) if body is not None else {}
+        token = uuid.uuid4().hex
+        placeholders = {}
+        for i, path in enumerate(self.fields):
+            placeholder = f'__template_{token}_{i}__'
+            _set_path(template, path, placeholder)
+            placeholders[path] = _dumps(placeholder)
+
+        serialized = _dumps(template)
+        # 按占位符在序列化结果中出现的顺序切分
+        self.paths = sorted(self.fields, key=lambda path: serialized.index(placeholders[path]))
+        self.generators = [create_generator(self.fields[path]) for path in self.paths]
+        self.parts = []
+        for path in self.paths:
+            before, _, serialized = serialized.partition(placeholders[path])
+            self.parts.append(before.encode('utf-8'))
+        self.parts.append(serialized.encode('utf-8'))
+
+    def render(self):
+        """生成一个请求体，返回 (请求体字节, {字段: 序列化后的值})"""
+        values = [generator() for generator in self.generators]
+        chunks = [self.parts[0]]
+        for value, part in zip(values, self.parts[1:]):
+            chunks.append(value.encode('utf-8'))
+            chunks.append(part)
+        return b''.join(chunks), dict(zip(self.paths, values))
@@ -0,0 +1,97 @@
+import socket
+import threading
+import time
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+# 请求阶段：(键, 结果列名前缀)
+PHASES = [
+    ('dns', 'DNS'),
+    ('connect', 'TCP连接'),
+    ('tls', 'TLS握手'),
+    ('ttfb', '首字节'),
+    ('body', '响应体'),
+]
+
+_local = threading.local()
+
+def start_phase_timing():
+    """开始记录当前线程下一次请求的建连阶段耗时（纳秒）"""
+    phases = {'dns': 0, 'connect': 0, 'tls': 0}
+    _local.phases = phases
+    return phases
+
+def finish_phase_timing(phases, start_ns, headers_ns, end_ns):
+    """结束记录，返回各阶段耗时（秒）
+
+    复用已有连接时 DNS/TCP/TLS 为 0；首字节时间为发出请求到收到响应头的时间
+    减去建连耗时，响应体时间为读取响应体的时间。
+    """
+    _local.phases = None
+    setup = phases['dns'] + phases['connect'] + phases['tls']
+    phases['ttfb'] = max(0, headers_ns - start_ns - setup)
+    phases['body'] = end_ns - headers_ns
+    return {name: value / 1e9 for name, value in phases.items()}
+
+class TimedConnectionMixin:
+    """记录 DNS 解析、TCP 连接和 TLS 握手耗时的 urllib3 连接
+
+    只在当前线程开启了分阶段计时时生效：先单独解析域名并计时，再连接解析出的地址。
+    未开启时与 urllib3 默认行为完全一致。
+    """
+
+    def _new_conn(self):
+        phases = getattr(_local, 'phases', None)
+        if phases is None:
+            return super()._new_conn()
+
+        host = self._dns_host
+        start = time.perf_counter_ns()
+        try:
+            address = socket.getaddrinfo(host, self.port, 0, socket.SOCK_STREAM)[0][4][0]
+        except OSError:
+            # 解析失败时交给 urllib3 重新解析并抛出它的异常
+            address = host
+        resolved = time.perf_counter_ns()
+        self._dns_host = address
+        try:
+            sock = super()._new_conn()
+        finally:
+            self._dns_host = host
+        phases['dns'] += resolved - start
+        phases['connect'] += time.perf_counter_ns() - resolved
+        return sock
+
+class TimedHTTPConnection(TimedConnectionMixin, HTTPConnection):
+    pass
+
+class TimedHTTPSConnection(TimedConnectionMixin, HTTPSConnection):
+
+    def connect(self):
+        phases = getattr(_local, 'phases', None)
+        if phases is None:
+            return super().connect()
+
+        before = phases['dns'] + phases['connect']
+        start = time.perf_counter_ns()
+        super().connect()
+        elapsed = time.perf_counter_ns() - start
+        # connect 中除 _new_conn 以外的时间都是 TLS 握手
+        phases['tls'] += max(0, elapsed - (phases['dns'] + phases['connect'] - before))
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+class TimedHTTPAdapter(HTTPAdapter):
+    """使用可分阶段计时连接的 requests 适配器"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': TimedHTTPConnectionPool,
+            'https': TimedHTTPSConnectionPool
+        }
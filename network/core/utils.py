@@ -1,36 +1,202 @@
 import os
 import io
+import mmap
+import hashlib
+import threading
+from collections import OrderedDict
 import cv2
+import numpy as np
+import requests
+from core.timing import TimedHTTPAdapter
 from loguru import logger
 
 class ImageCache:
+    """图片数据缓存
+
+    默认原样发送图片文件：文件以只读 mmap 映射，返回指向映射的 memoryview，
+    发送时不再复制。encode 指定格式（如 "png"、"jpg"）时才用 cv2 解码并重新编码。
+    缓存按文件内容的 sha256 索引，同一图片重复上传只占一份内存；
+    映射期间文件不能被原地改写（Web 界面按内容哈希保存上传文件并原子重命名），
+    替换文件应写新文件后重命名，已映射的旧数据不受影响。
+    总大小超过 max_bytes 时按 LRU 淘汰，仍在使用的数据在引用释放后回收。
+    """
+    DEFAULT_MAX_BYTES = 512 * 1024 * 1024
     _instance = None
-    _cache = {}
     
     @classmethod
-    def get_instance(cls):
+    def get_instance(cls, max_bytes=None):
         if cls._instance is None:
             cls._instance = cls()
+        if max_bytes is not None:
+            cls._instance.set_max_bytes(max_bytes)
         return cls._instance
     
-    def get_image_data(self, image_path):
-        if image_path not in self._cache:
-            try:
-                rgb_img = cv2.imread(image_path)
-                if rgb_img is None:
-                    raise ValueError(f"无法读取图片: {image_path}")
-                self._cache[image_path] = self._cv2bytes(rgb_img)
-            except Exception as e:
-                logger.error(f"加载图片失败: {str(e)}")
-                raise
-        return self._cache[image_path]
-    
-    def _cv2bytes(self, im):
-        return io.BytesIO(cv2.imencode('.png', im)[1]).getvalue()
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        # (内容哈希, 编码格式) -> 图片数据
+        self._cache = OrderedDict()
+        # (路径, inode, 修改时间, 大小) -> 内容哈希，文件未变化时不必重新计算哈希
+        self._hashes = {}
+        # 原样发送的缓存项 -> 被映射文件的 (路径, inode, 修改时间, 大小)
+        self._sources = {}
+        self._lock = threading.Lock()
+    
+    def set_max_bytes(self, max_bytes):
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+    
+    def get_image_data(self, image_path, encode=None):
+        try:
+            with open(image_path, 'rb') as f:
+                stat = os.fstat(f.fileno())
+                if stat.st_size == 0:
+                    raise ValueError(f"图片文件为空: {image_path}")
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            
+            file_key = (os.path.abspath(image_path), stat.st_ino, stat.st_mtime_ns, stat.st_size)
+            with self._lock:
+                digest = self._hashes.get(file_key)
+            if digest is None:
+                digest = hashlib.sha256(mapped).hexdigest()
+            
+            key = (digest, encode)
+            with self._lock:
+                self._hashes[file_key] = digest
+                data = self._cache.get(key)
+                if data is not None and self._source_changed(key):
+                    # 被映射的文件已被原地改写，旧映射的内容不再可靠
+                    self._remove(key)
+                    data = None
+                if data is not None:
+                    self._cache.move_to_end(key)
+                    return data
+            
+            if encode:
+                data = self._encode(mapped, encode, image_path)
+            else:
+                data = memoryview(mapped)
+            with self._lock:
+                # 并发加载同一图片时以先放入缓存的为准
+                cached = self._cache.get(key)
+                if cached is not None:
+                    return cached
+                self._cache[key] = data
+                if not encode:
+                    self._sources[key] = file_key
+                self.total_bytes += data.nbytes if isinstance(data, memoryview) else len(data)
+                self._evict(keep=key)
+            return data
+        except Exception as e:
+            logger.error(f"加载图片失败: {str(e)}")
+            raise
+    
+    def _evict(self, keep=None):
+        """超出容量时淘汰最久未使用的图片，至少保留刚加入的一张"""
+        while self.total_bytes > self.max_bytes and len(self._cache) > 1:
+            key = next(iter(self._cache))
+            if key == keep:
+                break
+            self._remove(key)
+
+    def _remove(self, key):
+        data = self._cache.pop(key)
+        self._sources.pop(key, None)
+        self.total_bytes -= data.nbytes if isinstance(data, memoryview) else len(data)
+        self._hashes = {file_key: digest for file_key, digest in self._hashes.items() if digest != key[0]}
+
+    def _source_changed(self, key):
+        """原样发送的缓存项所映射的文件是否已被修改或删除"""
+        source = self._sources.get(key)
+        if source is None:
+            return False
+        try:
+            stat = os.stat(source[0])
+        except OSError:
+            # 文件被删除或改名不影响已建立的映射
+            return False
+        # 改名替换（inode 不同）不影响旧映射，只有原地改写同一个 inode 才会失效
+        return stat.st_ino == source[1] and (stat.st_mtime_ns, stat.st_size) != source[2:]
+    
+    def _encode(self, mapped, encode, image_path):
+        """用 cv2 解码后重新编码为指定格式"""
+        rgb_img = cv2.imdecode(np.frombuffer(mapped, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if rgb_img is None:
+            raise ValueError(f"无法读取图片: {image_path}")
+        return self._cv2bytes(rgb_img, encode)
+    
+    def _cv2bytes(self, im, encode='png'):
+        return io.BytesIO(cv2.imencode(f'.{encode.lstrip(".")}', im)[1]).getvalue()
+
+class ConnectionPool:
+    """持久 HTTP 会话池
+
+    每个工作线程独占一个 requests.Session（一条 keep-alive 连接），池中最多保留
+    num_threads 个会话。同一服务的不同并发度共用一个池，测试结束后会话归还池中，
+    下一个并发度直接复用已建立的连接。keep_alive=False 时每个请求都新建连接。
+    """
+
+    def __init__(self, keep_alive=True):
+        self.keep_alive = keep_alive
+        self.max_size = 0
+        self._idle = []
+        self._leased = []
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def resize(self, num_threads):
+        """按并发线程数调整池容量"""
+        with self._lock:
+            self.max_size = max(self.max_size, num_threads)
+
+    def get_session(self):
+        """获取当前线程独占的会话"""
+        lease = getattr(self._local, 'lease', None)
+        if lease is not None and lease[0] == self._generation:
+            return lease[1]
+        with self._lock:
+            session = self._idle.pop() if self._idle else self._create_session()
+            self._leased.append(session)
+            self._local.lease = (self._generation, session)
+        return session
+
+    def post(self, url, **kwargs):
+        if not self.keep_alive:
+            # 每个请求新建会话和连接，用于测量建连开销
+            with self._create_session() as session:
+                return session.post(url, **kwargs)
+        return self.get_session().post(url, **kwargs)
+
+    def release_all(self):
+        """回收所有线程占用的会话，供下一轮测试复用"""
+        with self._lock:
+            self._idle.extend(self._leased)
+            self._leased = []
+            self._generation += 1
+            while len(self._idle) > self.max_size:
+                self._idle.pop(0).close()
+
+    def close(self):
+        with self._lock:
+            for session in self._idle + self._leased:
+                session.close()
+            self._idle = []
+            self._leased = []
+            self._generation += 1
+
+    def _create_session(self):
+        session = requests.Session()
+        # 会话只被一个线程使用，一条连接即可；连接支持分阶段计时
+        adapter = TimedHTTPAdapter(pool_connections=1, pool_maxsize=1)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
 
 def ensure_directories():
     base_dir = os.path.dirname(os.path.dirname(__file__))
-    directories = ['results', 'uploads']
+    directories = ['results', 'uploads', 'history']
     
     for dir_name in directories:
         dir_path = os.path.join(base_dir, dir_name)
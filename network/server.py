@@ -1,7 +1,9 @@
-from flask import Flask, render_template, request, jsonify, send_file, send_from_directory, session, redirect
+from flask import Flask, render_template, request, jsonify, send_file, send_from_directory, session, redirect, Response
 import os
+import hashlib
+import tempfile
 from werkzeug.utils import secure_filename
-from core.load_tester import LoadTester, save_comparison_results_to_csv, analyze_results
+from core.load_tester import LoadTester, create_load_tester, save_comparison_results_to_csv, check_arrival_rates
 import json
 import threading
 from loguru import logger
@@ -10,11 +12,32 @@ import time
 import asyncio
 import aiohttp
 from core.session_manager import SessionManager
+from core.utils import ConnectionPool
+from core.corpus import resolve_corpus_path
+from core.profile import run_profile
+from core.capacity import run_capacity_search
+from core.parallel import run_services_parallel
+from core.cooldown import Cooldown
+from core.request_log import configure_logging
+from core.job_manager import JobManager, JobQueueFull, JobCancelled
+from core.chart_renderer import ChartRenderer, CHARTS_DIR
+from core.run_store import RunStore, resolve_baseline
 from core import ensure_directories
 import requests  # 确保导入requests库
+import argparse
 
 # 创建会话管理器实例
 session_manager = SessionManager()
+# 图表在独立进程池中渲染，按输入数据缓存
+chart_renderer = ChartRenderer()
+# 运行历史，服务重启后保留
+run_store = RunStore()
+
+# 实时进度推送间隔（秒）
+PROGRESS_INTERVAL = 1
+# 同时运行的压测任务数和最多等待的任务数
+MAX_RUNNING_JOBS = 1
+MAX_QUEUED_JOBS = 8
 
 # 设置正确的模板和静态文件路径
 app = Flask(__name__,
@@ -27,6 +50,9 @@ app.secret_key = os.urandom(24)
 # 设置上传文件夹路径
 app.config['UPLOAD_FOLDER'] = os.path.join(os.path.dirname(__file__), 'uploads')
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+# Web 界面只能使用这个目录下的语料，避免客户端指定服务端任意文件作为载荷发送出去
+app.config['CORPUS_FOLDER'] = os.path.join(app.config['UPLOAD_FOLDER'], 'corpus')
+os.makedirs(app.config['CORPUS_FOLDER'], exist_ok=True)
 
 @app.before_request
 def check_session():
@@ -39,14 +65,24 @@ def check_session():
 def index():
     return render_template('index.html')
 
+# 结果文件的根目录，会话目录及其中的图表都在其下
+RESULTS_ROOT = os.path.join(os.path.dirname(__file__), 'results')
+
+def results_url(path):
+    """结果目录下文件的访问地址"""
+    return '/results/' + os.path.relpath(path, RESULTS_ROOT).replace(os.sep, '/')
+
 @app.route('/results/<path:filename>')
 def serve_results(filename):
-    results_dir = os.path.join(os.path.dirname(__file__), 'results')  # 修改为正确的结果目录路径
-    logger.info(f"Serving results file: {filename} from {results_dir}")
+    logger.info(f"Serving results file: {filename} from {RESULTS_ROOT}")
     try:
-        response = send_from_directory(results_dir, filename)
-        # 设置正确的 MIME 类型和字符编码
-        response.headers['Content-Type'] = 'image/png; charset=utf-8'
+        # 按扩展名确定 MIME 类型，并支持 ETag/Last-Modified 条件请求
+        response = send_from_directory(RESULTS_ROOT, filename)
+        if f'/{CHARTS_DIR}/' in f'/{filename}':
+            # 图表目录按输入数据哈希命名，内容不会变化
+            response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+        else:
+            response.headers['Cache-Control'] = 'no-cache'
         return response
     except Exception as e:
         logger.error(f"Error serving file {filename}: {str(e)}")
@@ -60,14 +96,15 @@ def download_errors():
         if not test_session:
             return jsonify({'error': '会话已过期'}), 401
         
-        error_files = session.get('error_files', [])
+        error_files = test_session.error_files
         if not error_files:
             return jsonify({'error': '没有错误记录文件'}), 404
         
+        # 错误文件是按类型聚合的汇总，样本在汇总中记录的 JSONL 文件中
         # 如果有多个错误文件，创建一个压缩文件
         if len(error_files) > 1:
             import zipfile
-            zip_filename = f"error_records_{int(time.time())}.zip"
+            zip_filename = f"error_summary_{int(time.time())}.zip"
             zip_filepath = os.path.join(test_session.results_dir, zip_filename)
             
             with zipfile.ZipFile(zip_filepath, 'w') as zipf:
@@ -100,67 +137,241 @@ def download_errors():
         logger.error(f"下载错误记录失败: {str(e)}")
         return jsonify({'error': '下载错误记录失败'}), 500
     
-@app.route('/api/test', methods=['POST'])
-def run_test():
+def save_upload(file):
+    """按内容哈希保存上传的文件，返回保存路径
+
+    先写入临时文件再原子重命名，已有文件不会被原地改写：图片缓存按只读 mmap 引用
+    上传的文件，原地截断重写会使正在使用的映射失效（SIGBUS）或与缓存的哈希不符。
+    """
+    extension = os.path.splitext(secure_filename(file.filename))[1]
+    fd, temp_path = tempfile.mkstemp(dir=app.config['UPLOAD_FOLDER'], suffix='.tmp')
     try:
-        session_id = session.get('test_session_id')
-        test_session = session_manager.get_session(session_id)
-        if not test_session:
-            return jsonify({'error': '会话已过期'}), 401
-        
-        # 从 FormData 中获取配置
-        if 'config' not in request.form:
-            return jsonify({'error': '缺少配置信息'}), 400
-            
-        config = json.loads(request.form['config'])
-        # 添加会话信息到配置中
-        config['session_dir'] = test_session.results_dir
+        digest = hashlib.sha256()
+        with os.fdopen(fd, 'wb') as f:
+            for chunk in iter(lambda: file.stream.read(1024 * 1024), b''):
+                digest.update(chunk)
+                f.write(chunk)
+        filepath = os.path.join(app.config['UPLOAD_FOLDER'], digest.hexdigest() + extension)
+        os.replace(temp_path, filepath)
+    except Exception:
+        os.remove(temp_path)
+        raise
+    return filepath
+
+def prepare_test_config(test_session):
+    """解析前端提交的配置，保存上传的图片并验证每个服务可用
+
+    返回 (config, None)，校验失败时返回 (None, 错误响应)
+    """
+    # 从 FormData 中获取配置
+    if 'config' not in request.form:
+        return None, (jsonify({'error': '缺少配置信息'}), 400)
         
-        # 基本验证
-        if not config.get('services'):
-            return jsonify({'error': '没有配置服务'}), 400
+    config = json.loads(request.form['config'])
+    # 启动时指定了压测节点且页面配置未指定时，使用分布式模式
+    if app.config.get('AGENTS') and not config.get('agents'):
+        config['agents'] = app.config['AGENTS']
+    # 添加会话信息到配置中
+    config['session_dir'] = test_session.results_dir
+    
+    # 基本验证
+    if not config.get('services'):
+        return None, (jsonify({'error': '没有配置服务'}), 400)
+    try:
+        check_arrival_rates(config)
+    except ValueError as e:
+        return None, (jsonify({'error': str(e)}), 400)
 
-        # 处理上传的图片
-        for service in config['services']:
-            if service.get('request_type') == 'image' and service.get('image_path'):
-                # 获取对应的文件
-                file = request.files.get(service['image_path'])
-                if file:
-                    filename = secure_filename(file.filename)
-                    filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                    file.save(filepath)
-                    service['image_path'] = filepath
-                else:
-                    return jsonify({'error': f'未找到图片文件: {service["image_path"]}'}), 400
-
-        # 验证每个服务的可达性与可用性
-        for service in config['services']:
-            tester = LoadTester(
-                name=service['name'],
-                url=service['url'],
-                request_type=service.get('request_type', 'json'),
-                request_body=service.get('request_body'),
-                image_path=service.get('image_path'),
-                headers=service.get('headers'),                num_threads=1,  # 使用单线程进行验证
-                num_requests=1,  # 只发送一次请求进行验证
-                session_dir=config['session_dir']
-            )
-            response_status = tester.make_request()  # 调用make_request进行验证
-            if response_status is None or response_status != 200:
-                return jsonify({'error': f'无法访问服务: {service["name"]}，状态码: {response_status}'}), 666
+    # 语料路径只能指向语料目录下的文件或子目录
+    for service in config['services']:
+        if service.get('corpus'):
+            corpus = resolve_corpus_path(app.config['CORPUS_FOLDER'], service['corpus'])
+            if corpus is None:
+                return None, (jsonify({'error': f'无效的语料路径: {service["corpus"]}，语料需放在 uploads/corpus 目录下'}), 400)
+            service['corpus'] = corpus
+
+    # 处理上传的图片
+    for service in config['services']:
+        if service.get('request_type') == 'image' and service.get('image_path'):
+            # 获取对应的文件
+            file = request.files.get(service['image_path'])
+            if file:
+                service['image_path'] = save_upload(file)
+            else:
+                return None, (jsonify({'error': f'未找到图片文件: {service["image_path"]}'}), 400)
+
+    # 验证每个服务的可达性与可用性
+    for service in config['services']:
+        tester = LoadTester(
+            name=service['name'],
+            url=service['url'],
+            request_type=service.get('request_type', 'json'),
+            request_body=service.get('request_body'),
+            image_path=service.get('image_path'),
+            headers=service.get('headers'),
+            corpus=service.get('corpus'),
+            num_threads=1,  # 使用单线程进行验证
+            num_requests=1,  # 只发送一次请求进行验证
+            session_dir=config['session_dir']
+        )
+        response_status = tester.make_request()  # 调用make_request进行验证
+        tester.connection_pool.close()
+        if response_status is None or response_status != 200:
+            return None, (jsonify({'error': f'无法访问服务: {service["name"]}，状态码: {response_status}'}), 666)
+    
+    return config, None
+
+def get_current_test_session():
+    session_id = session.get('test_session_id')
+    return session_manager.get_session(session_id)
+
+def submit_test_job():
+    """校验配置并提交后台任务，返回 (job, None) 或 (None, 错误响应)"""
+    test_session = get_current_test_session()
+    if not test_session:
+        return None, (jsonify({'error': '会话已过期'}), 401)
+    
+    config, error_response = prepare_test_config(test_session)
+    if error_response:
+        return None, error_response
+    
+    try:
+        return job_manager.submit(test_session, config), None
+    except JobQueueFull as e:
+        return None, (jsonify({'error': str(e)}), 429)
+
+def get_session_job(job_id):
+    """获取当前会话提交的任务，其他会话的任务视为不存在"""
+    job = job_manager.get(job_id)
+    if not job or job.session_id != session.get('test_session_id'):
+        return None
+    return job
+
+def job_status(job):
+    status = job.to_dict()
+    if job.status == 'queued':
+        status['queue_position'] = job_manager.queue_position(job)
+    elif job.status == 'running':
+        status.update(job.progress.snapshot())
+    return status
+
+def format_sse(event, data):
+    """格式化一条 server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, separators=(',', ':'))}\n\n"
+
+def stream_job_events(job):
+    """以 server-sent events 推送任务进度
+
+    每 PROGRESS_INTERVAL 秒推送一次 progress 快照（无变化时只发心跳注释），
+    任务结束后推送 result、failed 或 cancelled 事件。
+    """
+    def generate():
+        last_status = None
+        while not job.finished:
+            job.done_event.wait(PROGRESS_INTERVAL)
+            status = job_status(job)
+            if status != last_status:
+                yield format_sse('progress', status)
+                last_status = status
+            else:
+                yield ': keep-alive\n\n'
+        if job.status == 'succeeded':
+            yield format_sse('result', job.result)
+        elif job.status == 'cancelled':
+            yield format_sse('cancelled', {'job_id': job.job_id})
+        else:
+            yield format_sse('failed', {'error': job.error})
+    
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'  # 禁止反向代理缓冲
+    })
+
+@app.route('/api/test', methods=['POST'])
+def run_test():
+    """提交测试并等待结果（兼容旧接口）"""
+    try:
+        job, error_response = submit_test_job()
+        if error_response:
+            return error_response
         
-        # 运行测试
-        results = run_load_tests(config)
-        return jsonify(results)
+        job.done_event.wait()
+        if job.status == 'succeeded':
+            return jsonify(job.result)
+        return jsonify({'error': job.error or '测试已取消'}), 500
     except Exception as e:
         traceback.print_exc()
         logger.error(f"测试执行失败: {str(e)}")
         return jsonify({'error': str(e)}), 500   
+
+@app.route('/api/test/stream', methods=['POST'])
+def run_test_stream():
+    """提交测试并在同一个连接上推送进度"""
+    try:
+        job, error_response = submit_test_job()
+        if error_response:
+            return error_response
+        return stream_job_events(job)
+    except Exception as e:
+        traceback.print_exc()
+        logger.error(f"测试执行失败: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/jobs', methods=['POST'])
+def create_job():
+    """提交后台测试任务，立即返回任务 ID"""
+    try:
+        job, error_response = submit_test_job()
+        if error_response:
+            return error_response
+        return jsonify(job_status(job)), 202
+    except Exception as e:
+        traceback.print_exc()
+        logger.error(f"提交测试任务失败: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/jobs/<job_id>')
+def get_job(job_id):
+    job = get_session_job(job_id)
+    if not job:
+        return jsonify({'error': '任务不存在'}), 404
+    return jsonify(job_status(job))
+
+@app.route('/api/jobs/<job_id>/events')
+def get_job_events(job_id):
+    job = get_session_job(job_id)
+    if not job:
+        return jsonify({'error': '任务不存在'}), 404
+    return stream_job_events(job)
+
+@app.route('/api/jobs/<job_id>/result')
+def get_job_result(job_id):
+    job = get_session_job(job_id)
+    if not job:
+        return jsonify({'error': '任务不存在'}), 404
+    if job.status == 'succeeded':
+        return jsonify(job.result)
+    if job.status == 'failed':
+        return jsonify({'error': job.error}), 500
+    if job.status == 'cancelled':
+        return jsonify({'error': '任务已取消'}), 410
+    return jsonify(job_status(job)), 409
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    job = get_session_job(job_id)
+    if not job:
+        return jsonify({'error': '任务不存在'}), 404
+    if not job_manager.cancel(job):
+        return jsonify({'error': '任务已结束'}), 409
+    return jsonify(job_status(job))
+
 @app.route('/api/download-results')
 def download_results():
     try:
         # 返回最新的测试结果文件
-        latest_file = get_latest_result_file()
+        test_session = get_current_test_session()
+        latest_file = get_latest_result_file(test_session.session_id if test_session else None)
         if latest_file:
             return send_file(latest_file, as_attachment=True)
         else:
@@ -169,54 +380,109 @@ def download_results():
         logger.error(f"下载结果文件失败: {str(e)}")
         return jsonify({'error': '下载结果文件失败'}), 500
 
-def run_load_tests(config):
+def run_load_tests(config, test_session, progress=None, cancel_event=None):
+    """执行全部服务和并发度的测试
+
+    progress 为 ProgressTracker 时实时更新进度；cancel_event 被设置后停止发送请求，
+    并在当前测试结束后抛出 JobCancelled。
+    """
     all_results = []
     service_results_list = []
     error_files = []  # 用于收集所有错误文件
     
-    # 对每个服务进行测试
-    for service in config['services']:
-        logger.info(f"\n开始测试服务: {service['name']}")
-        
-        service_results = []  # 存储当前服务的所有测试结果
-        
-        # 对每个并发用户数进行测试
-        for concurrent_users in config['concurrent_users']:
-            logger.info(f"\n并发用户数: {concurrent_users}")
+    capacity_summaries = []  # 容量探测模式每个服务的汇总
+    
+    if progress:
+        if config.get('profile'):
+            levels_per_service = 1
+        elif config.get('capacity'):
+            # 探测次数事先未知，按上限估计
+            levels_per_service = config['capacity'].get('max_probes', 12)
+        else:
+            levels_per_service = len(config['concurrent_users'])
+        progress.start_run(len(config['services']) * levels_per_service)
+    
+    parallel = config.get('parallel_services') and len(config['services']) > 1
+    if parallel and config.get('capacity'):
+        logger.warning("容量探测模式不支持服务并行，按顺序逐个探测")
+        parallel = False
+    
+    results_by_service = {}
+    if parallel:
+        # 所有服务同时测试，每个服务使用独立的连接池、工作池和统计
+        connection_pools = {
+            service['name']: ConnectionPool(keep_alive=service.get('keep_alive', config.get('keep_alive', True)))
+            for service in config['services']
+        }
+        try:
+            results_by_service = run_services_parallel(config, connection_pools, progress, cancel_event)
+        finally:
+            for connection_pool in connection_pools.values():
+                connection_pool.close()
+        if cancel_event and cancel_event.is_set():
+            raise JobCancelled()
+    else:
+        # 对每个服务进行测试
+        for service in config['services']:
+            logger.info(f"\n开始测试服务: {service['name']}")
             
-            # 使用 LoadTester 类进行测试
-            tester = LoadTester(
-                name=service['name'],
-                url=service['url'],
-                request_type=service.get('request_type', 'json'),
-                request_body=service.get('request_body'),
-                image_path=service.get('image_path'),
-                headers=service.get('headers'),
-                num_threads=concurrent_users,
-                num_requests=concurrent_users * config['requests_per_user'],
-                session_dir=config['session_dir']
-            )
+            service_results = []  # 存储当前服务的所有测试结果
+            # 同一服务的所有并发度共用连接池，保持连接常驻
+            connection_pool = ConnectionPool(keep_alive=service.get('keep_alive', config.get('keep_alive', True)))
+            cooldown = Cooldown(service, config, connection_pool, cancel_event)
             
-            # 运行测试并获取结果
-            results = tester.run_load_test()
+            if config.get('profile'):
+                # 负载曲线模式：整条曲线在同一个工作池中连续执行，阶段之间不暂停
+                service_results = run_profile(service, config, connection_pool, progress, cancel_event)
+            elif config.get('capacity'):
+                # 容量探测模式：按 SLO 自动搜索最大可持续负载，每次探测输出一行结果
+                service_results, summary = run_capacity_search(service, config, connection_pool, progress, cancel_event)
+                capacity_summaries.append(summary)
+            else:
+                # 对每个并发用户数进行测试，开始前测量服务的基线响应时间
+                cooldown.start()
+                for index, concurrent_users in enumerate(config['concurrent_users']):
+                    logger.info(f"\n并发用户数: {concurrent_users}")
+                    
+                    # 按配置的压测引擎创建测试实例
+                    tester = create_load_tester(service, config, concurrent_users, level_index=index,
+                                                connection_pool=connection_pool, stop_event=cancel_event)
+                    
+                    # 运行测试并获取结果
+                    if progress:
+                        progress.start_level(service['name'], concurrent_users, tester)
+                    results = tester.run_load_test()
+                    if progress:
+                        progress.finish_level()
+                    
+                    # 添加额外信息到结果中
+                    results['服务名称'] = service['name']
+                    results['并发用户数'] = concurrent_users
+                    results['总请求数'] = concurrent_users * config['requests_per_user']
+                    
+                    service_results.append(results)
+                    if cancel_event and cancel_event.is_set():
+                        break
+                    
+                    # 等待服务从本次测试中恢复后再开始下一个测试
+                    if index < len(config['concurrent_users']) - 1:
+                        results['冷却时间(秒)'] = f"{cooldown.wait():.2f}"
             
+            connection_pool.close()
+            if cancel_event and cancel_event.is_set():
+                raise JobCancelled()
+            results_by_service[service['name']] = service_results
+    
+    for service in config['services']:
+        service_results = results_by_service[service['name']]
+        for results in service_results:
             # 如果有错误文件，添加到列表中
             if results.get('error_file'):
                 error_files.append(results['error_file'])
                 
             # 从结果中移除错误文件路径（不需要返回给前端）
             results.pop('error_file', None)
-            
-            # 添加额外信息到结果中
-            results['服务名称'] = service['name']
-            results['并发用户数'] = concurrent_users
-            results['总请求数'] = concurrent_users * config['requests_per_user']
-            
-            service_results.append(results)
-            all_results.append(results)
-            
-            # 每个测试之间暂停一段时间
-            time.sleep(2)
+        all_results.extend(service_results)
         
         # 将当前服务的结果添加到列表中
         service_results_list.append({
@@ -224,48 +490,66 @@ def run_load_tests(config):
             'results': service_results
         })
     
-    # 将错误文件列表保存到会话中
-    session['error_files'] = error_files
+    # 将错误文件列表保存到会话中（测试可能在后台线程执行，不能写 Flask session）
+    test_session.error_files = error_files
     
     # 保存结果并生成图表
     filename = save_comparison_results_to_csv(all_results)
-    qps_path, response_path = analyze_results(filename)
+    run_id = run_store.save_run(all_results, config, tag=config.get('tag'),
+                                session_id=test_session.session_id, csv_file=os.path.abspath(filename))
+    charts = chart_renderer.render(filename, test_session.results_dir)
     
     # 使用完整的服务结果列表
-    formatted_results = format_results(service_results_list, config['concurrent_users'])
-    formatted_results['qps_plot_url'] = '/results/qps_comparison.png'
-    formatted_results['response_plot_url'] = '/results/response_time_comparison.png'
+    formatted_results = format_results(service_results_list, config)
+    formatted_results['run_id'] = run_id
+    if capacity_summaries:
+        formatted_results['capacity'] = capacity_summaries
+    for chart, path in charts.items():
+        if path:
+            formatted_results[f'{chart}_plot_url'] = results_url(path)
     
     return formatted_results
 
-def format_results(all_results, concurrent_users):
-    # 格式化结果用于前端显示
+def result_levels(results, config):
+    """一个服务各测试结果的横轴取值
+
+    容量探测时每个服务各自探测、二分出不同的负载，取该服务自己的探测负载；
+    负载曲线取阶段名称；其他模式为并发用户数。
+    """
+    if config.get('capacity'):
+        return [result['探测负载'] for result in results]
+    if config.get('profile'):
+        return [result['阶段'] for result in results]
+    return [result['并发用户数'] for result in results]
+
+def format_results(all_results, config):
+    # 格式化结果用于前端显示，每个服务带自己的横轴取值
+    if config.get('capacity'):
+        x_label = '探测负载'
+    elif config.get('profile'):
+        x_label = '阶段'
+    else:
+        x_label = '并发用户数'
     return {
-        'concurrent_users': concurrent_users,
+        'concurrent_users': config.get('concurrent_users', []),
+        'x_label': x_label,
         'services': [{
             'name': service['name'],
+            'levels': result_levels(service['results'], config),
             'qps': [float(result['QPS']) for result in service['results']],
-            'response_times': [float(result['平均响应时间(秒)']) for result in service['results']]
+            'response_times': [float(result['平均响应时间(秒)']) for result in service['results']],
+            'p95_response_times': [float(result['P95响应时间(秒)']) for result in service['results']],
+            'p99_response_times': [float(result['P99响应时间(秒)']) for result in service['results']]
         } for service in all_results]
     }
 
-def get_latest_result_file():
-    """获取最新的结果文件"""
-    # 指定结果文件目录
-    results_dir = os.path.join(os.path.dirname(__file__), 'results')
-    os.makedirs(results_dir, exist_ok=True)  # 确保目录存在
-    
-    # 获取所有性能测试结果文件
-    files = [f for f in os.listdir(results_dir) 
-             if f.startswith('performance_comparison_') and f.endswith('.csv')]
-    
-    if not files:
+def get_latest_result_file(session_id):
+    """获取会话最近一次运行的对比结果文件"""
+    run = run_store.latest_run(session_id=session_id) if session_id else None
+    if not run or not run['csv_file'] or not os.path.exists(run['csv_file']):
         logger.warning("没有找到测试结果文件")
         return None
-        
-    # 获取最新的文件
-    latest_file = max(files, key=lambda x: os.path.getctime(os.path.join(results_dir, x)))
-    return os.path.join(results_dir, latest_file)
+    return run['csv_file']
 
 def clear_results_directory():
     """清空 results 目录下的所有文件"""
@@ -283,11 +567,71 @@ def clear_results_directory():
                 logger.error(f"删除文件失败 {file_path}: {str(e)}")
     logger.info("已清空 results 目录")
 
+@app.route('/api/runs')
+def list_runs():
+    """按服务、标签、时间查询运行历史"""
+    try:
+        runs = run_store.list_runs(
+            service=request.args.get('service'),
+            tag=request.args.get('tag'),
+            since=request.args.get('since'),
+            until=request.args.get('until'),
+            limit=request.args.get('limit', 50, type=int)
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'runs': runs})
+
+@app.route('/api/runs/<int:run_id>')
+def get_run(run_id):
+    run = run_store.get_run(run_id)
+    if run is None:
+        return jsonify({'error': '运行不存在'}), 404
+    return jsonify(run)
+
+@app.route('/api/runs/<int:run_id>/tag', methods=['POST'])
+def tag_run(run_id):
+    tag = (request.get_json(silent=True) or {}).get('tag') or request.form.get('tag')
+    if not run_store.set_tag(run_id, tag or None):
+        return jsonify({'error': '运行不存在'}), 404
+    return jsonify({'id': run_id, 'tag': tag})
+
+@app.route('/api/runs/<int:run_id>/compare')
+def compare_run(run_id):
+    """与基线运行对比：?baseline=<运行 id>，或 ?baseline_tag=<标签>（默认 baseline）"""
+    baseline_id = resolve_baseline(run_store, run_id, request.args.get('baseline', type=int),
+                                   request.args.get('baseline_tag', 'baseline'))
+    if baseline_id is None:
+        return jsonify({'error': '没有找到基线运行'}), 404
+    try:
+        report = run_store.compare(run_id, baseline_id, min_effect=request.args.get('min_effect', 0.05, type=float))
+    except KeyError as e:
+        return jsonify({'error': str(e)}), 404
+    return jsonify(report)
+
 @app.route('/json-validator')
 def redirect_to_json_validator():
     return redirect('http://localhost:31007')
 
+# 所有 Web 发起的测试都作为后台任务执行
+job_manager = JobManager(
+    lambda job: run_load_tests(job.config, job.test_session, job.progress, job.cancel_event),
+    max_running=MAX_RUNNING_JOBS,
+    max_queued=MAX_QUEUED_JOBS
+)
+
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='性能测试 Web 服务')
+    parser.add_argument('--agents', help='压测节点地址，多个用逗号分隔，例如 http://127.0.0.1:31009,http://127.0.0.1:31010')
+    parser.add_argument('--agent-token', help='与 agent 共享的访问令牌，默认读取环境变量 AGENT_TOKEN')
+    args = parser.parse_args()
+    if args.agent_token:
+        # 测试实例（包括子进程）从环境变量读取令牌
+        os.environ['AGENT_TOKEN'] = args.agent_token
+    if args.agents:
+        app.config['AGENTS'] = [agent.strip() for agent in args.agents.split(',') if agent.strip()]
+    
+    configure_logging()
     ensure_directories()
     clear_results_directory()
     app.run(host="0.0.0.0", debug=True, port=31008)
\ No newline at end of file
@@ -28,11 +28,14 @@ function getConfig() {
     if (concurrentUsers.length === 0) {
         throw new Error('请至少选择一个并发用户数');
     }
+    const warmupDuration = parseFloat(document.getElementById('warmup_duration').value) || 0;
     
     return {
         services: services,
         concurrent_users: concurrentUsers,
-        requests_per_user: parseInt(document.getElementById('requests_per_user').value)
+        requests_per_user: parseInt(document.getElementById('requests_per_user').value),
+        parallel_services: document.getElementById('parallel_services').checked,
+        warmup: warmupDuration > 0 ? {duration: warmupDuration} : null
     };
 }
 
@@ -219,7 +222,7 @@ async function startTest() {
         try {
             // 更新状态
             statusText.textContent = '正在执行测试...';
-            progressBar.style.width = '50%';
+            progressBar.style.width = '0%';
 
             const formData = new FormData();
             
@@ -233,7 +236,8 @@ async function startTest() {
             
             formData.append('config', JSON.stringify(config));
 
-            const response = await fetch('/api/test', {
+            // 提交后台任务
+            const response = await fetch('/api/jobs', {
                 method: 'POST',
                 body: formData,
                 credentials: 'same-origin'
@@ -244,17 +248,14 @@ async function startTest() {
                     alert('请求失败，请检查压测配置及网络策略是否正常');
                     return;
                 }
+                if (response.status === 429) {
+                    throw new Error('等待中的测试任务过多，请稍后再试');
+                }
                 throw new Error(`HTTP error! status: ${response.status}`);
             }
             
-            const results = await response.json();
-            
-            // 更新状态
-            statusText.textContent = '测试完成！';
-            progressBar.style.width = '100%';
-            
-            // 显示结果
-            displayResults(results);
+            const job = await response.json();
+            await followJob(job.job_id);
         } catch (error) {
             statusText.textContent = '测试失败：' + error.message;
             progressBar.style.width = '0%';
@@ -267,6 +268,120 @@ async function startTest() {
     }
 }
 
+// 跟踪后台任务直到结束并显示结果。任务 ID 保存在 localStorage 中，刷新页面后可以继续跟踪
+async function followJob(jobId) {
+    const statusText = document.getElementById('statusText');
+    const progressBar = document.getElementById('progressBar');
+    const cancelButton = document.getElementById('cancelTestBtn');
+    
+    localStorage.setItem('currentJobId', jobId);
+    cancelButton.dataset.jobId = jobId;
+    cancelButton.style.display = 'inline-block';
+    
+    try {
+        const results = await watchJobEvents(jobId);
+        
+        // 更新状态
+        statusText.textContent = '测试完成！';
+        progressBar.style.width = '100%';
+        
+        // 显示结果
+        displayResults(results);
+    } finally {
+        localStorage.removeItem('currentJobId');
+        cancelButton.style.display = 'none';
+    }
+}
+
+// 订阅任务的 server-sent events，连接断开时 EventSource 会自动重连
+function watchJobEvents(jobId) {
+    return new Promise((resolve, reject) => {
+        const source = new EventSource(`/api/jobs/${jobId}/events`);
+        
+        source.addEventListener('progress', event => updateProgress(JSON.parse(event.data)));
+        source.addEventListener('result', event => {
+            source.close();
+            resolve(JSON.parse(event.data));
+        });
+        source.addEventListener('failed', event => {
+            source.close();
+            reject(new Error(JSON.parse(event.data).error));
+        });
+        source.addEventListener('cancelled', () => {
+            source.close();
+            reject(new Error('测试已取消'));
+        });
+        source.onerror = () => {
+            // 任务不存在或会话过期时服务端返回非 SSE 响应，EventSource 不再重连
+            if (source.readyState === EventSource.CLOSED) {
+                reject(new Error('无法获取测试进度'));
+            }
+        };
+    });
+}
+
+function cancelTest() {
+    const jobId = document.getElementById('cancelTestBtn').dataset.jobId;
+    if (!jobId) return;
+    
+    fetch(`/api/jobs/${jobId}/cancel`, { method: 'POST', credentials: 'same-origin' })
+        .then(response => {
+            if (response.ok) {
+                document.getElementById('statusText').textContent = '正在取消测试...';
+            }
+        })
+        .catch(error => console.error('取消测试失败:', error));
+}
+
+// 页面加载时继续跟踪未结束的任务
+async function resumeJob() {
+    const jobId = localStorage.getItem('currentJobId');
+    if (!jobId) return;
+    
+    const startButton = document.getElementById('startTestBtn');
+    document.getElementById('status').style.display = 'block';
+    startButton.disabled = true;
+    try {
+        await followJob(jobId);
+    } catch (error) {
+        document.getElementById('statusText').textContent = '测试失败：' + error.message;
+    } finally {
+        startButton.disabled = false;
+    }
+}
+
+// 根据进度快照更新状态区域
+function updateProgress(snapshot) {
+    const statusText = document.getElementById('statusText');
+    const progressBar = document.getElementById('progressBar');
+    
+    if (snapshot.status === 'queued') {
+        statusText.textContent = `排队中，前面还有 ${snapshot.queue_position} 个测试任务`;
+        return;
+    }
+    if (snapshot.cancelling) {
+        statusText.textContent = '正在取消测试...';
+        return;
+    }
+    if (snapshot.total > 0) {
+        progressBar.style.width = `${Math.round(snapshot.finished / snapshot.total * 100)}%`;
+    }
+    if (!snapshot.service) {
+        statusText.textContent = '正在执行测试...';
+        return;
+    }
+    
+    let text = `[${snapshot.finished}/${snapshot.total}] ${snapshot.service}，并发用户数: ${snapshot.level}`;
+    if (snapshot.warmup) {
+        text += '（预热中）';
+    }
+    if (snapshot.done !== undefined) {
+        text += `，已完成: ${snapshot.done}，QPS: ${snapshot.qps}，` +
+            `P50/P95/P99: ${snapshot.p50}/${snapshot.p95}/${snapshot.p99} 秒，错误: ${snapshot.errors}`;
+    }
+    statusText.textContent = text;
+}
+
 function toggleRequestConfig(select) {
     const serviceConfig = select.closest('.service-config');
     const jsonConfig = serviceConfig.querySelector('.json-config');
@@ -308,8 +423,8 @@ function displayResults(results) {
     const responseTimeChart = document.getElementById('responseTimeChart');
     
     if (results.qps_plot_url) {
-        // 添加时间戳参数来防止缓存
-        qpsChart.src = `${results.qps_plot_url}?t=${new Date().getTime()}`;
+        // 图表地址按数据内容生成，内容变化时地址随之变化，可直接使用浏览器缓存
+        qpsChart.src = results.qps_plot_url;
         qpsChart.style.display = 'block';
         
         qpsChart.onerror = function() {
@@ -319,8 +434,8 @@ function displayResults(results) {
     }
     
     if (results.response_plot_url) {
-        // 添加时间戳参数来防止缓存
-        responseTimeChart.src = `${results.response_plot_url}?t=${new Date().getTime()}`;
+        // 图表地址按数据内容生成，内容变化时地址随之变化，可直接使用浏览器缓存
+        responseTimeChart.src = results.response_plot_url;
         responseTimeChart.style.display = 'block';
         
         responseTimeChart.onerror = function() {
@@ -328,6 +443,77 @@ function displayResults(results) {
             this.style.display = 'none';
         };
     }
+    
+    // 时间序列图表（没有数据时隐藏）
+    [['qpsTimelineChart', results.qps_timeline_plot_url],
+     ['latencyTimelineChart', results.latency_timeline_plot_url],
+     ['capacityChart', results.capacity_plot_url],
+     ['throughputLatencyChart', results.throughput_latency_plot_url],
+     ['latencyCdfChart', results.cdf_plot_url],
+     ['latencyHeatmapChart', results.heatmap_plot_url]].forEach(([id, url]) => {
+        const chart = document.getElementById(id);
+        if (url) {
+            chart.src = url;
+            chart.style.display = 'block';
+            chart.onerror = function() {
+                console.error(`Failed to load ${id}`);
+                this.style.display = 'none';
+            };
+        } else {
+            chart.style.display = 'none';
+        }
+    });
+    
+    // 容量探测汇总
+    const capacitySummary = document.getElementById('capacitySummary');
+    if (results.capacity) {
+        capacitySummary.innerHTML = '<h4>容量探测结果</h4>';
+        results.capacity.forEach(item => {
+            const p = document.createElement('p');
+            p.textContent = `${item['服务名称']}：最大可持续负载 ${item['最大可持续负载']}（${item['探测模式']}），` +
+                `最大可持续 QPS ${item['最大可持续QPS']}，SLO ${item['SLO']}，共探测 ${item['探测次数']} 次`;
+            capacitySummary.appendChild(p);
+        });
+        capacitySummary.style.display = 'block';
+    } else {
+        capacitySummary.style.display = 'none';
+    }
+    
+    const percentileChart = document.getElementById('percentileChart');
+    if (results.percentile_plot_url) {
+        // 图表地址按数据内容生成，内容变化时地址随之变化，可直接使用浏览器缓存
+        percentileChart.src = results.percentile_plot_url;
+        percentileChart.style.display = 'block';
+        
+        percentileChart.onerror = function() {
+            console.error('Failed to load Percentile chart');
+            this.style.display = 'none';
+        };
+    }
+}
+
+// 每个服务按自己的横轴取值绘制（容量探测时各服务探测的负载不同）
+function serviceDatasets(results, key) {
+    return results.services.map(service => ({
+        label: service.name,
+        data: service.levels.map((level, i) => ({x: level, y: service[key][i]})),
+        fill: false,
+        borderColor: getRandomColor(),
+        tension: 0.1
+    }));
+}
+
+// 数值横轴用线性刻度，阶段名称等文本横轴按出现顺序合并各服务的取值
+function levelScale(results) {
+    const levels = results.services.flatMap(service => service.levels);
+    const scale = {title: {display: true, text: results.x_label}};
+    if (levels.every(level => typeof level === 'number')) {
+        scale.type = 'linear';
+    } else {
+        scale.type = 'category';
+        scale.labels = [...new Set(levels)];
+    }
+    return scale;
 }
 
 function displayCharts(results) {
@@ -347,14 +533,7 @@ function displayCharts(results) {
         qpsChartInstance = new Chart(qpsCanvas, {
             type: 'line',
             data: {
-                labels: results.concurrent_users,
-                datasets: results.services.map(service => ({
-                    label: service.name,
-                    data: service.qps,
-                    fill: false,
-                    borderColor: getRandomColor(),
-                    tension: 0.1
-                }))
+                datasets: serviceDatasets(results, 'qps')
             },
             options: {
                 responsive: true,
@@ -376,12 +555,7 @@ function displayCharts(results) {
                             text: 'QPS'
                         }
                     },
-                    x: {
-                        title: {
-                            display: true,
-                            text: '并发用户数'
-                        }
-                    }
+                    x: levelScale(results)
                 }
             }
         });
@@ -390,14 +564,7 @@ function displayCharts(results) {
         responseTimeChartInstance = new Chart(responseTimeCanvas, {
             type: 'line',
             data: {
-                labels: results.concurrent_users,
-                datasets: results.services.map(service => ({
-                    label: service.name,
-                    data: service.response_times,
-                    fill: false,
-                    borderColor: getRandomColor(),
-                    tension: 0.1
-                }))
+                datasets: serviceDatasets(results, 'response_times')
             },
             options: {
                 responsive: true,
@@ -419,12 +586,7 @@ function displayCharts(results) {
                             text: '响应时间(秒)'
                         }
                     },
-                    x: {
-                        title: {
-                            display: true,
-                            text: '并发用户数'
-                        }
-                    }
+                    x: levelScale(results)
                 }
             }
         });
@@ -488,6 +650,9 @@ document.addEventListener('DOMContentLoaded', function() {
     
     // 更新服务概要
     updateServiceSummary();
+    
+    // 继续跟踪刷新前未结束的测试
+    resumeJob();
 });
 
 // Cookie 操作函数
@@ -552,6 +717,8 @@ function loadLastConfig() {
 
     // 设置每用户请求数
     document.getElementById('requests_per_user').value = lastConfig.requests_per_user;
+    document.getElementById('parallel_services').checked = Boolean(lastConfig.parallel_services);
+    document.getElementById('warmup_duration').value = lastConfig.warmup ? lastConfig.warmup.duration : 0;
 
     // 更新服务概要
     updateServiceSummary();